@@ -1,3 +1,3 @@
-from app.api.v1.endpoints import auth_controller, credentials_controller, aws_controller
+from app.api.v1.endpoints import auth_controller, credentials_controller, aws_controller, template_controller
 
-__all__ = ["auth_controller.py", "credentials_controller.py", "aws_controller"]
\ No newline at end of file
+__all__ = ["auth_controller.py", "credentials_controller.py", "aws_controller", "template_controller"]
\ No newline at end of file
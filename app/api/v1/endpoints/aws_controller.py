@@ -2,14 +2,28 @@ import base64
 import os
 from typing import List, Dict, Any, Optional
 
-import oracledb
-from fastapi import APIRouter, Body, Depends, Query, Request
+from fastapi import APIRouter, Body, Depends, Header, HTTPException, Query, Request, Response, status
+from fastapi.exceptions import RequestValidationError
+from pydantic import ValidationError
+from starlette.datastructures import UploadFile
+from app.core.body_limit import read_body, read_form
 from app.core.config import settings
 from app.core.dependencies import _perform_database_access_check, check_database_access_query_param
 from app.core.security import get_current_user
 from app.helpers.aws_helper import AwsHelper, ALLOWED_FILE_EXTENSIONS
-from app.schemas.EmailRequest import EmailRequest, UploadRequest
-from services.lval_service import LvalConfig
+from app.schemas.EmailRequest import EmailRequest, EmailWithAttachmentsRequest, PdfEngineLiteral, UploadRequest
+from app.schemas.UploadJob import (
+    CompleteUploadRequest, PresignDownloadRequest, PresignDownloadResponse, PresignUploadRequest,
+    PresignUploadResponse, UploadJobAccepted, UploadJobStatus
+)
+from services.document_download_service import DocumentDownloadService
+from services.email_outbox_service import EmailOutboxService
+from services.idempotency_service import IdempotencyService, IDEMPOTENCY_HEADER
+from services.presigned_download_service import PresignedDownloadService
+from services.presigned_upload_service import PresignedUploadService
+from services.template_service import TemplateService
+from services.upload_job_service import UploadJobService
+from services.upload_service import UploadService
 from utils.fix_html_body import fix_html_body
 from app.core.http_erros import HttpErrors
 
@@ -17,24 +31,170 @@ router = APIRouter(
     dependencies=[Depends(get_current_user)]
 )
 
-CLIENT_LIB_DIR = os.getenv("ORACLE_INSTANT_CLIENT_DIR")
-if not os.path.isdir(CLIENT_LIB_DIR):
-    raise RuntimeError(f"Ruta de Instant Client inválida: {CLIENT_LIB_DIR}")
-oracledb.init_oracle_client(lib_dir=CLIENT_LIB_DIR)
+MAX_UPLOAD_BYTES = settings.MAX_UPLOAD_BYTES
+
+
+def _validate_extension(filename: str) -> None:
+    ext = os.path.splitext(filename)[1].lower()
+    if ext not in ALLOWED_FILE_EXTENSIONS:
+        raise HttpErrors.bad_request(
+            detail=f"Tipo de archivo no permitido para '{filename}'. "
+                   f"Extensiones válidas: {', '.join(ALLOWED_FILE_EXTENSIONS)}"
+        )
+
 
-AWS_BUCKET: str
-AWS_PREFIX_S3: str
+async def _enqueue_email(request: EmailRequest, extra_attachments: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Resuelve plantilla/HTML y encola el mensaje en SQS (o en el outbox local si está activo).
+    Si los destinatarios superan el límite por mensaje (o recipient_mode="bcc"), encola un
+    mensaje por grupo de destinatarios, en lotes y en paralelo.
+    """
+    subject = request.subject
+    template = None
+    if request.template_id:
+        compiled = await TemplateService.get(request.database, request.template_id)
+        missing = compiled.missing(request.template_vars)
+        if missing:
+            raise HttpErrors.unprocessable_entity(
+                detail=f"Faltan variables para la plantilla '{request.template_id}': {', '.join(missing)}"
+            )
+        subject = subject or compiled.render_subject(request.template_vars)
+        if not subject:
+            raise HttpErrors.unprocessable_entity(
+                detail=f"La plantilla '{request.template_id}' no define asunto; indique 'subject'."
+            )
+        if request.template_render == "consumer":
+            html_body = None
+            template = {
+                "template_id": compiled.template_id,
+                "template_version": compiled.version,
+                "template_vars": request.template_vars,
+            }
+        else:
+            html_body = compiled.render_html(request.template_vars)
+    else:
+        use_html = bool(request.html_body and request.html_body.strip())
+        html_body = fix_html_body(request.html_body) if use_html else None
 
+    attachments = list(request.attachments) + list(extra_attachments or [])
+    attachment_links = None
+    if request.presign_attachments and attachments:
+        attachment_links = await PresignedDownloadService.presign(
+            request.database, attachments, request.attachment_links_expires_in
+        )
 
-@router.post("/upload", response_model=List[Dict[str, Any]])
+    chunks = AwsHelper.build_email_messages(
+        from_addr=request.from_email,
+        to_addrs=request.to,
+        cc=request.cc,
+        bcc=request.bcc,
+        bcc_only=request.recipient_mode == "bcc",
+        subject=subject,
+        body=None if (html_body or template) else request.body,
+        html_body=html_body,
+        attachments=attachments,
+        tags=request.tags,
+        template=template,
+        attachment_links=attachment_links,
+    )
+    if not settings.EMAIL_OUTBOX_ENABLED:
+        return await AwsHelper.send_email_chunks(request.database, chunks)
+    if len(chunks) == 1:
+        return await EmailOutboxService.enqueue(request.database, chunks[0][0])
+    outbox_ids = await EmailOutboxService.enqueue_many(request.database, [message for message, _ in chunks])
+    return {
+        "OutboxIds": outbox_ids,
+        "Status": "pending",
+        "Chunks": len(chunks),
+        "Recipients": sum(len(chunk_recipients) for _, chunk_recipients in chunks),
+    }
+
+
+def _upload_validation_error(e: ValidationError) -> RequestValidationError:
+    return RequestValidationError(
+        [{**err, "loc": ("body", *err["loc"])} for err in e.errors(include_url=False, include_input=False)]
+    )
+
+
+async def _upload_form(request: Request) -> UploadRequest:
+    """
+    Variante binaria de /upload: multipart/form-data con los campos database, id_proceso,
+    filename (opcional, por defecto el nombre del archivo), compression_engine (opcional)
+    y el archivo en 'file', sin base64.
+    """
+    form = await read_form(request)
+    try:
+        file = form.get("file")
+        if not isinstance(file, UploadFile):
+            raise HttpErrors.bad_request(detail="Falta el archivo en el campo 'file' del formulario.")
+        data = {
+            "database": form.get("database"),
+            "filename": form.get("filename") or file.filename,
+            "id_proceso": form.get("id_proceso"),
+            "compression_engine": form.get("compression_engine") or None,
+            "blob": await file.read(),
+        }
+    finally:
+        await form.close()
+    try:
+        return UploadRequest.model_validate(data)
+    except ValidationError as e:
+        raise _upload_validation_error(e)
+
+
+async def _upload_payload(request: Request) -> UploadRequest:
+    """
+    Valida UploadRequest directamente desde los bytes del cuerpo (model_validate_json),
+    sin el str intermedio de json.loads: el blob queda en memoria una sola vez más el cuerpo.
+    El cuerpo puede venir comprimido (Content-Encoding gzip/zstd) o como multipart/form-data.
+    """
+    if request.headers.get("content-type", "").startswith("multipart/form-data"):
+        return await _upload_form(request)
+    body = await read_body(request)
+    try:
+        return UploadRequest.model_validate_json(body)
+    except ValidationError as e:
+        raise _upload_validation_error(e)
+
+
+# El cuerpo se valida en _upload_payload; el esquema se declara a mano para OpenAPI.
+_UPLOAD_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "application/json": {"schema": UploadRequest.model_json_schema()},
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["database", "id_proceso", "file"],
+                    "properties": {
+                        "database": {"type": "string"},
+                        "id_proceso": {"type": "integer"},
+                        "filename": {"type": "string"},
+                        "compression_engine": {"type": "string", "enum": ["auto", "ghostscript", "images"]},
+                        "file": {"type": "string", "format": "binary"},
+                    },
+                }
+            },
+        },
+    }
+}
+
+
+@router.post("/upload", response_model=List[Dict[str, Any]], openapi_extra=_UPLOAD_OPENAPI)
 async def upload_and_process_blob(
-        payload: UploadRequest = Body(...),
+        response: Response,
+        payload: UploadRequest = Depends(_upload_payload),
+        idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER),
 ) -> List[Dict[str, Any]]:
     """
     Recibe un solo blob + id_proceso en JSON:
       { filename: str, blob: bytes (base64), id_proceso: int }
+    o en multipart/form-data (database, id_proceso, filename, file) con el archivo en binario.
+    Ambos aceptan el cuerpo comprimido con Content-Encoding: gzip (o zstd).
     O si falta alguno, hace el SELECT y usa id_proceso=1.
     Devuelve metadata con id_documento, id_proceso y size en KB.
+    Con el header Idempotency-Key, un reintento devuelve la metadata guardada sin volver a subir.
     """
     _perform_database_access_check(payload.database)
 
@@ -44,35 +204,25 @@ async def upload_and_process_blob(
             "filename": payload.filename,
             "blob": payload.blob,
             "id_proceso": payload.id_proceso,
+            "compression_engine": payload.compression_engine,
         })
 
     if not files:  # Si después de procesar el payload, la lista sigue vacía
         raise HttpErrors.bad_request(detail="No se proporcionaron archivos válidos para procesar.")
 
     total_bytes = sum(len(f["blob"]) for f in files)
-    if total_bytes > 8 * 1024 * 1024:
-        raise HttpErrors.bad_request(detail="La carga total de archivos supera el límite de 8 MB.")
+    if total_bytes > MAX_UPLOAD_BYTES:
+        raise HttpErrors.bad_request(detail=f"La carga total de archivos supera el límite de {MAX_UPLOAD_BYTES // (1024 * 1024)} MB.")
 
     try:
-        lval = await LvalConfig.load(settings.DB_AWS_TIPOLVAL, db_name=payload.database)
-        AWS_BUCKET = lval.get(settings.DB_AWS_BUCKET)
-        AWS_PREFIX_S3 = lval.get(settings.DB_AWS_S3_PREFIX)
-
-        if not all([AWS_BUCKET, AWS_PREFIX_S3]):
-            raise ValueError("Configuración de Bucket S3 o prefijo de S3 no encontrada en LVAL.")
-
-        metadata = await AwsHelper.upload_blobs_to_s3(files,
-                                                      bucket=AWS_BUCKET,
-                                                      prefix=AWS_PREFIX_S3,
-                                                      database=payload.database)
-        for item, finfo in zip(metadata, files):
-            item["id_documento"] = item.get("key")
-            item["id_proceso"] = finfo["id_proceso"]
-            size_bytes = item.get("size", 0)
-            item["size"] = f"{int(size_bytes / 1024)}kb"
-
-        return metadata
-    except HttpErrors as e:
+        return await IdempotencyService.run(
+            idempotency_key,
+            scope=f"upload:{payload.database}",
+            fingerprint=IdempotencyService.fingerprint(payload.filename, payload.id_proceso, payload.blob),
+            response=response,
+            fn=lambda: UploadService.process(files, payload.database),
+        )
+    except HTTPException as e:
         raise e
     except Exception as e:
         raise HttpErrors.internal_server_error(detail=f"Error inesperado al procesar la carga: {e}")
@@ -81,91 +231,265 @@ async def upload_and_process_blob(
 @router.post("/upload-raw-blob", response_model=List[Dict[str, Any]])
 async def upload_raw_blob(
         request: Request,
+        response: Response,
         filename: str = Query(..., description="Nombre del archivo (e.g., 'documento.pdf')"),
         id_proceso: int = Query(..., description="ID del proceso asociado al archivo"),
-        database: str = Depends(check_database_access_query_param)
+        database: str = Depends(check_database_access_query_param),
+        compression_engine: Optional[PdfEngineLiteral] = Query(
+            None, description="Motor de compresión de PDFs > 1 MB; por defecto PDF_COMPRESSION_ENGINE"
+        ),
+        idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER),
 ) -> List[Dict[str, Any]]:
     """
     Recibe el BLOB (contenido binario) directamente en el cuerpo de la solicitud HTTP.
     El filename y id_proceso se pasan como query parameters.
+    Con Content-Encoding: gzip (o zstd) el cuerpo se descomprime en streaming, acotado
+    al mismo límite que un cuerpo sin comprimir.
     """
     content_type = request.headers.get("Content-Type")
     if not content_type or not content_type.startswith("application/"):
         raise HttpErrors.bad_request(detail="Content-Type debe ser 'application/pdf' o similar.")
 
-    raw_pdf_bytes = await request.body()
+    raw_pdf_bytes = await read_body(request)
 
     if not raw_pdf_bytes:
         raise HttpErrors.bad_request(detail="El cuerpo de la solicitud está vacío.")
 
-    ext = os.path.splitext(filename)[1].lower()
-    if ext not in ALLOWED_FILE_EXTENSIONS:
-        raise HttpErrors.bad_request(
-            detail=f"Tipo de archivo no permitido para '{filename}'. "
-                   f"Extensiones válidas: {', '.join(ALLOWED_FILE_EXTENSIONS)}"
-        )
+    _validate_extension(filename)
 
     files: List[Dict[str, Any]] = [{
         "filename": filename,
         "blob": raw_pdf_bytes,
         "id_proceso": id_proceso,
+        "compression_engine": compression_engine,
     }]
 
     try:
-        lval = await LvalConfig.load(settings.DB_AWS_TIPOLVAL, db_name=database)
-        AWS_BUCKET = lval.get(settings.DB_AWS_BUCKET)
-        AWS_PREFIX_S3 = lval.get(settings.DB_AWS_S3_PREFIX)
-
-        if not all([AWS_BUCKET, AWS_PREFIX_S3]):
-            raise ValueError("Configuración de Bucket S3 o prefijo de S3 no encontrada en LVAL.")
-
-        metadata = await AwsHelper.upload_blobs_to_s3(files,
-                                                      bucket=AWS_BUCKET,
-                                                      prefix=AWS_PREFIX_S3,
-                                                      database=database)
-        for item, finfo in zip(metadata, files):
-            item["id_documento"] = item.get("key")
-            item["id_proceso"] = finfo["id_proceso"]
-            size_bytes = item.get("size", 0)
-            item["size"] = f"{int(size_bytes / 1024)}kb"
-
-        return metadata
-    except HttpErrors as e:
+        return await IdempotencyService.run(
+            idempotency_key,
+            scope=f"upload:{database}",
+            fingerprint=IdempotencyService.fingerprint(filename, id_proceso, raw_pdf_bytes),
+            response=response,
+            fn=lambda: UploadService.process(files, database),
+        )
+    except HTTPException as e:
         raise e
     except Exception as e:
         raise HttpErrors.internal_server_error(detail=f"Error inesperado al subir el blob: {e}")
 
 
+@router.post("/upload-async", response_model=UploadJobAccepted, status_code=status.HTTP_202_ACCEPTED,
+             openapi_extra=_UPLOAD_OPENAPI)
+async def upload_blob_async(
+        request: Request,
+        response: Response,
+        payload: UploadRequest = Depends(_upload_payload),
+        idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER),
+) -> Dict[str, Any]:
+    """
+    Versión asíncrona de /upload: valida la solicitud, guarda el blob en el spool
+    local y responde 202 con un job_id. La compresión y la subida a S3 las hace
+    un worker en segundo plano; el estado se consulta en /upload-jobs/{job_id}.
+    """
+    _perform_database_access_check(payload.database)
+
+    if not payload.filename or not payload.blob:
+        raise HttpErrors.bad_request(detail="No se proporcionaron archivos válidos para procesar.")
+    _validate_extension(payload.filename)
+    if len(payload.blob) > MAX_UPLOAD_BYTES:
+        raise HttpErrors.bad_request(detail=f"La carga total de archivos supera el límite de {MAX_UPLOAD_BYTES // (1024 * 1024)} MB.")
+
+    async def _submit() -> Dict[str, Any]:
+        job_id = await UploadJobService.submit(payload.database, payload.filename, payload.blob, payload.id_proceso,
+                                               payload.compression_engine)
+        return UploadJobAccepted(
+            job_id=job_id,
+            status="queued",
+            status_url=str(request.url_for("get_upload_job_status", job_id=job_id).path),
+        ).model_dump()
+
+    try:
+        return await IdempotencyService.run(
+            idempotency_key,
+            scope=f"upload-async:{payload.database}",
+            fingerprint=IdempotencyService.fingerprint(payload.filename, payload.id_proceso, payload.blob),
+            response=response,
+            fn=_submit,
+        )
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HttpErrors.internal_server_error(detail=f"Error inesperado al registrar el job de carga: {e}")
+
+
+@router.get("/upload-jobs/{job_id}", response_model=UploadJobStatus)
+async def get_upload_job_status(job_id: str) -> UploadJobStatus:
+    """
+    Devuelve el estado, progreso y (al terminar) la metadata de un job de carga.
+    Se valida el acceso a la base de datos del job, como en el resto de los endpoints.
+    """
+    job = await UploadJobService.get(job_id)
+    if job is None:
+        raise HttpErrors.not_found(detail=f"Job de carga '{job_id}' no encontrado.")
+    _perform_database_access_check(job["database"])
+    return UploadJobStatus(**job)
+
+
+@router.post("/uploads/presign", response_model=PresignUploadResponse)
+async def presign_upload(payload: PresignUploadRequest = Body(...)) -> Dict[str, Any]:
+    """
+    Emite una URL prefirmada (POST o PUT) para subir el archivo directo al bucket S3
+    del tenant, sin pasar los bytes por la API. El tamaño y el Content-Type quedan
+    forzados por la firma. Al terminar la subida se llama a /uploads/complete.
+    """
+    _perform_database_access_check(payload.database)
+    try:
+        return await PresignedUploadService.presign(payload.database, payload.filename, payload.size, payload.method)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HttpErrors.internal_server_error(detail=f"Error inesperado al generar la URL prefirmada: {e}")
+
+
+@router.post("/uploads/complete", response_model=List[Dict[str, Any]])
+async def complete_presigned_upload(
+        response: Response,
+        payload: CompleteUploadRequest = Body(...),
+        idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER),
+) -> List[Dict[str, Any]]:
+    """
+    Cierra una carga prefirmada: lee el objeto desde S3, lo comprime si es PDF,
+    lo deja en la clave final y devuelve la misma metadata que /upload.
+    """
+    _perform_database_access_check(payload.database)
+    try:
+        return await IdempotencyService.run(
+            idempotency_key,
+            scope=f"upload-complete:{payload.database}",
+            fingerprint=IdempotencyService.fingerprint(payload.upload_id, payload.filename, payload.id_proceso),
+            response=response,
+            fn=lambda: PresignedUploadService.complete(
+                payload.database, payload.upload_id, payload.filename, payload.id_proceso,
+                payload.compression_engine,
+            ),
+        )
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HttpErrors.internal_server_error(detail=f"Error inesperado al completar la carga: {e}")
+
+
+@router.post("/attachments/presign", response_model=PresignDownloadResponse)
+async def presign_attachments(payload: PresignDownloadRequest = Body(...)) -> Dict[str, Any]:
+    """
+    Convierte en un solo llamado muchas URIs s3://bucket/clave (las `url` devueltas por /upload)
+    en URLs prefirmadas de descarga, vigentes al menos `expires_in` segundos. Las URLs se
+    reutilizan entre solicitudes dentro de la misma ventana de expiración.
+    """
+    _perform_database_access_check(payload.database)
+    try:
+        return {"urls": await PresignedDownloadService.presign(payload.database, payload.uris, payload.expires_in)}
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HttpErrors.internal_server_error(detail=f"Error inesperado al generar las URLs de descarga: {e}")
+
+
+@router.get("/documents/{id_documento:path}", response_class=Response,
+            responses={200: {"content": {"application/octet-stream": {}}}, 206: {}, 304: {}, 416: {}})
+async def download_document(
+        id_documento: str,
+        database: str = Depends(check_database_access_query_param),
+        range_header: Optional[str] = Header(None, alias="Range"),
+        if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
+        if_range: Optional[str] = Header(None, alias="If-Range"),
+) -> Response:
+    """
+    Descarga un documento subido (el id_documento devuelto por /upload) desde el bucket
+    y prefijo LVAL de la base de datos. Soporta Range (un rango, respuesta 206) e
+    If-None-Match (304); los documentos frecuentes se sirven desde un caché local en disco.
+    """
+    try:
+        return await DocumentDownloadService.download(database, id_documento, range_header, if_none_match, if_range)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HttpErrors.internal_server_error(detail=f"Error inesperado al descargar el documento: {e}")
+
+
 @router.post("/send-email")
-async def send_email_with_html(request: EmailRequest = Body(...)) -> Dict[str, Any]:
+async def send_email_with_html(
+        response: Response,
+        request: EmailRequest = Body(...),
+        idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER),
+) -> Dict[str, Any]:
     """
-    Envía un email usando html_body.
+    Envía un email usando html_body, o una plantilla registrada (template_id + template_vars).
     Los tipos coinciden exactamente con EmailRequest.
+    Con el header Idempotency-Key, un reintento devuelve el MessageId original sin volver a encolar.
     """
 
     _perform_database_access_check(request.database)
 
     try:
-        use_html = bool(request.html_body and request.html_body.strip())
-
-        fixed_html = fix_html_body(request.html_body) if request.html_body else None
-
-        message_id = await AwsHelper.send_email(
-            from_addr=request.from_email,
-            to_addrs=request.to,
-            cc=request.cc,
-            bcc=request.bcc,
-            subject=request.subject,
-            body=None if use_html else request.body,
-            html_body=fixed_html if use_html else None,
-            attachments=request.attachments,
-            tags=request.tags,
-            database=request.database
+        message_id = await IdempotencyService.run(
+            idempotency_key,
+            scope=f"send-email:{request.database}",
+            fingerprint=IdempotencyService.fingerprint(request.model_dump(mode="json")),
+            response=response,
+            fn=lambda: _enqueue_email(request),
         )
 
         return message_id
 
-    except HttpErrors as e:
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HttpErrors.internal_server_error(detail=f"Error inesperado al enviar el email: {e}")
+
+
+@router.post("/send-email-with-attachments")
+async def send_email_with_attachments(
+        response: Response,
+        request: EmailWithAttachmentsRequest = Body(...),
+        idempotency_key: Optional[str] = Header(None, alias=IDEMPOTENCY_HEADER),
+) -> Dict[str, Any]:
+    """
+    Envía un email con sus adjuntos en una sola llamada: los archivos de `files` (base64)
+    se comprimen y suben a S3 en paralelo y el mensaje se encola solo cuando todos
+    quedaron en S3. Sus URLs se agregan a `attachments`.
+    Comparte una sola búsqueda de credenciales y un solo juego de clientes AWS.
+    """
+    _perform_database_access_check(request.database)
+
+    if not request.files:
+        raise HttpErrors.bad_request(detail="No se proporcionaron archivos para adjuntar; use /send-email.")
+    for f in request.files:
+        _validate_extension(f.filename)
+    if sum(len(f.blob) for f in request.files) > MAX_UPLOAD_BYTES:
+        raise HttpErrors.bad_request(detail=f"La carga total de archivos supera el límite de {MAX_UPLOAD_BYTES // (1024 * 1024)} MB.")
+
+    files: List[Dict[str, Any]] = [
+        {"filename": f.filename, "blob": f.blob, "id_proceso": f.id_proceso}
+        for f in request.files
+    ]
+
+    async def _upload_and_send() -> Dict[str, Any]:
+        metadata = await UploadService.process(files, request.database)
+        message = await _enqueue_email(request, extra_attachments=[item["url"] for item in metadata])
+        return {"message": message, "attachments": metadata}
+
+    try:
+        return await IdempotencyService.run(
+            idempotency_key,
+            scope=f"send-email-with-attachments:{request.database}",
+            fingerprint=IdempotencyService.fingerprint(request.model_dump(mode="json", exclude={"files"}),
+                                                       *[(f.filename, f.id_proceso) for f in request.files],
+                                                       *[f.blob for f in request.files]),
+            response=response,
+            fn=_upload_and_send,
+        )
+    except HTTPException as e:
         raise e
     except Exception as e:
-        raise HttpErrors.internal_server_error(detail=f"Error inesperado al enviar el email: {e}")
\ No newline at end of file
+        raise HttpErrors.internal_server_error(detail=f"Error inesperado al enviar el email con adjuntos: {e}")
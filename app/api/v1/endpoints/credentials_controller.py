@@ -1,18 +1,21 @@
 # app/api/v1/endpoints/credentials_controller.py
 from typing import List
-import oracledb
 import re  # Importar el módulo re para expresiones regulares
 
-from fastapi import APIRouter, Depends, HTTPException, Query, status
-from sqlalchemy import text
-from sqlalchemy.ext.asyncio import AsyncSession
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, status
 
 from app.core.auth import validate_password_strength
 from app.core.config import settings
 from app.core.dependencies import check_database_access_query_param
-from app.db.oracle import execute_query, call_proc_update
-from app.schemas.Credentials import CredentialMetadata, UpdateCredentialOut
+from app.core.resilience import is_retryable_oracle_error
+from app.db.oracle import execute_query, call_proc_update, call_proc_update_many
+from app.helpers.aws_helper import AwsHelper
+from app.schemas.Credentials import (
+    BulkUpdateCredentialIn, BulkUpdateCredentialOut, CredentialMetadata, CredentialUpdateResult, UpdateCredentialOut
+)
 from app.core.security import get_current_user
+from services.lval_service import LvalConfig
+from services.presigned_download_service import PresignedDownloadService
 
 router = APIRouter(
     dependencies=[Depends(get_current_user)]
@@ -41,6 +44,77 @@ GROUP_LABELS = {
 }
 
 
+def _invalidate_caches(tipolval: str, database: str) -> None:
+    """
+    Descarta la configuración LVAL cacheada del grupo y, si son credenciales AWS,
+    los clientes boto3 y las URLs prefirmadas construidos con las anteriores.
+    """
+    LvalConfig.invalidate(tipolval, database)
+    if tipolval == settings.DB_AWS_TIPOLVAL:
+        AwsHelper.invalidate(database)
+        PresignedDownloadService.invalidate(database)
+
+
+async def _validate_value(tipolval: str, codlval: str, value: str, database: str) -> None:
+    """
+    Valida un nuevo valor de credencial; lanza 422 si no es aceptable.
+    """
+    import oracledb
+
+    # Validación de longitud general
+    if len(value) > 99:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="La longitud máxima permitida es 99 caracteres."
+        )
+
+    # VALIDACIONES ESPECÍFICAS PARA JWTPASS
+    if tipolval == settings.DB_JWT_TIPOLVAL and codlval == settings.DB_PASS_JWT:
+        if not (8 <= len(value) <= 30):
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="La contraseña de JWT debe tener entre 8 y 30 caracteres."
+            )
+
+        try:
+            validate_password_strength(value)
+        except ValueError as e:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=str(e)
+            )
+
+        try:
+            current_password_row = await execute_query(
+                """
+                SELECT Encrypt_pkg.DECRYPT(descrip) as CURRENT_VALUE
+                FROM LVAL
+                WHERE tipolval = :tv AND codlval = :cv
+                """,
+                {"tv": tipolval, "cv": codlval},
+                db_name=database
+            )
+
+        except oracledb.Error as e:
+            print(f"Error de base de datos al verificar la contraseña actual: {e}")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Error al verificar la contraseña actual en la base de datos. Por favor, inténtelo de nuevo."
+            )
+        except Exception as e:
+            print(f"Error inesperado al verificar la contraseña actual: {e}")
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail="Error interno al verificar la contraseña actual. Por favor, inténtelo de nuevo."
+            )
+
+        if current_password_row and current_password_row[0]["CURRENT_VALUE"] == value:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail="La nueva contraseña no puede ser igual a la contraseña actual."
+            )
+
+
 def make_group_router(tipolval: str) -> APIRouter:
     grp = APIRouter(
         prefix=f"/credentials/{tipolval.lower()}",
@@ -74,60 +148,7 @@ def make_group_router(tipolval: str) -> APIRouter:
             codlval: str = Query(..., enum=GROUPS[tipolval]),
             value: str = Query(...),
     ):
-        # Validación de longitud general
-        if len(value) > 99:
-            raise HTTPException(
-                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-                detail="La longitud máxima permitida es 99 caracteres."
-            )
-
-        # VALIDACIONES ESPECÍFICAS PARA JWTPASS
-        if tipolval == settings.DB_JWT_TIPOLVAL and codlval == settings.DB_PASS_JWT:
-            if not (8 <= len(value) <= 30):
-                raise HTTPException(
-                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-                    detail="La contraseña de JWT debe tener entre 8 y 30 caracteres."
-                )
-
-            try:
-                validate_password_strength(value)
-            except ValueError as e:
-                raise HTTPException(
-                    status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-                    detail=str(e)
-                )
-
-            if tipolval == settings.DB_JWT_TIPOLVAL and codlval == settings.DB_PASS_JWT:
-
-                try:
-                    current_password_row = await execute_query(
-                        """
-                        SELECT Encrypt_pkg.DECRYPT(descrip) as CURRENT_VALUE
-                        FROM LVAL
-                        WHERE tipolval = :tv AND codlval = :cv
-                        """,
-                        {"tv": tipolval, "cv": codlval},
-                        db_name=database
-                    )
-
-                except oracledb.Error as e:
-                    print(f"Error de base de datos al verificar la contraseña actual: {e}")
-                    raise HTTPException(
-                        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                        detail="Error al verificar la contraseña actual en la base de datos. Por favor, inténtelo de nuevo."
-                    )
-                except Exception as e:
-                    print(f"Error inesperado al verificar la contraseña actual: {e}")
-                    raise HTTPException(
-                        status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                        detail="Error interno al verificar la contraseña actual. Por favor, inténtelo de nuevo."
-                    )
-
-                if current_password_row and current_password_row[0]["CURRENT_VALUE"] == value:
-                    raise HTTPException(
-                        status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-                        detail="La nueva contraseña no puede ser igual a la contraseña actual."
-                    )
+        await _validate_value(tipolval, codlval, value, database)
 
         try:
             filas = await call_proc_update(
@@ -136,10 +157,14 @@ def make_group_router(tipolval: str) -> APIRouter:
                 db_name=database
             )
         except Exception as e:
+            if is_retryable_oracle_error(e):
+                # Corte de conexión: el cambio pudo quedar aplicado en el servidor.
+                _invalidate_caches(tipolval, database)
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
                 detail=f"Error en PR_MAILBRIDGE.P_UPDATE_LVAL: {e}"
             )
+        _invalidate_caches(tipolval, database)
         ok = filas > 0
         code = status.HTTP_200_OK
         message = "Actualización exitosa" if ok else "No se modificaron registros"
@@ -151,6 +176,69 @@ def make_group_router(tipolval: str) -> APIRouter:
             message=message
         )
 
+    @grp.post("/bulk-update", response_model=BulkUpdateCredentialOut)
+    async def bulk_update_group(
+            payload: BulkUpdateCredentialIn = Body(...),
+            database: str = Depends(check_database_access_query_param),
+    ):
+        """
+        Actualiza varias claves del grupo en una sola transacción: primero valida todos
+        los valores y, si alguno es inválido, no aplica ninguno. Luego ejecuta
+        PR_MAILBRIDGE.P_UPDATE_LVAL con array binding en una conexión y un único commit,
+        e invalida los cachés afectados una sola vez. Si la conexión se corta durante la
+        escritura, el resultado es incierto (pudo aplicarse): se responde 500 indicándolo
+        y los cachés se invalidan igual.
+        """
+        unknown = [codlval for codlval in payload.values if codlval not in GROUPS[tipolval]]
+        if unknown:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f"Claves no válidas para {tipolval}: {', '.join(unknown)}. "
+                       f"Claves permitidas: {', '.join(GROUPS[tipolval])}"
+            )
+
+        errors = []
+        for codlval, value in payload.values.items():
+            try:
+                await _validate_value(tipolval, codlval, value, database)
+            except HTTPException as e:
+                if e.status_code != status.HTTP_422_UNPROCESSABLE_ENTITY:
+                    raise
+                errors.append({"codlval": codlval, "detail": e.detail})
+        if errors:
+            raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=errors)
+
+        codlvals = list(payload.values)
+        try:
+            filas = await call_proc_update_many(
+                "PR_MAILBRIDGE.P_UPDATE_LVAL",
+                [[tipolval, codlval, "S", payload.values[codlval]] for codlval in codlvals],
+                db_name=database
+            )
+        except Exception as e:
+            if is_retryable_oracle_error(e):
+                # Un corte de conexión (ORA-03113, ORA-03135...) durante executemany/commit puede
+                # llegar con el commit ya hecho: no se reintenta y los cachés se descartan igual.
+                _invalidate_caches(tipolval, database)
+                outcome = "estado incierto: verifique los valores antes de reintentar"
+            else:
+                outcome = "no se aplicó ningún cambio"
+            raise HTTPException(
+                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+                detail=f"Error en PR_MAILBRIDGE.P_UPDATE_LVAL ({outcome}): {e}"
+            )
+        _invalidate_caches(tipolval, database)
+
+        results = [CredentialUpdateResult(codlval=c, rows_affected=n) for c, n in zip(codlvals, filas)]
+        ok = all(n > 0 for n in filas)
+        return BulkUpdateCredentialOut(
+            rows_affected=sum(filas),
+            ok=ok,
+            code=status.HTTP_200_OK,
+            message="Actualización exitosa" if ok else "Algunas claves no modificaron registros",
+            results=results
+        )
+
     return grp
 
 
@@ -0,0 +1,52 @@
+# app/api/v1/endpoints/template_controller.py
+from fastapi import APIRouter, Body, Depends, HTTPException
+
+from app.core.dependencies import _perform_database_access_check, check_database_access_query_param
+from app.core.http_erros import HttpErrors
+from app.core.security import get_current_user
+from app.schemas.Template import TemplateIn, TemplateOut
+from services.template_service import CompiledTemplate, TemplateService
+
+router = APIRouter(
+    prefix="/templates",
+    tags=["templates"],
+    dependencies=[Depends(get_current_user)]
+)
+
+
+def _to_out(database: str, compiled: CompiledTemplate) -> TemplateOut:
+    return TemplateOut(
+        template_id=compiled.template_id,
+        database=database,
+        version=compiled.version,
+        subject=compiled.subject,
+        html_body=compiled.html_body,
+        variables=compiled.variables,
+    )
+
+
+@router.put("/{template_id}", response_model=TemplateOut, summary="Registrar plantilla de email")
+async def register_template(template_id: str, payload: TemplateIn = Body(...)) -> TemplateOut:
+    """
+    Registra (o reemplaza) una plantilla para la base de datos indicada.
+    Luego /send-email puede enviar solo template_id + template_vars.
+    """
+    _perform_database_access_check(payload.database)
+    try:
+        compiled = await TemplateService.register(payload.database, template_id, payload.html_body, payload.subject)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HttpErrors.internal_server_error(detail=f"Error inesperado al registrar la plantilla: {e}")
+    return _to_out(payload.database, compiled)
+
+
+@router.get("/{template_id}", response_model=TemplateOut, summary="Consultar plantilla de email")
+async def get_template(template_id: str, database: str = Depends(check_database_access_query_param)) -> TemplateOut:
+    try:
+        compiled = await TemplateService.get(database, template_id)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        raise HttpErrors.internal_server_error(detail=f"Error inesperado al consultar la plantilla: {e}")
+    return _to_out(database, compiled)
@@ -0,0 +1,321 @@
+# app/core/admission.py
+import asyncio
+import logging
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Optional
+
+from app.core.config import settings
+from app.core.http_erros import HttpErrors
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+# Las tareas en segundo plano (p.ej. jobs de carga) esperan turno en lugar de ser rechazadas.
+_never_reject: ContextVar[bool] = ContextVar("admission_never_reject", default=False)
+
+DRAIN_WINDOW_SECONDS = 30.0
+MIN_RETRY_AFTER = 1
+MAX_RETRY_AFTER = 120
+
+# Trabajo sin base de datos asociada.
+DEFAULT_TENANT = "default"
+
+
+def tenant_weight(tenant: str) -> float:
+    return max(0.01, float(settings.ADMISSION_TENANT_WEIGHTS.get(tenant, 1.0)))
+
+
+def cost_from_bytes(size: int) -> float:
+    """
+    Costo de un trabajo para el reparto justo: 1 unidad por MB (mínimo 1).
+    """
+    return max(1.0, size / (1024 * 1024))
+
+
+class _Waiter:
+    __slots__ = ("future", "cost", "enqueued_at")
+
+    def __init__(self, future: asyncio.Future, cost: float):
+        self.future = future
+        self.cost = cost
+        self.enqueued_at = time.monotonic()
+
+
+class _TenantStats:
+    __slots__ = ("admitted", "rejected", "avg_wait", "max_wait")
+
+    def __init__(self):
+        self.admitted = 0
+        self.rejected = 0
+        self.avg_wait = 0.0
+        self.max_wait = 0.0
+
+    def record_wait(self, wait: float) -> None:
+        self.avg_wait = wait if not self.admitted else 0.8 * self.avg_wait + 0.2 * wait
+        self.max_wait = max(self.max_wait, wait)
+        self.admitted += 1
+
+
+class AdmissionGate:
+    """
+    Limita la concurrencia de un recurso (compresión, S3, Oracle) con una cola de espera acotada.
+    Si la cola está llena, la solicitud falla de inmediato con 503 y un Retry-After
+    calculado a partir del ritmo de vaciado observado.
+
+    La cola está separada por tenant (base de datos) y los turnos se reparten con
+    deficit round-robin: cada tenant con trabajo en espera recibe por ronda un quantum
+    proporcional a su peso (ADMISSION_TENANT_WEIGHTS) y avanza mientras su crédito cubra
+    el costo del siguiente trabajo (1 unidad por MB). Además, cada tenant solo puede ocupar
+    su parte ponderada de `max_queue`, así que un tenant ruidoso se rechaza a sí mismo
+    sin llenar la cola de los demás.
+    """
+
+    def __init__(self, name: str, limit: int, max_queue: int):
+        self.name = name
+        self.limit = max(1, limit)
+        self.max_queue = max(0, max_queue)
+        self.active = 0
+        self.admitted = 0
+        self.rejected = 0
+        self._queues: Dict[str, Deque[_Waiter]] = {}
+        self._ring: Deque[str] = deque()
+        self._deficit: Dict[str, float] = {}
+        self._queued = 0
+        self._tenants: Dict[str, _TenantStats] = {}
+        self._completions: Deque[float] = deque()
+        self._avg_service_time = 0.0
+
+    @property
+    def queued(self) -> int:
+        return self._queued
+
+    def tenant_queued(self, tenant: str) -> int:
+        queue = self._queues.get(tenant)
+        return len(queue) if queue else 0
+
+    def tenant_max_queue(self, tenant: str) -> int:
+        """
+        Parte de la cola que le corresponde al tenant según su peso (al menos 1 si hay cola).
+        """
+        if self.max_queue == 0:
+            return 0
+        tenants = set(settings.AVAILABLE_DATABASES) | {tenant}
+        share = tenant_weight(tenant) / sum(tenant_weight(t) for t in tenants)
+        return max(1, math.ceil(self.max_queue * share))
+
+    def drain_rate(self) -> float:
+        """
+        Solicitudes completadas por segundo en la ventana reciente.
+        """
+        now = time.monotonic()
+        while self._completions and self._completions[0] < now - DRAIN_WINDOW_SECONDS:
+            self._completions.popleft()
+        if not self._completions:
+            return 0.0
+        elapsed = max(now - self._completions[0], 1.0)
+        return len(self._completions) / elapsed
+
+    def retry_after(self, tenant: str = DEFAULT_TENANT) -> int:
+        """
+        Segundos estimados hasta que la cola del tenant se vacíe, con la parte del ritmo
+        de vaciado que le toca frente a los demás tenants con trabajo en espera.
+        """
+        pending = self.tenant_queued(tenant) + 1
+        waiting = set(self._ring) | {tenant}
+        share = tenant_weight(tenant) / sum(tenant_weight(t) for t in waiting)
+        rate = self.drain_rate() * share
+        if rate > 0:
+            estimate = pending / rate
+        elif self._avg_service_time > 0:
+            estimate = self._avg_service_time * pending / (self.limit * share)
+        else:
+            estimate = MIN_RETRY_AFTER
+        return int(min(MAX_RETRY_AFTER, max(MIN_RETRY_AFTER, math.ceil(estimate))))
+
+    def _stats_for(self, tenant: str) -> _TenantStats:
+        stats = self._tenants.get(tenant)
+        if stats is None:
+            stats = self._tenants[tenant] = _TenantStats()
+        return stats
+
+    async def _acquire(self, tenant: str, cost: float) -> None:
+        if self.active < self.limit and not self._queued:
+            self.active += 1
+            self._stats_for(tenant).record_wait(0.0)
+            return
+
+        if self.tenant_queued(tenant) >= self.tenant_max_queue(tenant) and not _never_reject.get():
+            self.rejected += 1
+            self._stats_for(tenant).rejected += 1
+            metrics.increment("admission_rejected_total", gate=self.name, tenant=tenant)
+            retry_after = self.retry_after(tenant)
+            logger.warning("Admisión rechazada en '%s' para %s (activos=%d, en cola=%d/%d del tenant), Retry-After=%ds",
+                           self.name, tenant, self.active, self.tenant_queued(tenant),
+                           self.tenant_max_queue(tenant), retry_after)
+            raise HttpErrors.service_unavailable(
+                detail=f"Capacidad de '{self.name}' agotada para '{tenant}'. Reintente en {retry_after} segundos.",
+                retry_after=retry_after,
+            )
+
+        waiter = _Waiter(asyncio.get_running_loop().create_future(), cost)
+        queue = self._queues.get(tenant)
+        if queue is None:
+            queue = self._queues[tenant] = deque()
+            self._ring.append(tenant)
+            self._deficit[tenant] = 0.0
+        queue.append(waiter)
+        self._queued += 1
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # El turno ya nos fue transferido: lo devolvemos.
+                self._release()
+            else:
+                self._remove(tenant, waiter)
+            raise
+        wait = time.monotonic() - waiter.enqueued_at
+        self._stats_for(tenant).record_wait(wait)
+        metrics.increment("admission_wait_seconds_total", wait, gate=self.name, tenant=tenant)
+
+    def _remove(self, tenant: str, waiter: _Waiter) -> None:
+        queue = self._queues.get(tenant)
+        if queue is None or waiter not in queue:
+            return
+        queue.remove(waiter)
+        self._queued -= 1
+        if not queue:
+            self._drop_tenant(tenant)
+
+    def _drop_tenant(self, tenant: str) -> None:
+        # En DRR el crédito no se acumula mientras el tenant no tiene trabajo en espera.
+        self._queues.pop(tenant, None)
+        self._deficit.pop(tenant, None)
+        try:
+            self._ring.remove(tenant)
+        except ValueError:
+            pass
+
+    def _next_waiter(self) -> Optional[_Waiter]:
+        """
+        Deficit round-robin: el tenant al frente del anillo sigue su turno mientras su
+        crédito cubra el costo de su siguiente trabajo; si no alcanza, recibe su quantum
+        para la próxima ronda y pasa al final del anillo.
+        """
+        while self._ring:
+            tenant = self._ring[0]
+            queue = self._queues[tenant]
+            head = queue[0]
+            if self._deficit[tenant] >= head.cost:
+                self._deficit[tenant] -= head.cost
+                queue.popleft()
+                self._queued -= 1
+                if not queue:
+                    self._drop_tenant(tenant)
+                return head
+            self._deficit[tenant] += settings.ADMISSION_DRR_QUANTUM * tenant_weight(tenant)
+            self._ring.rotate(-1)
+        return None
+
+    def _release(self) -> None:
+        while True:
+            waiter = self._next_waiter()
+            if waiter is None:
+                break
+            if not waiter.future.done():
+                # Transfiere el turno directamente al siguiente elegido (active no cambia).
+                waiter.future.set_result(None)
+                return
+        self.active -= 1
+
+    @asynccontextmanager
+    async def slot(self, tenant: Optional[str] = None, cost: float = 1.0):
+        """
+        Ocupa un lugar del recurso a nombre de `tenant` (base de datos). `cost` pondera el
+        reparto justo (ver cost_from_bytes); no cambia la concurrencia.
+        """
+        tenant = tenant or DEFAULT_TENANT
+        await self._acquire(tenant, max(cost, 0.01))
+        self.admitted += 1
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - started
+            self._avg_service_time = elapsed if not self._avg_service_time \
+                else 0.8 * self._avg_service_time + 0.2 * elapsed
+            self._completions.append(time.monotonic())
+            self._release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "queued": self.queued,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "drain_rate": round(self.drain_rate(), 3),
+            "avg_service_seconds": round(self._avg_service_time, 3),
+            "tenants": {
+                tenant: {
+                    "weight": tenant_weight(tenant),
+                    "queued": self.tenant_queued(tenant),
+                    "max_queue": self.tenant_max_queue(tenant),
+                    "admitted": t.admitted,
+                    "rejected": t.rejected,
+                    "avg_wait_seconds": round(t.avg_wait, 3),
+                    "max_wait_seconds": round(t.max_wait, 3),
+                }
+                for tenant, t in self._tenants.items()
+            },
+        }
+
+
+class AdmissionControl:
+    """
+    Registro de compuertas de admisión por recurso.
+    """
+
+    def __init__(self):
+        self._gates: Dict[str, AdmissionGate] = {}
+
+    def gate(self, name: str) -> AdmissionGate:
+        gate = self._gates.get(name)
+        if gate is None:
+            limit, max_queue = _GATE_SETTINGS[name]()
+            gate = self._gates[name] = AdmissionGate(name, limit, max_queue)
+        return gate
+
+    @staticmethod
+    @contextmanager
+    def background():
+        """
+        Marca el contexto actual como trabajo en segundo plano: espera turno aunque la cola esté llena.
+        """
+        token = _never_reject.set(True)
+        try:
+            yield
+        finally:
+            _never_reject.reset(token)
+
+    def stats(self) -> Dict[str, Any]:
+        return {name: gate.stats() for name, gate in self._gates.items()}
+
+
+# Los límites configurados son totales por host; cada worker (serve.py) aplica su parte.
+_GATE_SETTINGS = {
+    "compression": lambda: (settings.per_worker(settings.ADMISSION_COMPRESSION_CONCURRENCY),
+                            settings.per_worker(settings.ADMISSION_COMPRESSION_QUEUE)),
+    "s3_upload": lambda: (settings.per_worker(settings.ADMISSION_S3_CONCURRENCY),
+                          settings.per_worker(settings.ADMISSION_S3_QUEUE)),
+    "oracle": lambda: (settings.per_worker(settings.ADMISSION_ORACLE_CONCURRENCY),
+                       settings.per_worker(settings.ADMISSION_ORACLE_QUEUE)),
+}
+
+admission_control = AdmissionControl()
+metrics.register("admission", admission_control.stats)
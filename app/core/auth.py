@@ -3,7 +3,6 @@ import re
 from datetime import datetime, timedelta
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
 
 from app.core.config import settings
 from app.db.oracle import execute_query
@@ -92,6 +91,8 @@ async def authenticate_user(db_name: str, username: str, password: str) -> bool:
     return username == db_user and password == db_pass
 
 def create_access_token(*, subject: str) -> tuple[str, int]:
+    from jose import jwt
+
     expire_delta = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     expire = datetime.utcnow() + expire_delta
     to_encode = {"exp": expire, "sub": subject}
@@ -99,6 +100,8 @@ def create_access_token(*, subject: str) -> tuple[str, int]:
     return encoded, int(expire_delta.total_seconds())
 
 def get_current_user(token: str = Depends(oauth2_scheme)) -> str:
+    from jose import JWTError, jwt
+
     try:
         payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
         user = payload.get("sub")
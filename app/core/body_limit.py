@@ -0,0 +1,256 @@
+# app/core/body_limit.py
+import logging
+import zlib
+from typing import AsyncIterator, Dict, Iterator, Optional
+
+from fastapi import Request
+from starlette.datastructures import FormData
+from starlette.formparsers import MultiPartException, MultiPartParser
+from fastapi.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.config import settings
+from app.core.http_erros import HttpErrors
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+def base64_body_limit(raw_bytes: int, overhead: int = 64 * 1024) -> int:
+    """
+    Tamaño máximo de un cuerpo JSON que lleva `raw_bytes` codificados en base64
+    (4/3 del original más margen para el resto de los campos).
+    """
+    return (raw_bytes + 2) // 3 * 4 + overhead
+
+
+class BodySizeLimitMiddleware:
+    """
+    Middleware ASGI que acota el tamaño del cuerpo de cada solicitud antes de bufferizarlo:
+    rechaza con 413 si el Content-Length declarado supera el límite y, si no lo hay
+    (chunked) o es falso, cuenta los bytes a medida que llegan y corta en cuanto se pasa.
+    El límite es por ruta (route_limits, por path exacto) con un valor por defecto, y queda en
+    request.state.body_limit para acotar también el cuerpo ya descomprimido (read_body).
+    """
+
+    def __init__(self, app: ASGIApp, default_limit: int, route_limits: Optional[Dict[str, int]] = None):
+        self.app = app
+        self.default_limit = default_limit
+        self.route_limits = {path.rstrip("/") or "/": limit for path, limit in (route_limits or {}).items()}
+
+    def limit_for(self, path: str) -> int:
+        return self.route_limits.get(path.rstrip("/") or "/", self.default_limit)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        limit = self.limit_for(path)
+        route = path if (path.rstrip("/") or "/") in self.route_limits else "default"
+        detail = f"El cuerpo de la solicitud supera el límite de {limit} bytes para esta ruta."
+
+        content_length = _header(scope, b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > limit:
+            metrics.increment("request_body_rejected_total", route=route, reason="content_length")
+            logger.warning("Solicitud a %s rechazada: Content-Length %s > %s", path, content_length, limit)
+            response = JSONResponse({"detail": detail}, status_code=413, headers={"Connection": "close"})
+            await response(scope, receive, send)
+            return
+
+        scope.setdefault("state", {})["body_limit"] = limit
+        received = 0
+
+        async def limited_receive() -> Message:
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    metrics.increment("request_body_rejected_total", route=route, reason="streamed")
+                    logger.warning("Solicitud a %s cortada tras %s bytes (límite %s)", path, received, limit)
+                    raise HttpErrors.payload_too_large(detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+def _header(scope: Scope, name: bytes) -> Optional[str]:
+    for key, value in scope.get("headers", []):
+        if key == name:
+            return value.decode("latin-1")
+    return None
+
+
+# Entrada que se entrega por vez al descompresor zstd: su salida no se puede acotar por llamada,
+# así que se alimenta en trozos chicos (un bloque RLE de 128 KB ocupa unos pocos bytes).
+ZSTD_FEED_BYTES = 256
+# Ventana máxima que se acepta en un frame zstd: la del límite de la ruta (sin esto zstandard
+# reserva hasta 128 MB con un cuerpo de pocos bytes), pero nunca menos que la que usan los
+# niveles 1-19 en streaming, para no rechazar cuerpos legítimos.
+ZSTD_MIN_WINDOW_BYTES = 8 * 1024 * 1024
+
+
+class _GzipDecoder:
+    """
+    Descompresión gzip incremental con la salida acotada por llamada (max_length): lo que no
+    cabe queda en unconsumed_tail y se procesa en la siguiente vuelta. Admite varios miembros
+    concatenados, como gzip(1).
+    """
+
+    def __init__(self) -> None:
+        self._d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+
+    @property
+    def eof(self) -> bool:
+        return self._d.eof
+
+    def feed(self, data: bytes, max_length: int) -> Iterator[bytes]:
+        while data:
+            if self._d.eof:
+                self._d = zlib.decompressobj(16 + zlib.MAX_WBITS)
+            try:
+                out = self._d.decompress(data, max_length)
+            except zlib.error as e:
+                raise HttpErrors.bad_request(detail=f"El cuerpo gzip está corrupto: {e}")
+            if out:
+                yield out
+            data = self._d.unused_data if self._d.eof else self._d.unconsumed_tail
+
+
+class _ZstdDecoder:
+    """
+    Descompresión zstd incremental (dependencia opcional `zstandard`); varios frames
+    concatenados se descomprimen en secuencia.
+    """
+
+    def __init__(self, zstandard, max_window_size: int) -> None:
+        self._zstd = zstandard
+        self._max_window_size = max_window_size
+        self._d = self._decompressobj()
+
+    def _decompressobj(self):
+        return self._zstd.ZstdDecompressor(max_window_size=self._max_window_size).decompressobj()
+
+    @property
+    def eof(self) -> bool:
+        return self._d.eof
+
+    def feed(self, data: bytes, max_length: int) -> Iterator[bytes]:
+        for i in range(0, len(data), ZSTD_FEED_BYTES):
+            piece = data[i:i + ZSTD_FEED_BYTES]
+            while piece:
+                if self._d.eof:
+                    self._d = self._decompressobj()
+                try:
+                    out = self._d.decompress(piece)
+                except self._zstd.ZstdError as e:
+                    if "too much memory" in str(e):
+                        raise HttpErrors.payload_too_large(
+                            detail=f"El frame zstd requiere una ventana mayor a {self._max_window_size} bytes."
+                        )
+                    raise HttpErrors.bad_request(detail=f"El cuerpo zstd está corrupto: {e}")
+                if out:
+                    yield out
+                piece = self._d.unused_data if self._d.eof else b""
+
+
+def _decoder(encoding: str, limit: int):
+    if encoding in ("gzip", "x-gzip"):
+        return _GzipDecoder()
+    if encoding == "zstd":
+        try:
+            import zstandard
+        except ImportError:
+            raise HttpErrors.unsupported_media_type(
+                detail="Content-Encoding 'zstd' no está habilitado en este servidor; use gzip."
+            )
+        return _ZstdDecoder(zstandard, max(ZSTD_MIN_WINDOW_BYTES, 1 << (limit - 1).bit_length()))
+    raise HttpErrors.unsupported_media_type(
+        detail=f"Content-Encoding '{encoding}' no soportado; use gzip o zstd."
+    )
+
+
+def _content_encoding(request: Request) -> Optional[str]:
+    encoding = (request.headers.get("content-encoding") or "").strip().lower()
+    return None if encoding in ("", "identity") else encoding
+
+
+async def decoded_stream(request: Request, max_size: Optional[int] = None) -> AsyncIterator[bytes]:
+    """
+    Cuerpo de la solicitud ya decodificado según Content-Encoding (gzip o zstd), chunk a chunk.
+    BodySizeLimitMiddleware acota los bytes comprimidos; aquí se acota la salida a `max_size`
+    (por defecto el límite de la ruta) y se corta con 413 apenas se supera, sin descomprimir
+    el resto: un cuerpo de pocos KB que se expande a GB (zip bomb) nunca llega a memoria.
+    """
+    encoding = _content_encoding(request)
+    if encoding is None:
+        async for chunk in request.stream():
+            yield chunk
+        return
+
+    limit = max_size if max_size is not None else getattr(request.state, "body_limit", settings.MAX_REQUEST_BODY_BYTES)
+    decoder = _decoder(encoding, limit)
+    received = produced = 0
+    async for chunk in request.stream():
+        received += len(chunk)
+        # Una salida de limit - produced + 1 basta para saber si el cuerpo se pasa del límite.
+        for out in decoder.feed(chunk, limit - produced + 1):
+            produced += len(out)
+            if produced > limit:
+                metrics.increment("request_body_rejected_total", route=request.url.path, reason="decompressed")
+                logger.warning("Solicitud a %s cortada: el cuerpo %s supera %s bytes descomprimido",
+                               request.url.path, encoding, limit)
+                raise HttpErrors.payload_too_large(
+                    detail=f"El cuerpo descomprimido supera el límite de {limit} bytes para esta ruta."
+                )
+            yield out
+    if received and not decoder.eof:
+        raise HttpErrors.bad_request(detail=f"El cuerpo {encoding} está truncado.")
+
+
+async def read_body(request: Request, max_size: Optional[int] = None) -> bytearray:
+    """
+    Lee el cuerpo completo en un único buffer. Con Content-Length (ya acotado por
+    BodySizeLimitMiddleware) se reserva de una vez y se llena in-place, sin la lista de
+    chunks + join de request.body() que duplica el pico de memoria. Con Content-Encoding
+    el cuerpo se descomprime en streaming (decoded_stream), acotado a `max_size`.
+    """
+    if _content_encoding(request) is not None:
+        buf = bytearray()
+        async for chunk in decoded_stream(request, max_size):
+            buf += chunk
+        return buf
+
+    length = request.headers.get("content-length")
+    if length is None or not length.isdigit():
+        buf = bytearray()
+        async for chunk in request.stream():
+            buf += chunk
+        return buf
+
+    buf = bytearray(int(length))
+    pos = 0
+    with memoryview(buf) as view:
+        async for chunk in request.stream():
+            end = pos + len(chunk)
+            if end > len(buf):
+                raise HttpErrors.bad_request(detail="El cuerpo de la solicitud excede el Content-Length declarado.")
+            view[pos:end] = chunk
+            pos = end
+    if pos != len(buf):
+        del buf[pos:]
+    return buf
+
+
+async def read_form(request: Request, max_size: Optional[int] = None, max_files: int = 1) -> FormData:
+    """
+    Parsea un cuerpo multipart/form-data desde decoded_stream: los archivos llegan en binario
+    (sin el 4/3 de base64) y también pueden venir comprimidos con Content-Encoding.
+    El llamador debe cerrar el FormData (await form.close()).
+    """
+    try:
+        return await MultiPartParser(request.headers, decoded_stream(request, max_size), max_files=max_files).parse()
+    except MultiPartException as e:
+        raise HttpErrors.bad_request(detail=f"Cuerpo multipart inválido: {e.message}")
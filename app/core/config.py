@@ -1,13 +1,17 @@
 # app/core/config.py
+import logging
 import os
+from functools import cached_property
 from pathlib import Path
-from typing import Dict, Any, Literal, List, ClassVar
+from typing import Dict, Any, Literal, List, ClassVar, Optional
 
 from dotenv import load_dotenv
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 class DatabaseConfig(BaseSettings):
     DB_HOST: str
     DB_USER: str
@@ -26,8 +30,6 @@ class Settings(BaseSettings):
 
     AVAILABLE_DATABASES: ClassVar[List[str]] = PROD_DATABASES + QA_DATABASES
 
-    DATABASE_CONNECTIONS: Dict[str, DatabaseConfig] = {}
-
     # → AWS / SQS / S3
     DB_AWS_TIPOLVAL:       str
     DB_AWS_KEY:            str
@@ -37,6 +39,8 @@ class Settings(BaseSettings):
     DB_AWS_BUCKET:         str
     DB_AWS_S3_PREFIX:      str
     DB_STS_LVAL:           str
+    DB_PDF_COMPRESSION_DEADLINE: str = "PDF_COMPRESSION_DEADLINE"  # CODLVAL opcional: plazo en segundos por base
+    AWS_MAX_POOL_CONNECTIONS: int = 50   # conexiones HTTP por cliente boto3 (botocore usa 10 por defecto)
 
     # → JWT
     DB_JWT_TIPOLVAL:       str
@@ -46,6 +50,146 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int
     JWT_ALGORITHM: str
 
+    # → Arranque: precarga en segundo plano de dependencias pesadas
+    WARMUP_ON_STARTUP:           bool = True
+
+    # → Apagado ordenado: al recibir SIGTERM el worker se reporta no-listo en /ready, sigue
+    #   atendiendo SHUTDOWN_READINESS_DELAY_SECONDS (para que el balanceador lo retire) y luego
+    #   drena solicitudes, jobs y mensajes pendientes hasta SHUTDOWN_TIMEOUT_SECONDS antes de cerrar.
+    SHUTDOWN_READINESS_DELAY_SECONDS: float = 0.0
+    SHUTDOWN_TIMEOUT_SECONDS:         float = 30.0
+
+    # → Modo multi-proceso (serve.py). Pools de Oracle y límites de admisión son totales
+    #   por host y se reparten entre los WEB_CONCURRENCY workers.
+    WEB_CONCURRENCY:             int = 1
+    SERVER_HOST:                 str = "0.0.0.0"
+    SERVER_PORT:                 int = 8000
+    ORACLE_POOL_MIN:             int = 2
+    ORACLE_POOL_MAX:             int = 10
+    SHARED_CACHE_ENABLED:        Optional[bool] = None  # None: activo solo si WEB_CONCURRENCY > 1
+    SHARED_CACHE_PATH:           str = "/dev/shm/mailbridge/shared-cache.sqlite3"
+    SHARED_CACHE_MAX_ENTRIES:    int = 10_000
+    LVAL_SHARED_TTL_SECONDS:     int = 3600
+    LVAL_VERSION_CHECK_SECONDS:  float = 2.0  # cada cuánto un worker revisa si otro invalidó su LVAL
+    TOKEN_CACHE_TTL_SECONDS:     int = 300
+
+    # → Límites del cuerpo de las solicitudes (se cortan con 413 mientras llegan, antes de bufferizar)
+    MAX_UPLOAD_BYTES:            int = 8 * 1024 * 1024   # archivos decodificados por solicitud
+    MAX_REQUEST_BODY_BYTES:      int = 2 * 1024 * 1024   # rutas sin límite propio
+    UPLOAD_SPOOL_THRESHOLD_BYTES: int = 4 * 1024 * 1024  # por encima, los PDFs comprimidos/descargados van a disco
+    REQUEST_BODY_LIMITS:         Dict[str, int] = {}     # overrides por path, p.ej. {"/api/v1/upload": 20971520}
+
+    # → Compresión de PDFs > 1 MB: "ghostscript" (gs + pikepdf), "images" (solo reduce y recomprime
+    # las imágenes con pikepdf + Pillow, sin tocar fuentes ni vectores) o "auto" (gs si está instalado).
+    # Cada solicitud de carga puede elegir el motor con `compression_engine`.
+    PDF_COMPRESSION_ENGINE:      Literal["auto", "ghostscript", "images"] = "auto"
+    PDF_IMAGE_TARGET_DPI:        int = 150
+    PDF_IMAGE_JPEG_QUALITY:      int = 75
+    # Los PDFs grandes con al menos PDF_PARALLEL_MIN_PAGES páginas (0 desactiva) se dividen en rangos
+    # que se comprimen a la vez en un pool de procesos y se vuelven a unir deduplicando recursos.
+    # Solo aplica a la compresión sin plazo: con plazo cada proceso de compresión trabaja en serie.
+    PDF_PARALLEL_MIN_PAGES:      int = 40
+    PDF_PARALLEL_WORKERS:        Optional[int] = None  # procesos por worker; por defecto los núcleos / WEB_CONCURRENCY
+    # Plazo de compresión por archivo (0 desactiva; por base de datos con el CODLVAL DB_PDF_COMPRESSION_DEADLINE),
+    # acotado además por lo que le quede a la solicitud. La compresión corre en procesos que se matan
+    # al vencer el plazo, y se sube el archivo original.
+    PDF_COMPRESSION_DEADLINE_SECONDS: float = 20.0
+
+    # → Jobs de carga asíncrona (/upload-async)
+    UPLOAD_JOBS_DIR:             str = "/tmp/mailbridge/upload-jobs"
+    UPLOAD_JOB_WORKERS:          int = 2
+    UPLOAD_JOB_LEASE_SECONDS:    int = 300
+    UPLOAD_JOB_MAX_ATTEMPTS:     int = 3
+    UPLOAD_JOB_POLL_SECONDS:     float = 5.0
+    UPLOAD_JOB_RETENTION_HOURS:  int = 24
+
+    # → Cargas directas a S3 con URLs prefirmadas
+    PRESIGNED_UPLOAD_MAX_BYTES:       int = 100 * 1024 * 1024
+    PRESIGNED_UPLOAD_EXPIRES_SECONDS: int = 900
+    PRESIGNED_UPLOAD_STAGING_PREFIX:  str = "incoming/"
+
+    # → URLs prefirmadas de descarga (GET) para adjuntos. Se cachean por ventana de expiración:
+    #   en una misma ventana todos reciben la misma URL, vigente al menos `expires_in` segundos.
+    PRESIGNED_GET_EXPIRES_SECONDS:        int = 3600
+    PRESIGNED_GET_MAX_EXPIRES_SECONDS:    int = 7 * 24 * 3600 - 3600  # SigV4 admite hasta 7 días
+    PRESIGNED_GET_EXPIRY_BUCKET_SECONDS:  int = 300
+    PRESIGNED_GET_MAX_BATCH:              int = 1000
+    PRESIGNED_GET_CACHE_SIZE:             int = 20_000
+
+    # → Descarga de documentos (/documents): caché LRU en disco compartido por los workers del host
+    DOCUMENT_CACHE_DIR:                str = "/tmp/mailbridge/document-cache"
+    DOCUMENT_CACHE_MAX_BYTES:          int = 1024 * 1024 * 1024
+    DOCUMENT_CACHE_MAX_OBJECT_BYTES:   int = 50 * 1024 * 1024    # los más grandes se sirven directo desde S3
+    DOCUMENT_CACHE_REVALIDATE_SECONDS: float = 60.0              # antes de esto, un hit no consulta S3
+    DOCUMENT_STREAM_CHUNK_BYTES:       int = 256 * 1024
+
+    # → Outbox local de emails: /send-email responde tras un append durable (SQLite WAL + fsync)
+    #   y un relay en segundo plano los reenvía a SQS en lotes, con reintentos y backoff.
+    EMAIL_OUTBOX_ENABLED:            bool = False
+    EMAIL_OUTBOX_PATH:               str = "/tmp/mailbridge/email-outbox.sqlite3"
+    EMAIL_OUTBOX_BATCH_SIZE:         int = 10      # mensajes por SendMessageBatch (máximo SQS: 10)
+    EMAIL_OUTBOX_LINGER_MS:          int = 20      # espera para agrupar mensajes antes de enviar
+    EMAIL_OUTBOX_POLL_SECONDS:       float = 5.0
+    EMAIL_OUTBOX_LEASE_SECONDS:      int = 60
+    EMAIL_OUTBOX_MAX_ATTEMPTS:       int = 20      # luego el mensaje queda como 'dead' para revisión
+    EMAIL_OUTBOX_MAX_BACKOFF_SECONDS: float = 300.0
+
+    # → Dispatcher SQS → SES (dispatch.py): consume la cola de emails de cada base y envía por SES
+    DISPATCHER_CONCURRENCY:               int = 16
+    DISPATCHER_SEND_RATE:                 Optional[float] = None  # emails/s; None: MaxSendRate de la cuenta SES
+    DISPATCHER_WAIT_TIME_SECONDS:         int = 20     # long polling de ReceiveMessage
+    DISPATCHER_VISIBILITY_TIMEOUT_SECONDS: int = 60    # se extiende mientras el envío siga en curso
+    DISPATCHER_MAX_BACKOFF_SECONDS:       int = 900    # demora máxima antes de reintentar un envío fallido
+    DISPATCHER_METRICS_INTERVAL_SECONDS:  float = 30.0
+
+    # → Destinatarios: direcciones ya validadas (normalizadas) en un caché LRU por proceso, y
+    #   listas grandes divididas en varios mensajes SQS (SES acepta hasta 50 destinatarios por envío).
+    EMAIL_VALIDATION_CACHE_SIZE:      int = 50_000
+    EMAIL_MAX_RECIPIENTS_PER_MESSAGE: int = 50
+    EMAIL_MAX_RECIPIENTS_PER_REQUEST: int = 5_000
+
+    # → Idempotencia (header Idempotency-Key)
+    IDEMPOTENCY_BACKEND:             Optional[Literal["memory", "sqlite"]] = None  # None: sqlite si WEB_CONCURRENCY > 1
+    IDEMPOTENCY_DB_PATH:             str = "/tmp/mailbridge/idempotency.sqlite3"
+    IDEMPOTENCY_TTL_SECONDS:         int = 24 * 3600
+    IDEMPOTENCY_PENDING_TTL_SECONDS: int = 300
+    IDEMPOTENCY_MAX_ENTRIES:         int = 10_000
+    IDEMPOTENCY_WAIT_SECONDS:        float = 60.0
+
+    # → Control de admisión (concurrencia máxima y longitud de cola por recurso)
+    ADMISSION_COMPRESSION_CONCURRENCY: int = os.cpu_count() or 2
+    ADMISSION_COMPRESSION_QUEUE:       int = 32
+    ADMISSION_S3_CONCURRENCY:          int = 16
+    ADMISSION_S3_QUEUE:                int = 64
+    ADMISSION_ORACLE_CONCURRENCY:      int = 10
+    ADMISSION_ORACLE_QUEUE:            int = 100
+    # Reparto justo entre bases de datos (deficit round-robin): peso por base (1.0 por defecto)
+    # y quantum en unidades de costo (1 unidad = 1 MB de archivo) que recibe cada tenant por ronda.
+    ADMISSION_TENANT_WEIGHTS:          Dict[str, float] = {}
+    ADMISSION_DRR_QUANTUM:             float = 1.0
+
+    # → Executors por subsistema (hilos por proceso y trabajos en espera antes de responder 503).
+    #   None: DB = concurrencia de la compuerta oracle + 2, CPU = concurrencia de compresión.
+    EXECUTOR_DB_THREADS:               Optional[int] = None
+    EXECUTOR_DB_QUEUE:                 int = 200
+    EXECUTOR_AWS_THREADS:              int = 32
+    EXECUTOR_AWS_QUEUE:                int = 500
+    EXECUTOR_CPU_THREADS:              Optional[int] = None
+    EXECUTOR_CPU_QUEUE:                int = 64
+
+    # → Resiliencia (reintentos con backoff + jitter y circuit breakers por base de datos/servicio)
+    REQUEST_DEADLINE_SECONDS:   float = 30.0
+    RETRY_MAX_ATTEMPTS:         int = 4
+    RETRY_BASE_DELAY_SECONDS:   float = 0.1
+    RETRY_MAX_DELAY_SECONDS:    float = 2.0
+    CIRCUIT_FAILURE_THRESHOLD:  int = 5
+    CIRCUIT_RECOVERY_SECONDS:   float = 30.0
+
+    # → Plantillas de email (guardadas en el bucket S3 de cada base de datos)
+    TEMPLATES_S3_PREFIX:         str = "mailbridge-templates/"
+    TEMPLATE_CACHE_SIZE:         int = 256
+    TEMPLATE_CACHE_TTL_SECONDS:  int = 300
+
     model_config = SettingsConfigDict(
         env_file = '.env',
         env_file_encoding = "utf-8",
@@ -53,8 +197,35 @@ class Settings(BaseSettings):
         case_sensitive = False
     )
 
-    def __init__(self, **data: Any):
-        super().__init__(**data)
+    def per_worker(self, total: int) -> int:
+        """
+        Parte de un total por host que le corresponde a cada worker (al menos 1).
+        """
+        return max(1, total // max(1, self.WEB_CONCURRENCY))
+
+    @property
+    def shared_cache_enabled(self) -> bool:
+        if self.SHARED_CACHE_ENABLED is None:
+            return self.WEB_CONCURRENCY > 1
+        return self.SHARED_CACHE_ENABLED
+
+    @property
+    def idempotency_backend(self) -> str:
+        """
+        Almacén de idempotencia efectivo: con varios workers el de memoria no ve las claves de
+        los demás, así que por defecto se usa el SQLite compartido del host.
+        """
+        if self.IDEMPOTENCY_BACKEND is None:
+            return "sqlite" if self.WEB_CONCURRENCY > 1 else "memory"
+        return self.IDEMPOTENCY_BACKEND
+
+    @cached_property
+    def DATABASE_CONNECTIONS(self) -> Dict[str, DatabaseConfig]:
+        """
+        Configuración de conexión por base de datos (DB_<NOMBRE>_HOST/USER/PASSWORD/SERVICE_NAME).
+        Se arma al primer acceso (al crear el primer pool), no al importar la configuración.
+        """
+        connections: Dict[str, DatabaseConfig] = {}
         for db_name in self.AVAILABLE_DATABASES:
             host_var = f"DB_{db_name.upper()}_HOST"
             user_var = f"DB_{db_name.upper()}_USER"
@@ -67,20 +238,27 @@ class Settings(BaseSettings):
             db_service_name = os.getenv(service_name_var)
 
             if not all([db_host, db_user, db_password, db_service_name]):
-                print(f"Advertencia: No se pudo cargar la configuración completa para la base de datos '{db_name}'.")
-                print(f"Asegúrese de que las variables {host_var}, {user_var}, {password_var}, {service_name_var} están definidas en su archivo .env")
+                logger.warning(
+                    "No se pudo cargar la configuración completa para la base de datos '%s'. "
+                    "Asegúrese de que las variables %s, %s, %s, %s están definidas en su archivo .env",
+                    db_name, host_var, user_var, password_var, service_name_var,
+                )
                 continue
 
             try:
-                self.DATABASE_CONNECTIONS[db_name] = DatabaseConfig(
+                connections[db_name] = DatabaseConfig(
                     DB_HOST=db_host,
                     DB_USER=db_user,
                     DB_PASSWORD=db_password,
                     DB_SERVICE_NAME=db_service_name
                 )
-                print(f"Configuración para '{db_name}' cargada exitosamente.")
+                logger.info("Configuración para '%s' cargada exitosamente.", db_name)
             except Exception as e:
-                print(f"Error inesperado al procesar la configuración para '{db_name}': {e}")
-                print(f"Valores obtenidos: HOST={db_host}, USER={db_user}, PASS={'*' * len(db_password) if db_password else 'None'}, SERVICE_NAME={db_service_name}")
+                logger.error(
+                    "Error inesperado al procesar la configuración para '%s': %s "
+                    "(HOST=%s, USER=%s, SERVICE_NAME=%s)",
+                    db_name, e, db_host, db_user, db_service_name,
+                )
+        return connections
 
 settings = Settings()
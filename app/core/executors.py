@@ -0,0 +1,230 @@
+# app/core/executors.py
+import asyncio
+import contextvars
+import logging
+import os
+import threading
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import TYPE_CHECKING, Any, Callable, Dict, Optional, TypeVar
+
+from app.core.config import settings
+from app.core.http_erros import HttpErrors
+from app.core.metrics import metrics
+from utils.pdf_parallel import new_process_pool
+
+if TYPE_CHECKING:
+    from utils.killable_pool import KillableProcessPool
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+DB = "db"
+AWS = "aws"
+CPU = "cpu"
+
+
+class _Task:
+    __slots__ = ("submitted", "started", "cancelled")
+
+    def __init__(self):
+        self.submitted = time.monotonic()
+        self.started = False
+        self.cancelled = False
+
+
+class BoundedExecutor:
+    """
+    Pool de hilos con nombre para un subsistema (Oracle, AWS, CPU), con un límite de trabajos
+    en espera: si se supera, la llamada falla de inmediato con 503 en lugar de encolarse sin fin.
+    Reporta utilización (hilos ocupados / hilos) y el tiempo que los trabajos esperan un hilo.
+    Como asyncio.to_thread, propaga el contexto (contextvars) al hilo.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name = name
+        self.max_workers = max(1, max_workers)
+        self.max_queue = max(0, max_queue)
+        self.active = 0
+        self.queued = 0
+        self.completed = 0
+        self.rejected = 0
+        self._wait_avg = 0.0
+        self._wait_max = 0.0
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Se crea en el primer uso: con serve.py, dentro de cada worker y no en el padre.
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"mb-{self.name}")
+        return self._executor
+
+    def _record_start(self, task: _Task) -> bool:
+        with self._lock:
+            if task.cancelled:
+                return False
+            task.started = True
+            self.queued -= 1
+            self.active += 1
+            wait = time.monotonic() - task.submitted
+            self._wait_avg = wait if not self.completed else 0.9 * self._wait_avg + 0.1 * wait
+            self._wait_max = max(self._wait_max, wait)
+            return True
+
+    def _record_end(self) -> None:
+        with self._lock:
+            self.active -= 1
+            self.completed += 1
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        with self._lock:
+            if self.queued >= self.max_queue and self.active >= self.max_workers:
+                self.rejected += 1
+                rejected = True
+            else:
+                self.queued += 1
+                rejected = False
+        if rejected:
+            metrics.increment("executor_rejected_total", executor=self.name)
+            logger.warning("Executor '%s' saturado (%d hilos ocupados, %d en espera)",
+                           self.name, self.active, self.queued)
+            raise HttpErrors.service_unavailable(
+                detail=f"Capacidad de '{self.name}' agotada. Reintente en 1 segundos.",
+                retry_after=1,
+            )
+
+        task = _Task()
+        ctx = contextvars.copy_context()
+
+        def _call() -> Optional[T]:
+            if not self._record_start(task):
+                return None
+            try:
+                return ctx.run(fn, *args, **kwargs)
+            finally:
+                self._record_end()
+
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(self._get_executor(), _call)
+        except asyncio.CancelledError:
+            with self._lock:
+                if not task.started and not task.cancelled:
+                    task.cancelled = True
+                    self.queued -= 1
+            raise
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "threads": self.max_workers,
+            "max_queue": self.max_queue,
+            "active": self.active,
+            "queued": self.queued,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "utilization": round(self.active / self.max_workers, 3),
+            "avg_queue_wait_seconds": round(self._wait_avg, 4),
+            "max_queue_wait_seconds": round(self._wait_max, 4),
+        }
+
+
+# Tamaños por proceso. El de Oracle no debe ser menor que la concurrencia de la compuerta
+# 'oracle': los hilos que esperan una conexión del pool no pueden dejar sin hilo a quienes ya
+# tienen una y necesitan ejecutar su consulta.
+_EXECUTOR_SETTINGS = {
+    DB: lambda: (settings.EXECUTOR_DB_THREADS
+                 or settings.per_worker(settings.ADMISSION_ORACLE_CONCURRENCY) + 2,
+                 settings.EXECUTOR_DB_QUEUE),
+    AWS: lambda: (settings.EXECUTOR_AWS_THREADS, settings.EXECUTOR_AWS_QUEUE),
+    CPU: lambda: (settings.EXECUTOR_CPU_THREADS
+                  or settings.per_worker(settings.ADMISSION_COMPRESSION_CONCURRENCY),
+                  settings.EXECUTOR_CPU_QUEUE),
+}
+
+_executors: Dict[str, BoundedExecutor] = {}
+
+
+def get_executor(name: str) -> BoundedExecutor:
+    executor = _executors.get(name)
+    if executor is None:
+        max_workers, max_queue = _EXECUTOR_SETTINGS[name]()
+        executor = _executors[name] = BoundedExecutor(name, max_workers, max_queue)
+    return executor
+
+
+async def run_in(name: str, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Ejecuta una llamada bloqueante en el executor del subsistema (DB, AWS o CPU).
+    """
+    return await get_executor(name).run(fn, *args, **kwargs)
+
+
+_process_pool: Optional[Executor] = None
+
+
+def pdf_process_workers() -> int:
+    return settings.PDF_PARALLEL_WORKERS or settings.per_worker(os.cpu_count() or 1)
+
+
+def get_process_pool() -> Optional[Executor]:
+    """
+    Pool de procesos para comprimir por rangos de páginas los PDFs grandes (se crea en el primer
+    uso y se recrea si un proceso murió). None si la compresión en paralelo está desactivada.
+    """
+    global _process_pool
+    workers = pdf_process_workers()
+    if workers < 2 or settings.PDF_PARALLEL_MIN_PAGES <= 0:
+        return None
+    if _process_pool is not None and getattr(_process_pool, "_broken", False):
+        logger.warning("Pool de procesos de compresión roto; se recrea")
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+    if _process_pool is None:
+        _process_pool = new_process_pool(workers)
+    return _process_pool
+
+
+_compression_workers: Optional["KillableProcessPool"] = None
+_compression_workers_pid = 0
+
+
+def get_compression_workers() -> "KillableProcessPool":
+    """
+    Procesos de compresión con plazo (PDF_COMPRESSION_DEADLINE_SECONDS): uno por hilo del
+    executor CPU, precargados con pikepdf. Un proceso que vence el plazo se mata y se reemplaza.
+    Un pool heredado por fork es del padre (sus pipes los comparten todos los hijos): se crea otro.
+    """
+    global _compression_workers, _compression_workers_pid
+    if _compression_workers is None or _compression_workers_pid != os.getpid():
+        from utils.compress_pdf_bytes import preload
+        from utils.killable_pool import KillableProcessPool
+
+        _compression_workers = KillableProcessPool(get_executor(CPU).max_workers, initializer=preload)
+        _compression_workers_pid = os.getpid()
+    return _compression_workers
+
+
+def shutdown_executors() -> None:
+    global _process_pool, _compression_workers
+    for executor in _executors.values():
+        executor.shutdown()
+    _executors.clear()
+    if _process_pool is not None:
+        _process_pool.shutdown(wait=False, cancel_futures=True)
+        _process_pool = None
+    if _compression_workers is not None and _compression_workers_pid == os.getpid():
+        _compression_workers.close()
+    _compression_workers = None
+
+
+metrics.register("executors", lambda: {name: e.stats() for name, e in _executors.items()})
+metrics.register("compression_workers",
+                 lambda: _compression_workers.stats()
+                 if _compression_workers is not None and _compression_workers_pid == os.getpid() else {})
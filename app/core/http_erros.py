@@ -1,3 +1,5 @@
+from typing import Optional
+
 from fastapi import HTTPException, status
 
 class HttpErrors:
@@ -74,6 +76,42 @@ class HttpErrors:
             detail=detail
         )
 
+    @staticmethod
+    def payload_too_large(detail: str = "El cuerpo de la solicitud supera el tamaño máximo permitido.") -> HTTPException:
+        """
+        Genera una excepción 413 Payload Too Large.
+        Indica que el cuerpo de la solicitud es mayor de lo que el servidor acepta procesar.
+        """
+        return HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=detail,
+            headers={"Connection": "close"},
+        )
+
+    @staticmethod
+    def unsupported_media_type(detail: str = "El tipo o la codificación del contenido no es soportado.") -> HTTPException:
+        """
+        Genera una excepción 415 Unsupported Media Type.
+        Indica que el Content-Type o el Content-Encoding del cuerpo no se pueden procesar.
+        """
+        return HTTPException(
+            status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail=detail,
+        )
+
+    @staticmethod
+    def range_not_satisfiable(size: int, detail: str = "El rango solicitado no es válido para el recurso.") -> HTTPException:
+        """
+        Genera una excepción 416 Range Not Satisfiable.
+        Indica que el rango pedido en el header Range queda fuera del recurso; el header
+        Content-Range informa el tamaño real.
+        """
+        return HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail=detail,
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+
     @staticmethod
     def unprocessable_entity(detail: str = "La entidad no pudo ser procesada debido a errores de validación semántica.") -> HTTPException:
         """
@@ -97,14 +135,28 @@ class HttpErrors:
         )
 
     @staticmethod
-    def service_unavailable(detail: str = "El servicio no está disponible temporalmente. Por favor, inténtelo de nuevo más tarde.") -> HTTPException:
+    def bad_gateway(detail: str = "El servidor recibió una respuesta inválida de un servidor ascendente.") -> HTTPException:
+        """
+        Genera una excepción 502 Bad Gateway.
+        Indica que un servidor actuando como gateway o proxy recibió una respuesta inválida o un rechazo.
+        """
+        return HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail=detail
+        )
+
+    @staticmethod
+    def service_unavailable(detail: str = "El servicio no está disponible temporalmente. Por favor, inténtelo de nuevo más tarde.",
+                            retry_after: Optional[int] = None) -> HTTPException:
         """
         Genera una excepción 503 Service Unavailable.
         Indica que el servidor no puede manejar la solicitud temporalmente, quizás debido a una sobrecarga o mantenimiento.
+        Si se indica retry_after, se agrega el header Retry-After (en segundos).
         """
         return HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
-            detail=detail
+            detail=detail,
+            headers={"Retry-After": str(retry_after)} if retry_after is not None else None,
         )
 
     @staticmethod
@@ -0,0 +1,163 @@
+# app/core/lifecycle.py
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+DRAIN_POLL_SECONDS = 0.1
+
+ShutdownHook = Callable[[float], Awaitable[None]]
+
+
+class Lifecycle:
+    """
+    Estado de vida del proceso: readiness, solicitudes en curso y apagado ordenado.
+
+    - `ready` es falso hasta que termina el arranque y vuelve a serlo al empezar el drenaje:
+      /ready responde 503 para que el balanceador deje de enviar tráfico a este worker.
+    - Las solicitudes en curso se cuentan en InFlightMiddleware.
+    - Los subsistemas registran hooks de drenaje (workers de jobs, mensajes pendientes) y
+      de cierre (pools, clientes); `shutdown` los ejecuta en ese orden dentro del plazo.
+    """
+
+    def __init__(self):
+        self.ready = False
+        self.draining = False
+        self.in_flight = 0
+        self.deadline: Optional[float] = None
+        self._drain_hooks: List[Tuple[str, ShutdownHook]] = []
+        self._close_hooks: List[Tuple[str, ShutdownHook]] = []
+
+    def on_drain(self, name: str, hook: ShutdownHook) -> None:
+        """
+        Registra una tarea a esperar durante el drenaje; recibe los segundos disponibles.
+        """
+        self._drain_hooks.append((name, hook))
+
+    def on_close(self, name: str, hook: ShutdownHook) -> None:
+        """
+        Registra un cierre de recursos, ejecutado cuando ya no queda trabajo en curso.
+        """
+        self._close_hooks.append((name, hook))
+
+    def mark_ready(self) -> None:
+        self.ready = True
+        self.draining = False
+        self.deadline = None
+        logger.info("Servicio listo para recibir tráfico")
+
+    def begin_drain(self) -> None:
+        """
+        Deja de reportarse listo. Idempotente: puede llamarse al recibir la señal
+        y otra vez desde el lifespan.
+        """
+        if self.draining:
+            return
+        self.ready = False
+        self.draining = True
+        logger.info("Apagado iniciado: readiness en falso, %d solicitudes en curso", self.in_flight)
+
+    def start_deadline(self, timeout: float) -> None:
+        """
+        Fija el plazo total del apagado (reloj monotónico). Se llama cuando el servidor deja
+        de aceptar conexiones, de modo que la espera de uvicorn y el drenaje del lifespan
+        comparten el mismo presupuesto.
+        """
+        if self.deadline is None:
+            self.deadline = time.monotonic() + timeout
+
+    def request_started(self) -> None:
+        self.in_flight += 1
+
+    def request_finished(self) -> None:
+        self.in_flight = max(0, self.in_flight - 1)
+
+    async def wait_idle(self, timeout: float) -> bool:
+        """
+        Espera hasta `timeout` segundos a que no queden solicitudes en curso.
+        Se consulta el contador por sondeo: el estado se crea antes del fork y no
+        puede atarse al event loop de ningún worker.
+        """
+        if self.in_flight == 0:
+            return True
+        logger.info("Esperando %d solicitudes en curso (máx. %.0f s)", self.in_flight, timeout)
+        deadline = time.monotonic() + timeout
+        while self.in_flight > 0:
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(DRAIN_POLL_SECONDS)
+        return True
+
+    async def shutdown(self, timeout: float) -> None:
+        """
+        Drena y cierra dentro del plazo (`timeout` segundos si no se fijó antes con
+        start_deadline): solicitudes en curso, hooks de drenaje y por último hooks de cierre
+        (estos se ejecutan siempre, aunque el plazo se haya agotado).
+        """
+        self.begin_drain()
+        self.start_deadline(timeout)
+        started = time.monotonic()
+        deadline = self.deadline
+
+        if not await self.wait_idle(deadline - time.monotonic()):
+            logger.warning("Plazo de apagado agotado con %d solicitudes aún en curso", self.in_flight)
+
+        for name, hook in self._drain_hooks:
+            await self._run_hook("drenaje", name, hook, deadline)
+        for name, hook in self._close_hooks:
+            await self._run_hook("cierre", name, hook, deadline)
+
+        logger.info("Apagado completado en %.1f s", time.monotonic() - started)
+
+    @staticmethod
+    async def _run_hook(kind: str, name: str, hook: ShutdownHook, deadline: float) -> None:
+        remaining = max(0.0, deadline - time.monotonic())
+        step_started = time.monotonic()
+        try:
+            await hook(remaining)
+        except Exception:
+            logger.exception("Falló el %s de '%s' durante el apagado", kind, name)
+            return
+        logger.info("Apagado: %s de '%s' en %.2f s", kind, name, time.monotonic() - step_started)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"ready": self.ready, "draining": self.draining, "in_flight": self.in_flight}
+
+
+lifecycle = Lifecycle()
+metrics.register("lifecycle", lifecycle.stats)
+
+
+class InFlightMiddleware:
+    """
+    Middleware ASGI que cuenta las solicitudes HTTP en curso. Durante el drenaje agrega
+    `Connection: close` a las respuestas para que los clientes abran la siguiente
+    conexión contra otro worker en lugar de reutilizar una que está por cerrarse.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        async def _send(message: Message) -> None:
+            if message["type"] == "http.response.start" and lifecycle.draining:
+                headers = [(k, v) for k, v in message.get("headers", []) if k.lower() != b"connection"]
+                headers.append((b"connection", b"close"))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        lifecycle.request_started()
+        try:
+            await self.app(scope, receive, _send)
+        finally:
+            lifecycle.request_finished()
@@ -0,0 +1,40 @@
+# app/core/metrics.py
+import threading
+from typing import Any, Callable, Dict, Tuple
+
+
+class Metrics:
+    """
+    Registro mínimo de métricas en proceso.
+    - Contadores con etiquetas: metrics.increment("nombre", gate="compression").
+    - Proveedores: funciones que devuelven un dict con el estado actual de un subsistema
+      (profundidad de colas, utilización, etc.), evaluadas al consultar /metrics.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[Tuple[Tuple[str, str], ...], float]] = {}
+        self._providers: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+    def increment(self, name: str, amount: float = 1, **labels: Any) -> None:
+        key = tuple(sorted((k, str(v)) for k, v in labels.items()))
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def register(self, name: str, provider: Callable[[], Dict[str, Any]]) -> None:
+        self._providers[name] = provider
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            counters = {
+                name: [dict(labels, value=value) for labels, value in series.items()]
+                for name, series in self._counters.items()
+            }
+        return {
+            "counters": counters,
+            **{name: provider() for name, provider in self._providers.items()},
+        }
+
+
+metrics = Metrics()
@@ -0,0 +1,250 @@
+# app/core/resilience.py
+import asyncio
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple, TypeVar
+
+from app.core.config import settings
+from app.core.http_erros import HttpErrors
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# Instante (time.monotonic) en que vence la solicitud actual; None = sin deadline.
+_request_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Códigos de error de AWS que indican throttling o una falla transitoria del servicio.
+AWS_RETRYABLE_CODES = {
+    "Throttling",
+    "ThrottlingException",
+    "ThrottledException",
+    "RequestThrottled",
+    "RequestThrottledException",
+    "TooManyRequestsException",
+    "RequestLimitExceeded",
+    "SlowDown",
+    "RequestTimeout",
+    "RequestTimeoutException",
+    "InternalError",
+    "InternalFailure",
+    "ServiceUnavailable",
+    "ServiceUnavailableException",
+    "PriorRequestNotComplete",
+}
+
+# Errores de Oracle/python-oracledb de conectividad o de pool (no de datos ni de SQL).
+ORACLE_RETRYABLE_CODES = {
+    "ORA-03113",  # end-of-file on communication channel
+    "ORA-03114",  # not connected to ORACLE
+    "ORA-03135",  # connection lost contact
+    "ORA-12170",  # connect timeout
+    "ORA-12514",  # listener does not currently know of service
+    "ORA-12528",  # all appropriate instances are blocking new connections
+    "ORA-12537",  # connection closed
+    "ORA-12541",  # no listener
+    "ORA-12571",  # packet writer failure
+    "ORA-24459",  # pool timeout waiting for new connections
+    "ORA-24496",  # pool timeout waiting for a free connection
+    "DPI-1080",   # connection was closed
+    "DPY-4011",   # database or network closed the connection
+    "DPY-6005",   # cannot connect to database
+}
+
+
+@dataclass
+class RetryPolicy:
+    max_attempts: int
+    base_delay: float
+    max_delay: float
+
+    @classmethod
+    def default(cls) -> "RetryPolicy":
+        return cls(
+            max_attempts=settings.RETRY_MAX_ATTEMPTS,
+            base_delay=settings.RETRY_BASE_DELAY_SECONDS,
+            max_delay=settings.RETRY_MAX_DELAY_SECONDS,
+        )
+
+    def backoff(self, attempt: int) -> float:
+        """
+        Backoff exponencial acotado con "full jitter" (attempt empieza en 1).
+        """
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** (attempt - 1))))
+
+
+def is_retryable_aws_error(exc: BaseException) -> bool:
+    from botocore.exceptions import ClientError, ConnectionError, HTTPClientError
+
+    if isinstance(exc, ClientError):
+        error = exc.response.get("Error", {})
+        status_code = exc.response.get("ResponseMetadata", {}).get("HTTPStatusCode") or 0
+        return error.get("Code") in AWS_RETRYABLE_CODES or status_code == 429 or status_code >= 500
+    return isinstance(exc, (ConnectionError, HTTPClientError))
+
+
+def is_retryable_oracle_error(exc: BaseException) -> bool:
+    import oracledb
+
+    if not isinstance(exc, oracledb.Error) or not exc.args:
+        return False
+    error = exc.args[0]
+    return getattr(error, "full_code", None) in ORACLE_RETRYABLE_CODES or bool(getattr(error, "isrecoverable", False))
+
+
+@contextmanager
+def request_deadline(seconds: float):
+    """
+    Fija el deadline de la solicitud actual: los reintentos no esperan más allá de él.
+    """
+    token = _request_deadline.set(time.monotonic() + seconds)
+    try:
+        yield
+    finally:
+        _request_deadline.reset(token)
+
+
+def remaining_time() -> Optional[float]:
+    deadline = _request_deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker por (base de datos, servicio).
+    - closed: deja pasar todo y cuenta fallas consecutivas.
+    - open: falla de inmediato hasta que pase el tiempo de recuperación.
+    - half_open: deja pasar una sola llamada de prueba; si funciona se cierra, si falla se reabre.
+    """
+
+    def __init__(self, database: str, service: str, failure_threshold: int, recovery_seconds: float):
+        self.database = database
+        self.service = service
+        self.failure_threshold = max(1, failure_threshold)
+        self.recovery_seconds = recovery_seconds
+        self.state = CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+
+    def _transition(self, new_state: str) -> None:
+        if new_state == self.state:
+            return
+        logger.warning("Circuit breaker %s/%s: %s -> %s", self.database, self.service, self.state, new_state)
+        metrics.increment("circuit_transitions_total",
+                          database=self.database, service=self.service, to_state=new_state)
+        self.state = new_state
+
+    def retry_after(self) -> int:
+        return max(1, int(self.recovery_seconds - (time.monotonic() - self.opened_at)))
+
+    def allow(self) -> bool:
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN:
+            if time.monotonic() - self.opened_at < self.recovery_seconds:
+                return False
+            self._transition(HALF_OPEN)
+        if self._probe_in_flight:
+            return False
+        self._probe_in_flight = True
+        return True
+
+    def record_success(self) -> None:
+        self._probe_in_flight = False
+        self.failures = 0
+        self._transition(CLOSED)
+
+    def record_failure(self) -> None:
+        self._probe_in_flight = False
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            self.opened_at = time.monotonic()
+            self._transition(OPEN)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"state": self.state, "consecutive_failures": self.failures}
+
+
+_breakers: Dict[Tuple[str, str], CircuitBreaker] = {}
+
+
+def get_breaker(database: str, service: str) -> CircuitBreaker:
+    key = (database, service)
+    breaker = _breakers.get(key)
+    if breaker is None:
+        breaker = _breakers[key] = CircuitBreaker(
+            database, service,
+            failure_threshold=settings.CIRCUIT_FAILURE_THRESHOLD,
+            recovery_seconds=settings.CIRCUIT_RECOVERY_SECONDS,
+        )
+    return breaker
+
+
+async def call_with_resilience(
+    service: str,
+    database: str,
+    fn: Callable[[], Awaitable[T]],
+    is_retryable: Callable[[BaseException], bool],
+    policy: Optional[RetryPolicy] = None,
+    retry_allowed: Optional[Callable[[], bool]] = None,
+) -> T:
+    """
+    Ejecuta `fn` protegida por el circuit breaker de (database, service), reintentando
+    los errores clasificados como transitorios con backoff exponencial y jitter,
+    sin exceder el deadline de la solicitud.
+    Si `retry_allowed` devuelve False tras un error transitorio (p. ej. una escritura que ya
+    se envió y pudo aplicarse), el error cuenta para el breaker pero no se reintenta.
+    """
+    policy = policy or RetryPolicy.default()
+    breaker = get_breaker(database, service)
+    attempt = 0
+    while True:
+        attempt += 1
+        if not breaker.allow():
+            metrics.increment("circuit_rejected_total", database=database, service=service)
+            raise HttpErrors.service_unavailable(
+                detail=f"El servicio '{service}' no está disponible para '{database}' (circuito abierto).",
+                retry_after=breaker.retry_after(),
+            )
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            breaker._probe_in_flight = False
+            raise
+        except Exception as e:
+            if not is_retryable(e):
+                # El servicio respondió: el error es de la solicitud, no de la dependencia.
+                breaker.record_success()
+                raise
+            breaker.record_failure()
+            if attempt >= policy.max_attempts or breaker.state == OPEN:
+                raise
+            if retry_allowed is not None and not retry_allowed():
+                raise
+            delay = policy.backoff(attempt)
+            remaining = remaining_time()
+            if remaining is not None and remaining <= delay:
+                raise
+            metrics.increment("retries_total", database=database, service=service)
+            logger.info("Reintento %d/%d de %s/%s en %.2fs: %s",
+                        attempt, policy.max_attempts - 1, database, service, delay, e)
+            await asyncio.sleep(delay)
+        else:
+            breaker.record_success()
+            return result
+
+
+metrics.register(
+    "circuit_breakers",
+    lambda: {f"{db}/{service}": breaker.stats() for (db, service), breaker in _breakers.items()},
+)
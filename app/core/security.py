@@ -1,22 +1,67 @@
 # app/core/security.py
 
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from jose import jwt, JWTError
 
 from app.core.config import settings
+from app.core.shared_cache import get_shared_cache, token_key
 from app.schemas.Auth import TokenPayload
 
 bearer_scheme = HTTPBearer()  # esquema “Bearer”
 
+# Tokens ya verificados: sha256(token) -> (sub, vence). Acotado y con TTL corto.
+_verified_tokens: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+_VERIFIED_TOKENS_MAX = 10_000
+
+
+async def _cached_subject(key: str) -> Optional[str]:
+    now = time.time()
+    cached = _verified_tokens.get(key)
+    if cached is not None:
+        if cached[1] > now:
+            _verified_tokens.move_to_end(key)
+            return cached[0]
+        del _verified_tokens[key]
+
+    shared = get_shared_cache()
+    if shared is not None:
+        # SQLite con busy timeout: fuera del event loop.
+        entry = await asyncio.to_thread(shared.get, "token", key)
+        if entry is not None and entry["expires_at"] > now:
+            _remember(key, entry["sub"], entry["expires_at"])
+            return entry["sub"]
+    return None
+
+
+def _remember(key: str, sub: str, expires_at: float) -> None:
+    _verified_tokens[key] = (sub, expires_at)
+    _verified_tokens.move_to_end(key)
+    while len(_verified_tokens) > _VERIFIED_TOKENS_MAX:
+        _verified_tokens.popitem(last=False)
+
+
 async def get_current_user(
     creds: HTTPAuthorizationCredentials = Depends(bearer_scheme),
 ) -> str:
     """
     Extrae el JWT del header Authorization y devuelve el 'sub' del payload.
     Lanza 401 si el token es inválido o expiró.
+    Los tokens verificados se recuerdan (en el proceso y en el caché compartido del host)
+    hasta TOKEN_CACHE_TTL_SECONDS, sin pasar nunca su 'exp'.
     """
     token = creds.credentials
+    key = token_key(token)
+    sub = await _cached_subject(key)
+    if sub is not None:
+        return sub
+
+    from jose import jwt, JWTError
+
     try:
         payload = jwt.decode(
             token,
@@ -30,4 +75,11 @@ async def get_current_user(
             detail="Token inválido o expirado",
             headers={"WWW-Authenticate": "Bearer"},
         )
+
+    expires_at = min(float(data.exp), time.time() + settings.TOKEN_CACHE_TTL_SECONDS)
+    _remember(key, data.sub, expires_at)
+    shared = get_shared_cache()
+    if shared is not None:
+        await asyncio.to_thread(shared.set, "token", key, {"sub": data.sub, "expires_at": expires_at},
+                                expires_at - time.time())
     return data.sub
@@ -0,0 +1,120 @@
+# app/core/shared_cache.py
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Optional
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class SharedCache:
+    """
+    Caché compartido por todos los workers del host (ver serve.py): un SQLite en /dev/shm,
+    es decir, en memoria compartida y sin I/O a disco. Es best-effort: cualquier error
+    se trata como un miss y la solicitud sigue por el camino normal.
+    """
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(path) or ".", mode=0o700, exist_ok=True)
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS shared_cache (
+                namespace   TEXT NOT NULL,
+                key         TEXT NOT NULL,
+                value       TEXT NOT NULL,
+                expires_at  REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_shared_cache_expires ON shared_cache (expires_at)")
+        # Guarda secretos desencriptados (LVAL): solo legible por el usuario del servicio.
+        os.chmod(path, 0o600)
+
+    def _connect(self) -> sqlite3.Connection:
+        # Una conexión por hilo y por proceso: las heredadas por fork no se reutilizan.
+        cached = getattr(self._local, "conn", None)
+        if cached is not None and cached[0] == os.getpid():
+            return cached[1]
+        conn = sqlite3.connect(self.path, timeout=1, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA synchronous=OFF")
+        self._local.conn = (os.getpid(), conn)
+        return conn
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        try:
+            row = self._connect().execute(
+                "SELECT value FROM shared_cache WHERE namespace = ? AND key = ? AND expires_at > ?",
+                (namespace, key, time.time()),
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.debug("Caché compartido no disponible (get %s): %s", namespace, e)
+            return None
+        return json.loads(row[0]) if row else None
+
+    def set(self, namespace: str, key: str, value: Any, ttl: float) -> None:
+        now = time.time()
+        try:
+            conn = self._connect()
+            conn.execute(
+                "INSERT OR REPLACE INTO shared_cache (namespace, key, value, expires_at) VALUES (?, ?, ?, ?)",
+                (namespace, key, json.dumps(value, ensure_ascii=False), now + ttl),
+            )
+            conn.execute("DELETE FROM shared_cache WHERE expires_at <= ?", (now,))
+            conn.execute(
+                """
+                DELETE FROM shared_cache WHERE rowid IN (
+                    SELECT rowid FROM shared_cache ORDER BY expires_at DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,),
+            )
+        except sqlite3.Error as e:
+            logger.debug("Caché compartido no disponible (set %s): %s", namespace, e)
+
+    def delete(self, namespace: str, key: str) -> None:
+        try:
+            self._connect().execute("DELETE FROM shared_cache WHERE namespace = ? AND key = ?", (namespace, key))
+        except sqlite3.Error as e:
+            logger.debug("Caché compartido no disponible (delete %s): %s", namespace, e)
+
+
+def token_key(token: str) -> str:
+    """
+    Clave de caché para un JWT: nunca se guarda el token en claro.
+    """
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+_shared_cache: Optional[SharedCache] = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_shared_cache() -> Optional[SharedCache]:
+    """
+    Devuelve el caché compartido del host, o None si está desactivado
+    (por defecto solo se activa con WEB_CONCURRENCY > 1).
+    """
+    global _shared_cache
+    if not settings.shared_cache_enabled:
+        return None
+    if _shared_cache is None:
+        with _shared_cache_lock:
+            if _shared_cache is None:
+                try:
+                    _shared_cache = SharedCache(settings.SHARED_CACHE_PATH, settings.SHARED_CACHE_MAX_ENTRIES)
+                except (OSError, sqlite3.Error) as e:
+                    logger.warning("No se pudo abrir el caché compartido en %s: %s", settings.SHARED_CACHE_PATH, e)
+                    return None
+    return _shared_cache
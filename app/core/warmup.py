@@ -0,0 +1,69 @@
+# app/core/warmup.py
+import asyncio
+import logging
+import time
+from typing import Callable, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def _import_boto3() -> None:
+    import boto3  # noqa: F401
+    from app.helpers.aws_helper import boto_client_config
+
+    boto_client_config()
+
+
+def _import_jose() -> None:
+    from jose import jwt  # noqa: F401
+
+
+def _import_pikepdf() -> None:
+    import pikepdf  # noqa: F401
+
+
+def _start_compression_workers() -> None:
+    from app.core.config import settings
+    from app.core.executors import get_compression_workers
+
+    if settings.PDF_COMPRESSION_DEADLINE_SECONDS > 0:
+        get_compression_workers().start()
+
+
+def _init_oracle() -> None:
+    from app.db.oracle import init_oracle_client
+
+    init_oracle_client()
+
+
+# Pasos que serve.py no ejecuta en el padre antes del fork: el Instant Client y los procesos de
+# compresión (sus pipes) no se pueden compartir entre workers; cada worker los inicia por su cuenta.
+AFTER_FORK_STEPS = ("oracle", "compression-workers")
+
+WARMUP_STEPS: List[Tuple[str, Callable[[], None]]] = [
+    ("oracle", _init_oracle),
+    ("jose", _import_jose),
+    ("boto3", _import_boto3),
+    ("pikepdf", _import_pikepdf),
+    ("compression-workers", _start_compression_workers),
+]
+
+
+async def warm_up() -> None:
+    """
+    Precarga en segundo plano las dependencias pesadas (oracledb + Instant Client, python-jose,
+    boto3, pikepdf) y arranca los procesos de compresión con plazo para que la primera solicitud
+    real no pague su importación ni el arranque.
+    El servicio ya responde /health mientras esto corre; si un paso falla, se carga igual
+    en el primer uso.
+    """
+    started = time.perf_counter()
+    for name, step in WARMUP_STEPS:
+        step_started = time.perf_counter()
+        try:
+            await asyncio.to_thread(step)
+        except Exception:
+            logger.exception("Warm-up de '%s' falló; se cargará en el primer uso.", name)
+            continue
+        logger.debug("Warm-up de '%s' en %.0f ms", name, (time.perf_counter() - step_started) * 1000)
+    logger.info("Warm-up completado en %.0f ms", (time.perf_counter() - started) * 1000)
@@ -1,30 +1,66 @@
 import os
 import asyncio
-import oracledb
+import logging
+import threading
 from contextlib import asynccontextmanager
-from typing import Any, Dict, List, Optional
+from typing import TYPE_CHECKING, Any, Awaitable, Callable, Dict, List, Optional, TypeVar
 
+from app.core.admission import admission_control
 from app.core.config import settings, DatabaseConfig
+from app.core.executors import DB, run_in
+from app.core.resilience import call_with_resilience, is_retryable_oracle_error
 
-CLIENT_LIB_DIR = settings.ORACLE_INSTANT_CLIENT_DIR
-if CLIENT_LIB_DIR and os.path.isdir(CLIENT_LIB_DIR):
-    oracledb.init_oracle_client(lib_dir=CLIENT_LIB_DIR)
+if TYPE_CHECKING:
+    import oracledb
 
-_pools: Dict[str, oracledb.SessionPool] = {}
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+_pools: Dict[str, "oracledb.SessionPool"] = {}
 _pools_lock = asyncio.Lock()
 
-async def _init_pool(db_config: DatabaseConfig, db_name: str) -> oracledb.SessionPool:
+_client_initialized = False
+_client_lock = threading.Lock()
+
+
+def init_oracle_client() -> None:
+    """
+    Carga oracledb e inicializa el Instant Client (modo thick) una sola vez por proceso.
+    Se invoca al crear el primer pool o desde el warm-up de arranque, nunca al importar.
+    """
+    global _client_initialized
+    if _client_initialized:
+        return
+    with _client_lock:
+        if _client_initialized:
+            return
+        import oracledb
+
+        lib_dir = settings.ORACLE_INSTANT_CLIENT_DIR
+        if lib_dir and os.path.isdir(lib_dir):
+            oracledb.init_oracle_client(lib_dir=lib_dir)
+        else:
+            logger.warning("Ruta de Instant Client inválida (%s); se usa el modo thin de oracledb.", lib_dir)
+        _client_initialized = True
+
+
+async def _init_pool(db_config: DatabaseConfig, db_name: str) -> "oracledb.SessionPool":
     """
     Inicializa un pool de conexiones para una configuración de base de datos específica.
     """
+    await run_in(DB, init_oracle_client)
+    import oracledb
+
     print(f"Inicializando pool para {db_name} con host: {db_config.DB_HOST}, service_name: {db_config.DB_SERVICE_NAME}")
 
-    return oracledb.create_pool(
+    return await run_in(
+        DB, oracledb.create_pool,
         user=db_config.DB_USER,
         password=db_config.DB_PASSWORD,
         dsn=f"{db_config.DB_HOST}:{settings.DB_PORT}/{db_config.DB_SERVICE_NAME}",
-        min=2,
-        max=10,
+        min=settings.per_worker(settings.ORACLE_POOL_MIN),
+        max=settings.per_worker(settings.ORACLE_POOL_MAX),
         increment=1,
         timeout=10,
     )
@@ -47,11 +83,61 @@ async def get_connection(db_name: str):
         if db_name not in _pools or _pools[db_name] is None:
             _pools[db_name] = await _init_pool(db_config, db_name)
 
-    conn = await asyncio.to_thread(_pools[db_name].acquire)
-    try:
-        yield conn
-    finally:
-        await asyncio.to_thread(_pools[db_name].release, conn)
+    async with admission_control.gate("oracle").slot(db_name):
+        conn = await run_in(DB, _pools[db_name].acquire)
+        try:
+            yield conn
+        finally:
+            await run_in(DB, _pools[db_name].release, conn)
+
+
+async def close_pools(timeout: float = 0.0) -> None:
+    """
+    Cierra los pools de conexiones al apagar el servicio. Primero intenta un cierre normal
+    (falla si aún hay conexiones prestadas) y, si no lo logra dentro de `timeout`, fuerza el cierre.
+    """
+    async with _pools_lock:
+        pools = [(name, pool) for name, pool in _pools.items() if pool is not None]
+        _pools.clear()
+
+    for db_name, pool in pools:
+        deadline = asyncio.get_running_loop().time() + timeout
+        while True:
+            try:
+                await run_in(DB, pool.close)
+                break
+            except Exception:
+                if asyncio.get_running_loop().time() >= deadline:
+                    logger.warning("Pool de %s con %d conexiones en uso; se fuerza el cierre", db_name, pool.busy)
+                    await run_in(DB, pool.close, True)
+                    break
+                await asyncio.sleep(0.1)
+        logger.info("Pool de Oracle de %s cerrado", db_name)
+
+
+async def _call_oracle(db_name: str, op: Callable[[], Awaitable[T]],
+                       retry_allowed: Optional[Callable[[], bool]] = None) -> T:
+    """
+    Ejecuta la operación con reintentos ante errores transitorios de conectividad
+    y con el circuit breaker de (db_name, oracle). Las escrituras pasan `retry_allowed`
+    para no reintentar una vez enviada la llamada (ver _WriteAttempt).
+    """
+    return await call_with_resilience("oracle", db_name, op, is_retryable_oracle_error,
+                                      retry_allowed=retry_allowed)
+
+
+class _WriteAttempt:
+    """
+    Marca si el intento en curso de una escritura ya envió el PROCEDURE a Oracle. Un error de
+    conexión posterior (ORA-03113, ORA-03135...) puede llegar con el commit ya hecho en el
+    servidor, así que solo se reintentan los errores al obtener la conexión.
+    """
+
+    def __init__(self):
+        self.sent = False
+
+    def retry_allowed(self) -> bool:
+        return not self.sent
 
 
 async def execute_query(
@@ -63,12 +149,15 @@ async def execute_query(
     Ejecuta un SELECT y devuelve lista de dicts.
     Requiere el nombre de la base de datos a la que conectarse.
     """
-    async with get_connection(db_name=db_name) as conn:
-        cursor = await asyncio.to_thread(conn.cursor)
-        await asyncio.to_thread(cursor.execute, sql, params or {})
-        cols = [col[0] for col in cursor.description]
-        rows = await asyncio.to_thread(cursor.fetchall)
-        return [dict(zip(cols, row)) for row in rows]
+    async def _op() -> List[Dict[str, Any]]:
+        async with get_connection(db_name=db_name) as conn:
+            cursor = await run_in(DB, conn.cursor)
+            await run_in(DB, cursor.execute, sql, params or {})
+            cols = [col[0] for col in cursor.description]
+            rows = await run_in(DB, cursor.fetchall)
+            return [dict(zip(cols, row)) for row in rows]
+
+    return await _call_oracle(db_name, _op)
 
 
 async def call_proc_update(
@@ -81,15 +170,59 @@ async def call_proc_update(
     Retorna el valor de ese OUT NUMBER.
     Requiere el nombre de la base de datos a la que conectarse.
     """
-    async with get_connection(db_name=db_name) as conn:
-        cursor = await asyncio.to_thread(conn.cursor)
-        out_var = cursor.var(oracledb.DB_TYPE_NUMBER)
-        args = params + [out_var]
+    import oracledb
+
+    attempt = _WriteAttempt()
 
-        await asyncio.to_thread(cursor.callproc, proc_name, args)
-        await asyncio.to_thread(conn.commit)
+    async def _op() -> int:
+        async with get_connection(db_name=db_name) as conn:
+            cursor = await run_in(DB, conn.cursor)
+            out_var = cursor.var(oracledb.DB_TYPE_NUMBER)
+            args = params + [out_var]
 
-        return int(out_var.getvalue() or 0)
+            attempt.sent = True
+            await run_in(DB, cursor.callproc, proc_name, args)
+            await run_in(DB, conn.commit)
+
+            return int(out_var.getvalue() or 0)
+
+    return await _call_oracle(db_name, _op, attempt.retry_allowed)
+
+async def call_proc_update_many(
+        proc_name: str,
+        rows: List[List[Any]],
+        db_name: str = "SEGQA"
+) -> List[int]:
+    """
+    Invoca el mismo PROCEDURE (con un OUT NUMBER al final) para cada fila de `rows`
+    en un solo viaje: executemany sobre un bloque PL/SQL con array binding, en una
+    conexión y con un único commit. Si alguna fila falla, se revierte todo.
+    Retorna el OUT NUMBER de cada fila, en orden.
+    """
+    import oracledb
+
+    if not rows:
+        return []
+    n_in = len(rows[0])
+    placeholders = ", ".join(f":{i + 1}" for i in range(n_in + 1))
+    plsql = f"BEGIN {proc_name}({placeholders}); END;"
+    attempt = _WriteAttempt()
+
+    async def _op() -> List[int]:
+        async with get_connection(db_name=db_name) as conn:
+            cursor = await run_in(DB, conn.cursor)
+            out_var = cursor.var(oracledb.DB_TYPE_NUMBER, arraysize=len(rows))
+            cursor.setinputsizes(*([None] * n_in), out_var)
+            attempt.sent = True
+            try:
+                await run_in(DB, cursor.executemany, plsql, [list(r) for r in rows])
+                await run_in(DB, conn.commit)
+            except BaseException:
+                await run_in(DB, conn.rollback)
+                raise
+            return [int(out_var.getvalue(i) or 0) for i in range(len(rows))]
+
+    return await _call_oracle(db_name, _op, attempt.retry_allowed)
 
 async def call_proc_fetch(
     proc_name: str,
@@ -102,13 +235,18 @@ async def call_proc_fetch(
     Devuelve los registros del cursor como lista de dicts.
     Requiere el nombre de la base de datos a la que conectarse.
     """
-    async with get_connection(db_name=db_name) as conn:
-        cursor = await asyncio.to_thread(conn.cursor)
-        refcur = cursor.var(oracledb.DB_TYPE_CURSOR)
-        args = list(params)
-        args.insert(out_cursor_pos, refcur)
-        await asyncio.to_thread(cursor.callproc, proc_name, args)
-        async_cursor = refcur.getvalue()
-        cols = [c[0] for c in async_cursor.description]
-        rows = await asyncio.to_thread(async_cursor.fetchall)
-        return [dict(zip(cols, row)) for row in rows]
\ No newline at end of file
+    import oracledb
+
+    async def _op() -> List[Dict[str, Any]]:
+        async with get_connection(db_name=db_name) as conn:
+            cursor = await run_in(DB, conn.cursor)
+            refcur = cursor.var(oracledb.DB_TYPE_CURSOR)
+            args = list(params)
+            args.insert(out_cursor_pos, refcur)
+            await run_in(DB, cursor.callproc, proc_name, args)
+            async_cursor = refcur.getvalue()
+            cols = [c[0] for c in async_cursor.description]
+            rows = await run_in(DB, async_cursor.fetchall)
+            return [dict(zip(cols, row)) for row in rows]
+
+    return await _call_oracle(db_name, _op)
@@ -1,17 +1,29 @@
-import io
-import json
+import asyncio
+import logging
 import os
-from typing import List, Dict, Any, Optional
-import boto3
+from functools import lru_cache
+from typing import BinaryIO, List, Dict, Any, Optional, Tuple
 from botocore.exceptions import ClientError
-from fastapi import Form
+from fastapi import Form, HTTPException
 from pydantic import EmailStr, HttpUrl
 
+from app.core.admission import admission_control, cost_from_bytes
 from app.core.config import settings
+from app.core.executors import AWS, CPU, get_compression_workers, get_process_pool, pdf_process_workers, run_in
+from app.core.metrics import metrics
+from app.core.resilience import call_with_resilience, is_retryable_aws_error, remaining_time
 from services.lval_service import LvalConfig
-from utils.compress_pdf_bytes import compress_pdf_bytes
+from utils import fast_json
+from utils.buffers import open_buffer
+from utils.compress_pdf_bytes import compress_pdf, compress_pdf_isolated
 from app.core.http_erros import HttpErrors
 
+logger = logging.getLogger(__name__)
+
+# Límites de SendMessageBatch.
+SQS_BATCH_MAX_ENTRIES = 10
+SQS_BATCH_MAX_BYTES = 256 * 1024
+
 ALLOWED_FILE_EXTENSIONS = {
     ".jpg",
     ".pdf",
@@ -24,7 +36,165 @@ ALLOWED_FILE_EXTENSIONS = {
     ".csv"
 }
 
+@lru_cache(maxsize=1)
+def boto_client_config():
+    """
+    Config compartida de los clientes boto3 (botocore se importa recién al crear el primer cliente).
+    Los reintentos los gestiona la capa de resiliencia (backoff con jitter + circuit breaker),
+    así que se desactivan los reintentos internos de botocore para no multiplicarlos.
+    """
+    from botocore.config import Config
+
+    return Config(retries={"total_max_attempts": 1}, connect_timeout=5, read_timeout=60,
+                  max_pool_connections=settings.AWS_MAX_POOL_CONNECTIONS)
+
 class AwsHelper:
+    # Clientes boto3 reutilizables (son thread-safe), por (base de datos, servicio, access key, región).
+    _clients: Dict[Tuple[str, str, str, str], Any] = {}
+    # URL de cola SQS resuelta, por (base de datos, nombre de cola).
+    _queue_urls: Dict[Tuple[str, str], str] = {}
+
+    @staticmethod
+    async def get_client(service: str, database: str):
+        """
+        Devuelve un cliente boto3 del servicio indicado con las credenciales LVAL de la base de datos.
+        Los clientes se reutilizan entre solicitudes; si las credenciales cambian, se crea uno nuevo.
+        """
+        lval = await LvalConfig.load(settings.DB_AWS_TIPOLVAL, db_name=database)
+
+        aws_access_key_id = lval.get(settings.DB_AWS_KEY)
+        aws_secret_access_key = lval.get(settings.DB_AWS_SECRET)
+        region_name = lval.get(settings.DB_AWS_REGION)
+
+        if not all([aws_access_key_id, aws_secret_access_key, region_name]):
+            raise ValueError(f"Credenciales AWS incompletas para la base de datos '{database}'.")
+
+        cache_key = (database, service, aws_access_key_id, region_name)
+        client = AwsHelper._clients.get(cache_key)
+        if client is None:
+            import boto3
+
+            # Crear un cliente carga el modelo del servicio: se hace fuera del event loop y con
+            # una sesión propia, porque la sesión por defecto de boto3 no es thread-safe.
+            client = await run_in(
+                AWS, lambda *a, **kw: boto3.session.Session().client(*a, **kw),
+                service,
+                aws_access_key_id=aws_access_key_id,
+                aws_secret_access_key=aws_secret_access_key,
+                region_name=region_name,
+                config=boto_client_config()
+            )
+            AwsHelper._clients[cache_key] = client
+        return client
+
+    @staticmethod
+    def invalidate(database: str) -> None:
+        """
+        Descarta los clientes boto3 y las URLs de cola cacheadas de la base de datos
+        (p. ej. tras rotar sus credenciales AWS en LVAL).
+        """
+        for key in [k for k in AwsHelper._clients if k[0] == database]:
+            AwsHelper._clients.pop(key, None)
+        for key in [k for k in AwsHelper._queue_urls if k[0] == database]:
+            AwsHelper._queue_urls.pop(key, None)
+
+    @staticmethod
+    def close_clients() -> None:
+        """
+        Cierra los clientes boto3 cacheados (sus pools de conexiones HTTP) al apagar el servicio.
+        """
+        clients = list(AwsHelper._clients.values())
+        AwsHelper._clients.clear()
+        AwsHelper._queue_urls.clear()
+        for client in clients:
+            try:
+                client.close()
+            except Exception:
+                logger.warning("No se pudo cerrar un cliente %s", client.meta.service_model.service_name, exc_info=True)
+        if clients:
+            logger.info("Clientes AWS cerrados: %d", len(clients))
+
+    @staticmethod
+    async def get_queue_url(sqs, queue_name: str, database: str) -> str:
+        """
+        Resuelve (y cachea) la URL de la cola SQS configurada para la base de datos.
+        """
+        cache_key = (database, queue_name)
+        queue_url = AwsHelper._queue_urls.get(cache_key)
+        if queue_url is None:
+            queue = await call_with_resilience(
+                "sqs", database,
+                lambda: run_in(AWS, sqs.get_queue_url, QueueName=queue_name),
+                is_retryable_aws_error,
+            )
+            queue_url = AwsHelper._queue_urls[cache_key] = queue["QueueUrl"]
+        return queue_url
+
+    @staticmethod
+    def pdf_compression_options(engine: Optional[str] = None, parallel: bool = True) -> Dict[str, Any]:
+        """
+        Argumentos de compress_pdf según la configuración: motor (el de la solicitud o
+        PDF_COMPRESSION_ENGINE), parámetros del motor 'images' y, si parallel, compresión en paralelo.
+        """
+        options: Dict[str, Any] = {
+            "spool_threshold": settings.UPLOAD_SPOOL_THRESHOLD_BYTES,
+            "engine": engine or settings.PDF_COMPRESSION_ENGINE,
+            "image_dpi": settings.PDF_IMAGE_TARGET_DPI,
+            "jpeg_quality": settings.PDF_IMAGE_JPEG_QUALITY,
+        }
+        if parallel:
+            options.update(
+                parallel_min_pages=settings.PDF_PARALLEL_MIN_PAGES,
+                parallel_workers=pdf_process_workers(),
+                process_pool=get_process_pool(),
+            )
+        return options
+
+    @staticmethod
+    async def pdf_compression_deadline(database: str) -> float:
+        """
+        Plazo de compresión en segundos para la base de datos: el CODLVAL
+        DB_PDF_COMPRESSION_DEADLINE si está configurado, o PDF_COMPRESSION_DEADLINE_SECONDS.
+        Se acota a lo que le queda a la solicitud en curso. 0 = sin plazo.
+        """
+        deadline = settings.PDF_COMPRESSION_DEADLINE_SECONDS
+        lval = await LvalConfig.load(settings.DB_AWS_TIPOLVAL, db_name=database)
+        configured = lval.get(settings.DB_PDF_COMPRESSION_DEADLINE)
+        if configured not in (None, ""):
+            try:
+                deadline = float(configured)
+            except (TypeError, ValueError):
+                logger.warning("Plazo de compresión inválido en LVAL para %s: %r", database, configured)
+        if deadline <= 0:
+            return 0.0
+        remaining = remaining_time()
+        return deadline if remaining is None else max(0.001, min(deadline, remaining))
+
+    @staticmethod
+    async def compress_pdf_with_deadline(database: str, source: Any, size: int,
+                                         engine: Optional[str] = None) -> Tuple[Optional[BinaryIO], int, bool]:
+        """
+        Comprime un PDF en el executor CPU. Con plazo (pdf_compression_deadline) la compresión
+        corre, sin dividir por rangos de páginas, en un proceso que se mata al vencerlo; entonces
+        devuelve (None, size, True) y el llamador sube los bytes originales.
+        Devuelve (stream o None, tamaño, venció el plazo).
+        """
+        deadline = await AwsHelper.pdf_compression_deadline(database)
+        if not deadline:
+            options = AwsHelper.pdf_compression_options(engine)
+            compressed, size = await run_in(CPU, compress_pdf, source, **options)
+            return compressed, size, False
+
+        options = AwsHelper.pdf_compression_options(engine, parallel=False)
+        try:
+            compressed, size = await run_in(CPU, compress_pdf_isolated, source, get_compression_workers(),
+                                            deadline, **options)
+            return compressed, size, False
+        except TimeoutError:
+            metrics.increment("pdf_compression_timeouts_total", database=database, size=_size_bucket(size))
+            logger.warning("Compresión de PDF de %d bytes en %s cortada tras %.1f s; se sube el original",
+                           size, database, deadline)
+            return None, size, True
 
     @staticmethod
     async def upload_blobs_to_s3(
@@ -36,66 +206,93 @@ class AwsHelper:
         """
         Process list of dicts with keys:
           - 'filename': str
-          - 'blob': bytes
+          - 'blob': bytes-like (bytes, bytearray o memoryview; no se copia)
+          - 'compression_engine' (opcional): motor de compresión de PDFs, por defecto PDF_COMPRESSION_ENGINE
 
-        Compress PDFs, upload each to S3 in-memory,
-        and return metadata list:
-          [{ 'filename': str, 'url': str, 'size': int }, ...]
+        Compress PDFs and upload them to S3 in-memory, concurrently,
+        and return metadata list (same order as `files`):
+          [{ 'filename': str, 'key': str, 'url': str, 'size': int, 'compression_timed_out': bool }, ...]
         """
         try:
-            lval = await LvalConfig.load(settings.DB_AWS_TIPOLVAL, db_name=database)
-
-            aws_access_key_id = lval.get(settings.DB_AWS_KEY)
-            aws_secret_access_key = lval.get(settings.DB_AWS_SECRET)
-            region_name = lval.get(settings.DB_AWS_REGION)
-
-            if not all([aws_access_key_id, aws_secret_access_key, region_name, bucket, prefix]):
+            if not all([bucket, prefix]):
                 raise ValueError(f"Configuración AWS S3 incompleta para la base de datos '{database}'.")
 
-            s3 = boto3.client(
-                "s3",
-                aws_access_key_id=aws_access_key_id,
-                aws_secret_access_key=aws_secret_access_key,
-                region_name=region_name
-            )
-
-            results: List[Dict[str, Any]] = []
-            for item in files:
-                filename = item.get("filename")
-                blob = item.get("blob")
-                if not filename or blob is None:
-                    continue
-
+            items = [item for item in files if item.get("filename") and item.get("blob") is not None]
+            for item in items:
+                filename = item["filename"]
                 ext = os.path.splitext(filename)[1].lower()
                 if ext not in ALLOWED_FILE_EXTENSIONS:
                     raise HttpErrors.bad_request(
                         detail=f"Tipo de archivo no permitido para '{filename}'. "
                                f"Extensiones válidas: {', '.join(ALLOWED_FILE_EXTENSIONS)}"
                     )
-                print(f'ext f{ext}')
 
-                data = blob
-                size: int = len(blob)
+            s3 = await AwsHelper.get_client("s3", database)
+
+            async def _upload_one(item: Dict[str, Any]) -> Dict[str, Any]:
+                filename = item["filename"]
+                blob = item["blob"]
+                ext = os.path.splitext(filename)[1].lower()
+
+                compressed: Optional[BinaryIO] = None
+                size: int = memoryview(blob).nbytes
+                timed_out = False
 
                 if ext == ".pdf":
-                    data, size = compress_pdf_bytes(blob)
+                    async with admission_control.gate("compression").slot(database, cost_from_bytes(size)):
+                        compressed, size, timed_out = await AwsHelper.compress_pdf_with_deadline(
+                            database, blob, size, item.get("compression_engine")
+                        )
 
+                # Se sube desde un stream sobre el buffer original o sobre la salida (en memoria
+                # o en disco) de la compresión: el blob nunca se copia completo.
+                body = compressed if compressed is not None else open_buffer(blob)
                 key = f"{prefix}{filename}"
-                s3.upload_fileobj(io.BytesIO(data), bucket, key)
+
+                def _put() -> None:
+                    body.seek(0)
+                    s3.upload_fileobj(body, bucket, key)
+
+                try:
+                    async with admission_control.gate("s3_upload").slot(database, cost_from_bytes(size)):
+                        await call_with_resilience(
+                            "s3", database,
+                            lambda: run_in(AWS, _put),
+                            is_retryable_aws_error,
+                        )
+                finally:
+                    body.close()
                 uri = f"s3://{bucket}/{key}"
 
-                results.append({
+                return {
                     'filename': filename,
+                    'key': key,
                     'url': uri,
-                    'size': size
-                })
+                    'size': size,
+                    'compression_timed_out': timed_out,
+                }
 
+            tasks = [asyncio.ensure_future(_upload_one(item)) for item in items]
+            try:
+                results: List[Dict[str, Any]] = list(await asyncio.gather(*tasks))
+            except BaseException:
+                # Si un archivo falla (o se cancela la solicitud) no se siguen comprimiendo
+                # ni subiendo los demás; una subida ya en curso en su hilo termina igual.
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+                raise
             return results
+        except HTTPException:
+            raise
         except ClientError as e:
             if "NoSuchBucket" in str(e):
                 raise HttpErrors.not_found(detail=f"Bucket S3 '{bucket}' no encontrado o no accesible: {e}")
             elif "AccessDenied" in str(e):
                 raise HttpErrors.forbidden(detail=f"Permiso denegado para S3. Revise sus credenciales o políticas de Bucket: {e}")
+            elif is_retryable_aws_error(e):
+                raise HttpErrors.service_unavailable(detail=f"S3 no disponible temporalmente tras varios reintentos: {e}",
+                                                     retry_after=int(settings.CIRCUIT_RECOVERY_SECONDS))
             else:
                 raise HttpErrors.internal_server_error(detail=f"Error del cliente S3 al subir archivos: {e}")
         except ValueError as e:
@@ -103,6 +300,259 @@ class AwsHelper:
         except Exception as e:
             raise HttpErrors.internal_server_error(detail=f"Error interno del servidor al subir a S3: {e}")
 
+    @staticmethod
+    def build_email_message(from_addr: EmailStr,
+                            to_addrs: List[EmailStr],
+                            cc: Optional[List[EmailStr]] = None,
+                            bcc: Optional[List[EmailStr]] = None,
+                            subject: str = None,
+                            body: Optional[str] = None,
+                            html_body: Optional[str] = None,
+                            attachments: Optional[List[str]] = None,
+                            tags: Optional[Dict[str, str]] = None,
+                            template: Optional[Dict[str, Any]] = None,
+                            attachment_links: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """
+        Arma el mensaje SQS (MessageBody y MessageAttributes) de un email.
+        Si se indica `template` (template_id, template_version, template_vars), el consumidor
+        renderiza la plantilla y html_body viaja vacío.
+        `attachment_links` ({uri, url, expires_at} por adjunto) viaja junto a `attachments`.
+        """
+        msg = {
+            "from": from_addr,
+            "to": to_addrs,
+            "cc": cc or [],
+            "bcc": bcc or [],
+            "subject": subject,
+            "body": body or "",
+            "html_body": html_body or "",
+            "attachments": attachments or [],
+        }
+        if template:
+            msg.update(template)
+        if attachment_links:
+            msg["attachment_links"] = attachment_links
+
+        message: Dict[str, Any] = {"MessageBody": fast_json.dumps(msg)}
+        if tags:
+            message["MessageAttributes"] = {
+                name: {"DataType": "String", "StringValue": str(value)}
+                for name, value in tags.items()
+            }
+        return message
+
+    @staticmethod
+    async def get_email_queue(database: str) -> Tuple[Any, str]:
+        """
+        Devuelve (cliente SQS, URL de la cola de emails) de la base de datos.
+        """
+        lval = await LvalConfig.load(settings.DB_AWS_TIPOLVAL, db_name=database)
+        queue_name = lval.get(settings.DB_AWS_QUEUE)
+
+        if not queue_name:
+            raise ValueError(f"Credenciales AWS SQS o nombre de cola incompletos para la base de datos '{database}'.")
+
+        sqs = await AwsHelper.get_client("sqs", database)
+
+        try:
+            return sqs, await AwsHelper.get_queue_url(sqs, queue_name, database)
+        except ClientError as e:
+            if "NonExistentQueue" in str(e):
+                raise HttpErrors.not_found(detail=f"La cola SQS '{queue_name}' no existe: {e}")
+            elif "AccessDenied" in str(e):
+                raise HttpErrors.forbidden(detail=f"Permiso denegado para acceder a la cola SQS '{queue_name}': {e}")
+            elif is_retryable_aws_error(e):
+                raise HttpErrors.service_unavailable(detail=f"SQS no disponible temporalmente tras varios reintentos: {e}",
+                                                     retry_after=int(settings.CIRCUIT_RECOVERY_SECONDS))
+            else:
+                raise HttpErrors.internal_server_error(detail=f"Error al obtener URL de la cola SQS: {e}")
+
+    @staticmethod
+    def _forget_queue_url(database: str, exc: ClientError) -> None:
+        if "NonExistentQueue" in str(exc):
+            for key in [k for k in AwsHelper._queue_urls if k[0] == database]:
+                AwsHelper._queue_urls.pop(key, None)
+
+    @staticmethod
+    async def send_message(database: str, message: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Encola en SQS un mensaje armado con build_email_message.
+        """
+        try:
+            sqs, queue_url = await AwsHelper.get_email_queue(database)
+            send_kwargs: Dict[str, Any] = {"QueueUrl": queue_url, **message}
+
+            resp = await call_with_resilience(
+                "sqs", database,
+                lambda: run_in(AWS, sqs.send_message, **send_kwargs),
+                is_retryable_aws_error,
+            )
+            return resp
+        except Exception as e:
+            raise AwsHelper._sqs_error(database, e)
+
+    @staticmethod
+    def _sqs_error(database: str, exc: Exception) -> HTTPException:
+        """
+        Traduce un error al encolar en SQS a la HTTPException que responde la API.
+        """
+        if isinstance(exc, HTTPException):
+            return exc
+        if isinstance(exc, ClientError):
+            AwsHelper._forget_queue_url(database, exc)
+            if is_retryable_aws_error(exc):
+                return HttpErrors.service_unavailable(detail=f"SQS no disponible temporalmente tras varios reintentos: {exc}",
+                                                      retry_after=int(settings.CIRCUIT_RECOVERY_SECONDS))
+            return HttpErrors.internal_server_error(detail=f"Error del cliente SQS al enviar email: {exc}")
+        if isinstance(exc, ValueError):
+            return HttpErrors.internal_server_error(detail=f"Error de configuración AWS/SQS: {exc}")
+        return HttpErrors.internal_server_error(detail=f"Error interno del servidor al enviar email: {exc}")
+
+    @staticmethod
+    async def send_message_batch(database: str, entries: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Encola hasta 10 mensajes en una sola llamada SendMessageBatch. Cada entrada lleva
+        `Id` más los campos de build_email_message. Devuelve la respuesta de SQS
+        (`Successful` / `Failed` por Id); los errores de la llamada completa se propagan
+        como excepciones de botocore o HTTPException.
+        """
+        sqs, queue_url = await AwsHelper.get_email_queue(database)
+        try:
+            return await call_with_resilience(
+                "sqs", database,
+                lambda: run_in(AWS, sqs.send_message_batch, QueueUrl=queue_url, Entries=entries),
+                is_retryable_aws_error,
+            )
+        except ClientError as e:
+            AwsHelper._forget_queue_url(database, e)
+            raise
+
+    @staticmethod
+    async def send_messages(database: str, messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Encola varios mensajes con SendMessageBatch: lotes de hasta 10 entradas y 256 KB,
+        enviados en paralelo. Las entradas que SQS rechaza por causas transitorias
+        (SenderFault=false) o que omite en la respuesta se reintentan una vez. Devuelve, en el
+        orden de `messages`, {"MessageId": ...} o {"Error": ...} por mensaje; si ninguno se
+        encoló, lanza 503 (fallas transitorias) o 502 (SQS rechazó los mensajes).
+        """
+        results: List[Dict[str, Any]] = [{} for _ in messages]
+        pending = list(range(len(messages)))
+        first_error: Optional[Exception] = None
+
+        async def _send(batch: List[int]) -> None:
+            nonlocal first_error
+            entries = [{"Id": str(i), **messages[i]} for i in batch]
+            try:
+                resp = await AwsHelper.send_message_batch(database, entries)
+            except Exception as e:
+                first_error = first_error or e
+                for i in batch:
+                    results[i] = {"Error": str(e.detail if isinstance(e, HTTPException) else e), "retry": False}
+                return
+            positions = {entry["Id"]: i for entry, i in zip(entries, batch)}
+            for i in batch:
+                results[i] = {"Error": "SQS no informó el resultado del mensaje", "retry": True}
+            for ok in resp.get("Successful", []):
+                i = positions.get(ok.get("Id"))
+                if i is not None:
+                    results[i] = {"MessageId": ok.get("MessageId")}
+            for failed in resp.get("Failed", []):
+                i = positions.get(failed.get("Id"))
+                if i is not None:
+                    results[i] = {"Error": f"{failed.get('Code')}: {failed.get('Message', '')}",
+                                  "retry": not failed.get("SenderFault")}
+
+        for attempt in range(2):
+            await asyncio.gather(*[_send(batch) for batch in _sqs_batches(pending, messages)])
+            pending = [i for i in pending if results[i].get("retry")]
+            if not pending:
+                break
+
+        transient = bool(pending)
+        for result in results:
+            result.pop("retry", None)
+        if not any("MessageId" in r for r in results):
+            if first_error is not None:
+                raise AwsHelper._sqs_error(database, first_error)
+            if results:
+                detail = f"SQS no encoló ninguno de los {len(results)} mensajes: {results[0]['Error']}"
+                if transient:
+                    raise HttpErrors.service_unavailable(detail=detail, retry_after=int(settings.CIRCUIT_RECOVERY_SECONDS))
+                raise HttpErrors.bad_gateway(detail=detail)
+        return results
+
+    @staticmethod
+    def split_recipients(to_addrs: List[str], cc: List[str], bcc: List[str], max_per_message: int,
+                         bcc_only: bool = False) -> List[Dict[str, List[str]]]:
+        """
+        Reparte los destinatarios en grupos de a lo sumo `max_per_message` (SES rechaza más de 50
+        por mensaje), sin repetir direcciones. Cada dirección conserva su rol y los grupos se llenan
+        en orden to, cc, bcc; con `bcc_only` todas viajan como CCO y nadie ve a los demás.
+        """
+        seen = set()
+        tagged: List[Tuple[str, str]] = []
+        for role, addrs in (("to", to_addrs), ("cc", cc), ("bcc", bcc)):
+            for addr in addrs:
+                if addr.lower() not in seen:
+                    seen.add(addr.lower())
+                    tagged.append(("bcc" if bcc_only else role, addr))
+
+        groups: List[Dict[str, List[str]]] = []
+        for start in range(0, len(tagged), max(1, max_per_message)):
+            group: Dict[str, List[str]] = {"to": [], "cc": [], "bcc": []}
+            for role, addr in tagged[start:start + max_per_message]:
+                group[role].append(addr)
+            groups.append(group)
+        return groups
+
+    @staticmethod
+    def build_email_messages(from_addr: EmailStr,
+                             to_addrs: List[EmailStr],
+                             cc: Optional[List[EmailStr]] = None,
+                             bcc: Optional[List[EmailStr]] = None,
+                             bcc_only: bool = False,
+                             **fields: Any) -> List[Tuple[Dict[str, Any], List[str]]]:
+        """
+        Como build_email_message, pero divide los destinatarios en mensajes que respetan
+        EMAIL_MAX_RECIPIENTS_PER_MESSAGE (o los pasa todos a CCO con `bcc_only`).
+        Devuelve [(mensaje, destinatarios del mensaje)]; si caben en uno, es el mismo
+        mensaje que arma build_email_message.
+        """
+        cc, bcc = cc or [], bcc or []
+        limit = settings.EMAIL_MAX_RECIPIENTS_PER_MESSAGE
+        if not bcc_only and len(to_addrs) + len(cc) + len(bcc) <= limit:
+            message = AwsHelper.build_email_message(from_addr, to_addrs, cc=cc, bcc=bcc, **fields)
+            return [(message, list(to_addrs) + list(cc) + list(bcc))]
+        return [
+            (AwsHelper.build_email_message(from_addr, g["to"], cc=g["cc"], bcc=g["bcc"], **fields),
+             g["to"] + g["cc"] + g["bcc"])
+            for g in AwsHelper.split_recipients(to_addrs, cc, bcc, limit, bcc_only)
+        ]
+
+    @staticmethod
+    async def send_email_chunks(database: str, chunks: List[Tuple[Dict[str, Any], List[str]]]) -> Dict[str, Any]:
+        """
+        Encola los mensajes de build_email_messages. Con un solo mensaje responde lo mismo que
+        send_message; con varios, los MessageIds de todos y los grupos que fallaron con sus
+        destinatarios, para que el cliente reenvíe solo esos.
+        """
+        if len(chunks) == 1:
+            return await AwsHelper.send_message(database, chunks[0][0])
+
+        results = await AwsHelper.send_messages(database, [message for message, _ in chunks])
+        response: Dict[str, Any] = {
+            "MessageIds": [r["MessageId"] for r in results if "MessageId" in r],
+            "Chunks": len(chunks),
+            "Recipients": sum(len(recipients) for _, recipients in chunks),
+        }
+        failed = [{"Chunk": i, "Error": r["Error"], "Recipients": chunks[i][1]}
+                  for i, r in enumerate(results) if "Error" in r]
+        if failed:
+            logger.warning("%d de %d mensajes de %s no se encolaron", len(failed), len(chunks), database)
+            response["Failed"] = failed
+        return response
+
     @staticmethod
     async def send_email(from_addr: EmailStr,
                          to_addrs: List[EmailStr],
@@ -113,66 +563,45 @@ class AwsHelper:
                          html_body: Optional[str] = None,
                          attachments: Optional[List[str]] = None,
                          tags: Optional[Dict[str, str]] = None,
-                         database: str = None) -> Dict[str, Any]:
+                         database: str = None,
+                         template: Optional[Dict[str, Any]] = None,
+                         bcc_only: bool = False) -> Dict[str, Any]:
         """
-        Encola un mensaje para envío vía SQS, incluyendo las URLs de S3 generadas.
+        Encola un email para envío vía SQS, incluyendo las URLs de S3 generadas.
+        Las listas de destinatarios que superan el límite de SES se dividen en varios mensajes.
         """
-        try:
-            lval = await LvalConfig.load(settings.DB_AWS_TIPOLVAL, db_name=database)
-
-            aws_access_key_id = lval.get(settings.DB_AWS_KEY)
-            aws_secret_access_key = lval.get(settings.DB_AWS_SECRET)
-            region_name = lval.get(settings.DB_AWS_REGION)
-            queue_name = lval.get(settings.DB_AWS_QUEUE)
+        chunks = AwsHelper.build_email_messages(
+            from_addr, to_addrs, cc=cc, bcc=bcc, bcc_only=bcc_only, subject=subject, body=body,
+            html_body=html_body, attachments=attachments, tags=tags, template=template,
+        )
+        return await AwsHelper.send_email_chunks(database, chunks)
 
-            if not all([aws_access_key_id, aws_secret_access_key, region_name, queue_name]):
-                raise ValueError(f"Credenciales AWS SQS o nombre de cola incompletos para la base de datos '{database}'.")
 
-            sqs = boto3.client(
-                "sqs",
-                aws_access_key_id=aws_access_key_id,
-                aws_secret_access_key=aws_secret_access_key,
-                region_name=region_name
-            )
+def _size_bucket(size: int) -> str:
+    """Rango de tamaño para etiquetar métricas por archivo."""
+    for limit, label in ((1, "<1MB"), (5, "1-5MB"), (20, "5-20MB"), (100, "20-100MB")):
+        if size < limit * 1024 * 1024:
+            return label
+    return ">=100MB"
 
-            try:
-                QUEUE_URL:str = sqs.get_queue_url(QueueName=queue_name)["QueueUrl"]
-            except ClientError as e:
-                if "NonExistentQueue" in str(e):
-                    raise HttpErrors.not_found(detail=f"La cola SQS '{queue_name}' no existe: {e}")
-                elif "AccessDenied" in str(e):
-                    raise HttpErrors.forbidden(detail=f"Permiso denegado para acceder a la cola SQS '{queue_name}': {e}")
-                else:
-                    raise HttpErrors.internal_server_error(detail=f"Error al obtener URL de la cola SQS: {e}")
-
-            message_attributes = {}
-            if tags:
-                for name, value in tags.items():
-                    message_attributes[name] = {
-                        "DataType":    "String",
-                        "StringValue": str(value)
-                    }
-
-            msg = {
-                "from": from_addr,
-                "to": to_addrs,
-                "cc": cc or [],
-                "bcc": bcc or [],
-                "subject": subject,
-                "body": body or "",
-                "html_body": html_body or "",
-                "attachments": attachments or [],
-            }
 
-            resp = sqs.send_message(
-                QueueUrl=QUEUE_URL,
-                MessageBody=json.dumps(msg, ensure_ascii=False),
-                MessageAttributes=message_attributes or None,
-            )
-            return resp
-        except ClientError as e:
-            raise HttpErrors.internal_server_error(detail=f"Error del cliente SQS al enviar email: {e}")
-        except ValueError as e:
-            raise HttpErrors.internal_server_error(detail=f"Error de configuración AWS/SQS: {e}")
-        except Exception as e:
-            raise HttpErrors.internal_server_error(detail=f"Error interno del servidor al enviar email: {e}")
\ No newline at end of file
+def _sqs_batches(indices: List[int], messages: List[Dict[str, Any]]) -> List[List[int]]:
+    """
+    Agrupa los mensajes en lotes que respetan los límites de SendMessageBatch.
+    """
+    batches: List[List[int]] = []
+    current: List[int] = []
+    size = 0
+    for i in indices:
+        message = messages[i]
+        message_size = len(message["MessageBody"].encode("utf-8")) + sum(
+            len(name) + len(attr.get("StringValue", "")) for name, attr in message.get("MessageAttributes", {}).items()
+        )
+        if current and (len(current) >= SQS_BATCH_MAX_ENTRIES or size + message_size > SQS_BATCH_MAX_BYTES):
+            batches.append(current)
+            current, size = [], 0
+        current.append(i)
+        size += message_size
+    if current:
+        batches.append(current)
+    return batches
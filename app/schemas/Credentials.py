@@ -1,4 +1,4 @@
-from typing import Literal
+from typing import Dict, List, Literal
 from pydantic import BaseModel, Field
 from app.core.config import settings
 
@@ -19,4 +19,18 @@ class UpdateCredentialOut(BaseModel):
     rows_affected: int = Field(..., description="Número de filas actualizadas (0 = nada)")
     ok:             bool  = Field(..., description="Verdadero si la operación fue exitosa")
     code:           int   = Field(..., description="Código de respuesta HTTP o interno")
-    message:        str   = Field(..., description="Mensaje descriptivo del resultado")
\ No newline at end of file
+    message:        str   = Field(..., description="Mensaje descriptivo del resultado")
+
+class BulkUpdateCredentialIn(BaseModel):
+    values: Dict[str, str] = Field(..., min_length=1, description="CODLVAL -> nuevo valor, todos del mismo grupo")
+
+class CredentialUpdateResult(BaseModel):
+    codlval:       str
+    rows_affected: int
+
+class BulkUpdateCredentialOut(BaseModel):
+    rows_affected: int  = Field(..., description="Total de filas actualizadas")
+    ok:            bool = Field(..., description="Verdadero si todas las claves se actualizaron")
+    code:          int  = Field(..., description="Código de respuesta HTTP o interno")
+    message:       str  = Field(..., description="Mensaje descriptivo del resultado")
+    results:       List[CredentialUpdateResult] = Field(..., description="Filas afectadas por clave")
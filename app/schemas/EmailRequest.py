@@ -1,20 +1,71 @@
-from typing import List, Optional, Dict, Literal
-from pydantic import EmailStr, BaseModel
+from functools import lru_cache
+from typing import Annotated, Any, List, Optional, Dict, Literal
+from pydantic import AfterValidator, BaseModel, ConfigDict, WithJsonSchema, model_validator
+from pydantic.networks import validate_email
 from app.core.config import settings
 
 DatabaseLiteral = Literal[tuple(settings.AVAILABLE_DATABASES)]
+PdfEngineLiteral = Literal["auto", "ghostscript", "images"]
+
+
+@lru_cache(maxsize=settings.EMAIL_VALIDATION_CACHE_SIZE)
+def _normalize_email(value: str) -> str:
+    return validate_email(value)[1]
+
+
+# Igual que EmailStr (mismas reglas, normalización y errores), pero las direcciones ya validadas
+# se toman de un caché LRU: las campañas repiten los mismos destinatarios en cada solicitud.
+CachedEmailStr = Annotated[
+    str, AfterValidator(_normalize_email), WithJsonSchema({"type": "string", "format": "email"})
+]
 
 class EmailRequest(BaseModel):
     database: DatabaseLiteral
-    from_email: EmailStr
-    to:         List[EmailStr]
-    cc:         List[EmailStr]      = []
-    bcc:        List[EmailStr]      = []
-    subject:    str
+    from_email: CachedEmailStr
+    to:         List[CachedEmailStr]
+    cc:         List[CachedEmailStr] = []
+    bcc:        List[CachedEmailStr] = []
+    subject:    Optional[str]       = None
     body:       Optional[str]       = None
     html_body:  Optional[str]       = None
     attachments: List[str]         = []
     tags:        Dict[str, str]        = {}
+    # Plantilla registrada en /templates: se envía solo el id y sus variables.
+    # template_render="consumer" encola id + variables sin renderizar (mensaje SQS más pequeño).
+    template_id:     Optional[str]                     = None
+    template_vars:   Dict[str, Any]                    = {}
+    template_render: Literal["server", "consumer"]     = "server"
+    # Las listas de más de EMAIL_MAX_RECIPIENTS_PER_MESSAGE se dividen en varios mensajes;
+    # "bcc" envía a todos como CCO (nadie ve a los demás destinatarios).
+    recipient_mode:  Literal["standard", "bcc"]        = "standard"
+    # Agrega al mensaje URLs prefirmadas (GET) de los adjuntos s3:// para el consumidor.
+    presign_attachments:        bool          = False
+    attachment_links_expires_in: Optional[int] = None
+
+    @model_validator(mode="after")
+    def subject_or_template(self):
+        if not self.template_id and not self.subject:
+            raise ValueError("Debe indicar 'subject' o un 'template_id' con asunto.")
+        return self
+
+    @model_validator(mode="after")
+    def recipients_limit(self):
+        recipients = len(self.to) + len(self.cc) + len(self.bcc)
+        if recipients > settings.EMAIL_MAX_RECIPIENTS_PER_REQUEST:
+            raise ValueError(f"Se admiten hasta {settings.EMAIL_MAX_RECIPIENTS_PER_REQUEST} destinatarios "
+                             f"por solicitud (se recibieron {recipients}).")
+        return self
+
+class InlineAttachment(BaseModel):
+    # En JSON el blob viaja en base64 y se decodifica al validar (no se guarda el texto base64).
+    model_config = ConfigDict(val_json_bytes="base64", ser_json_bytes="base64")
+
+    filename:   str
+    blob:       bytes
+    id_proceso: Optional[int] = None
+
+class EmailWithAttachmentsRequest(EmailRequest):
+    files: List[InlineAttachment] = []
 
 class FileItem(BaseModel):
     database: DatabaseLiteral
@@ -26,4 +77,5 @@ class UploadRequest(BaseModel):
     database: DatabaseLiteral
     filename: str
     blob: bytes
-    id_proceso: int
\ No newline at end of file
+    id_proceso: int
+    compression_engine: Optional[PdfEngineLiteral] = None  # por defecto PDF_COMPRESSION_ENGINE
\ No newline at end of file
@@ -0,0 +1,18 @@
+from typing import List, Literal, Optional
+from pydantic import BaseModel, Field
+from app.core.config import settings
+
+DatabaseLiteral = Literal[tuple(settings.AVAILABLE_DATABASES)]
+
+class TemplateIn(BaseModel):
+    database:  DatabaseLiteral
+    subject:   Optional[str] = Field(None, description="Asunto por defecto; admite variables {{ nombre }}")
+    html_body: str = Field(..., description="Cuerpo HTML con variables {{ nombre }}")
+
+class TemplateOut(BaseModel):
+    template_id: str
+    database:    str
+    version:     str = Field(..., description="ETag de la versión registrada")
+    subject:     Optional[str] = None
+    html_body:   str
+    variables:   List[str] = Field(..., description="Variables que la plantilla espera")
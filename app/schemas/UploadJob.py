@@ -0,0 +1,56 @@
+from typing import Any, Dict, List, Literal, Optional
+from pydantic import BaseModel, Field
+
+UploadJobState = Literal["queued", "processing", "completed", "failed"]
+PdfEngineLiteral = Literal["auto", "ghostscript", "images"]
+
+class UploadJobAccepted(BaseModel):
+    job_id:     str = Field(..., description="Identificador del job de carga")
+    status:     UploadJobState = Field(..., description="Estado inicial del job")
+    status_url: str = Field(..., description="URL para consultar el estado del job")
+
+class UploadJobStatus(BaseModel):
+    job_id:     str
+    database:   str
+    filename:   str
+    id_proceso: int
+    status:     UploadJobState
+    progress:   int = Field(..., description="Progreso aproximado (0-100)")
+    attempts:   int = Field(..., description="Intentos de procesamiento realizados")
+    error:      Optional[str] = None
+    result:     Optional[List[Dict[str, Any]]] = Field(None, description="Metadata final de la carga")
+
+class PresignUploadRequest(BaseModel):
+    database:   str
+    filename:   str
+    size:       int = Field(..., gt=0, description="Tamaño exacto (PUT) o máximo (POST) en bytes")
+    method:     Literal["POST", "PUT"] = "POST"
+
+class PresignUploadResponse(BaseModel):
+    upload_id:  str
+    method:     Literal["POST", "PUT"]
+    url:        str
+    fields:     Dict[str, str] = Field({}, description="Campos de formulario a enviar (POST)")
+    headers:    Dict[str, str] = Field({}, description="Headers obligatorios de la subida (PUT)")
+    key:        str
+    expires_in: int
+
+class CompleteUploadRequest(BaseModel):
+    database:   str
+    upload_id:  str
+    filename:   str
+    id_proceso: int
+    compression_engine: Optional[PdfEngineLiteral] = Field(None, description="Motor de compresión de PDFs; por defecto PDF_COMPRESSION_ENGINE")
+
+class PresignDownloadRequest(BaseModel):
+    database:   str
+    uris:       List[str] = Field(..., min_length=1, description="Adjuntos s3://bucket/clave devueltos por /upload")
+    expires_in: Optional[int] = Field(None, gt=0, description="Vigencia mínima de las URLs en segundos")
+
+class PresignedDownload(BaseModel):
+    uri:        str
+    url:        str
+    expires_at: int = Field(..., description="Vencimiento de la URL (epoch, segundos)")
+
+class PresignDownloadResponse(BaseModel):
+    urls:       List[PresignedDownload]
@@ -0,0 +1,70 @@
+# dispatch.py
+"""
+Dispatcher de emails: consume la cola SQS de cada base de datos (los mensajes que encola
+/send-email, en el formato de AwsHelper.build_email_message) y los envía por SES.
+
+Un proceso atiende una o varias bases; para cada una lee en lotes de 10 con long polling,
+envía con DISPATCHER_CONCURRENCY envíos simultáneos limitados por un token bucket a la tasa
+de la cuenta SES (o DISPATCHER_SEND_RATE), borra en lotes y extiende la visibilidad de los
+envíos lentos. Cada DISPATCHER_METRICS_INTERVAL_SECONDS registra throughput y lag.
+
+Con SIGTERM/SIGINT deja de leer, termina los envíos en curso y borra los enviados.
+Para probarlo sin AWS, apunta los clientes a un stand-in local (p. ej. LocalStack) con
+AWS_ENDPOINT_URL_SQS / AWS_ENDPOINT_URL_SES / AWS_ENDPOINT_URL_S3.
+
+Uso:
+    python dispatch.py --database SEGQA --database WWMA
+"""
+import argparse
+import asyncio
+import json
+import logging
+import signal
+import sys
+from typing import List
+
+from app.core.config import settings
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger("mailbridge.dispatch")
+
+
+async def _report(dispatchers, stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(stop.wait(), timeout=settings.DISPATCHER_METRICS_INTERVAL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        for d in dispatchers:
+            logger.info("Dispatcher %s %s", d.database, json.dumps(d.stats.snapshot()))
+
+
+async def run(databases: List[str]) -> None:
+    from services.email_dispatcher import EmailDispatcher
+
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop.set)
+
+    dispatchers = [await EmailDispatcher.create(db) for db in databases]
+    await asyncio.gather(
+        _report(dispatchers, stop),
+        *(d.run(stop, drain_timeout=settings.SHUTDOWN_TIMEOUT_SECONDS) for d in dispatchers),
+    )
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database", action="append", choices=settings.AVAILABLE_DATABASES,
+                        help="Base de datos cuya cola se consume (repetible). Por defecto: todas.")
+    args = parser.parse_args()
+    asyncio.run(run(args.database or list(settings.AVAILABLE_DATABASES)))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
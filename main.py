@@ -1,17 +1,29 @@
 # app/main.py
 
-import uvicorn
+import asyncio
 import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, Request, status, APIRouter
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.encoders import jsonable_encoder
 from fastapi.exceptions import RequestValidationError
 from fastapi.responses import JSONResponse, ORJSONResponse
 from fastapi.openapi.utils import get_openapi
 
 from app.api.v1.api import api_router
+from app.core.body_limit import BodySizeLimitMiddleware, base64_body_limit
 from app.core.config import settings
+from app.core.executors import shutdown_executors
+from app.core.lifecycle import InFlightMiddleware, lifecycle
+from app.core.metrics import metrics
+from app.core.resilience import request_deadline
+from app.core.warmup import warm_up
+from app.db.oracle import close_pools
+from app.helpers.aws_helper import AwsHelper
 from app.api.v1.endpoints.auth_controller import router as auth_router
 from app.api.v1.endpoints.credentials_controller import router as credentials_router
+from services.email_outbox_service import EmailOutboxService
+from services.upload_job_service import UploadJobService
 
 # Logging básico
 logging.basicConfig(
@@ -20,15 +32,73 @@ logging.basicConfig(
 )
 logger = logging.getLogger("mailbridge")
 
+
+async def _cancel_warm_up(_timeout: float) -> None:
+    task = getattr(app.state, "warm_up_task", None)
+    if task is not None and not task.done():
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+
+async def _close_aws_clients(_timeout: float) -> None:
+    await asyncio.to_thread(AwsHelper.close_clients)
+
+
+async def _shutdown_executors(_timeout: float) -> None:
+    shutdown_executors()
+
+
+# Orden del apagado: primero se espera el trabajo pendiente, después se cierran los recursos
+lifecycle.on_drain("warm-up", _cancel_warm_up)
+lifecycle.on_drain("upload-jobs", UploadJobService.stop)
+lifecycle.on_drain("email-outbox", EmailOutboxService.stop)
+lifecycle.on_close("oracle", close_pools)
+lifecycle.on_close("aws", _close_aws_clients)
+lifecycle.on_close("executors", _shutdown_executors)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Workers de jobs de carga asíncrona
+    await UploadJobService.start()
+    # Relay del outbox de emails hacia SQS
+    if settings.EMAIL_OUTBOX_ENABLED:
+        await EmailOutboxService.start()
+    # Las dependencias pesadas se importan en segundo plano: /health responde sin esperarlas
+    if settings.WARMUP_ON_STARTUP:
+        app.state.warm_up_task = asyncio.create_task(warm_up())
+    lifecycle.mark_ready()
+    yield
+    await lifecycle.shutdown(settings.SHUTDOWN_TIMEOUT_SECONDS)
+
+
 app = FastAPI(
     title="MailBridge API",
     version="0.1.0",
     docs_url="/docs",        # Swagger UI
     redoc_url="/redoc",      # Redoc
     openapi_url="/openapi.json",
-    default_response_class=ORJSONResponse
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan
 )
 
+# Límite de tamaño del cuerpo por ruta: se rechaza con 413 antes de bufferizar la carga
+_upload_json_limit = base64_body_limit(settings.MAX_UPLOAD_BYTES)
+app.add_middleware(
+    BodySizeLimitMiddleware,
+    default_limit=settings.MAX_REQUEST_BODY_BYTES,
+    route_limits={
+        f"{settings.API_V1_PREFIX}/upload": _upload_json_limit,
+        f"{settings.API_V1_PREFIX}/upload-async": _upload_json_limit,
+        f"{settings.API_V1_PREFIX}/send-email-with-attachments": _upload_json_limit,
+        f"{settings.API_V1_PREFIX}/upload-raw-blob": settings.MAX_UPLOAD_BYTES,
+        **settings.REQUEST_BODY_LIMITS,
+    },
+)
+
+# Solicitudes en curso, para drenarlas en el apagado
+app.add_middleware(InFlightMiddleware)
+
 # CORS (ajusta allow_origins según tu necesidad)
 app.add_middleware(
     CORSMiddleware,
@@ -38,12 +108,18 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Deadline por solicitud: acota el tiempo total que pueden consumir los reintentos
+@app.middleware("http")
+async def request_deadline_middleware(request: Request, call_next):
+    with request_deadline(settings.REQUEST_DEADLINE_SECONDS):
+        return await call_next(request)
+
 # Handler de errores de validación para devolver un JSON limpio
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     return JSONResponse(
         status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
-        content={"detail": exc.errors()},
+        content={"detail": jsonable_encoder(exc.errors())},
     )
 
 # Include API routes#
@@ -55,6 +131,22 @@ app.include_router(api_router, prefix=settings.API_V1_PREFIX)
 async def health_check():
     return {"status": "ok", "service": "MailBridge", "version": "1"}#app.version}
 
+
+# Readiness: 503 mientras arranca o drena, para que el balanceador no envíe tráfico nuevo
+@app.get("/ready", tags=["Health"], summary="Readiness check")
+async def readiness_check():
+    if not lifecycle.ready:
+        return ORJSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                              content={"status": "draining" if lifecycle.draining else "starting",
+                                       "in_flight": lifecycle.in_flight})
+    return {"status": "ready", "in_flight": lifecycle.in_flight}
+
+
+# Métricas internas (colas de admisión, rechazos, etc.)
+@app.get("/metrics", tags=["Health"], summary="Métricas del servicio")
+async def get_metrics():
+    return metrics.snapshot()
+
 # Personalizamos el esquema OpenAPI (opcional)
 def custom_openapi():
     if app.openapi_schema:
@@ -72,9 +164,12 @@ def custom_openapi():
 app.openapi = custom_openapi
 
 if __name__ == "__main__":
+    import uvicorn
+
     uvicorn.run(
         "app.main:app",
         host=settings.HOST if hasattr(settings, "HOST") else "0.0.0.0",
         port=settings.PORT if hasattr(settings, "PORT") else 8000,
         reload=getattr(settings, "DEBUG", True),
+        timeout_graceful_shutdown=settings.SHUTDOWN_TIMEOUT_SECONDS,
     )
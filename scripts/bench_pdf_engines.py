@@ -0,0 +1,162 @@
+"""
+Compara los motores de compresión de PDFs > 1 MB (utils/compress_pdf_bytes.py): tiempo por
+archivo y tamaño final de 'ghostscript' (gs + pikepdf) contra 'images' (reducción de imágenes
+en proceso con pikepdf + Pillow). Como referencia se incluye 'pikepdf' (solo recomprime los
+streams, el paso que ambos motores aplican al final). Si `gs` no está instalado, ese motor se
+reporta como no disponible. Con --workers N se agrega cada motor en modo paralelo (rangos de
+páginas comprimidos en N procesos y unidos al final), para medir cómo escala con los núcleos.
+
+Sin argumentos se generan PDFs sintéticos:
+  fotos     páginas con una foto RGB a ~600 dpi (Flate) y texto
+  escaneo   páginas escaneadas en gris a 300 dpi (Flate)
+  jpeg      fotos ya en JPEG (calidad 95) a ~400 dpi, dibujadas dentro de un Form XObject
+
+Uso:
+    python scripts/bench_pdf_engines.py
+    python scripts/bench_pdf_engines.py factura.pdf catalogo.pdf --repeat 3 --dpi 150 --quality 75
+    python scripts/bench_pdf_engines.py --pages 200 --workers 8
+"""
+import argparse
+import io
+import shutil
+import sys
+import time
+import zlib
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pikepdf  # noqa: E402
+from PIL import Image, ImageDraw, ImageFilter  # noqa: E402
+
+from utils.compress_pdf_bytes import (  # noqa: E402
+    ENGINE_GHOSTSCRIPT, ENGINE_IMAGES, THRESHOLD_PDF, _pikepdf_save, compress_pdf
+)
+from utils.pdf_images import DEFAULT_JPEG_QUALITY, DEFAULT_TARGET_DPI  # noqa: E402
+from utils.pdf_parallel import new_process_pool  # noqa: E402
+
+
+def _photo(width: int, height: int, mode: str, seed: int) -> Image.Image:
+    """Imagen con gradientes, bordes y algo de ruido: se comprime como una foto, no como un color plano."""
+    base = Image.radial_gradient("L").resize((width, height))
+    noise = Image.effect_noise((width, height), 24 + seed)
+    image = Image.merge("RGB", (base, noise.filter(ImageFilter.GaussianBlur(2)), Image.linear_gradient("L").resize((width, height))))
+    draw = ImageDraw.Draw(image)
+    for i in range(12):
+        x, y = (seed * 97 + i * 211) % width, (seed * 53 + i * 149) % height
+        draw.ellipse((x, y, x + width // 6, y + height // 6), outline=(255, 255 - i * 20, i * 20), width=6)
+    return image.convert(mode)
+
+
+def _image_xobject(pdf: pikepdf.Pdf, image: Image.Image, jpeg_quality: Optional[int] = None) -> pikepdf.Stream:
+    colorspace = pikepdf.Name.DeviceRGB if image.mode == "RGB" else pikepdf.Name.DeviceGray
+    if jpeg_quality:
+        out = io.BytesIO()
+        image.save(out, "JPEG", quality=jpeg_quality)
+        data, filter_ = out.getvalue(), pikepdf.Name.DCTDecode
+    else:
+        data, filter_ = zlib.compress(image.tobytes(), 6), pikepdf.Name.FlateDecode
+    stream = pikepdf.Stream(pdf, data)
+    stream.Type, stream.Subtype = pikepdf.Name.XObject, pikepdf.Name.Image
+    stream.Width, stream.Height = image.size
+    stream.ColorSpace, stream.BitsPerComponent, stream.Filter = colorspace, 8, filter_
+    return stream
+
+
+def _sample(kind: str, pages: int) -> bytes:
+    pdf = pikepdf.new()
+    font = pdf.make_indirect(pikepdf.Dictionary(Type=pikepdf.Name.Font, Subtype=pikepdf.Name.Type1,
+                                                BaseFont=pikepdf.Name.Helvetica))
+    for n in range(pages):
+        if kind == "fotos":
+            image = _image_xobject(pdf, _photo(2400, 1800, "RGB", n))  # 4 x 3 pulgadas -> 600 dpi
+            draw = b"q 288 0 0 216 162 400 cm /Im0 Do Q"
+        elif kind == "escaneo":
+            image = _image_xobject(pdf, _photo(2550, 3300, "L", n))  # carta completa -> 300 dpi
+            draw = b"q 612 0 0 792 0 0 cm /Im0 Do Q"
+        else:
+            image = _image_xobject(pdf, _photo(2000, 1600, "RGB", n), jpeg_quality=95)  # 5 x 4 pulgadas -> 400 dpi
+            draw = b"q 1 0 0 1 126 300 cm /Fm0 Do Q"
+        resources = pikepdf.Dictionary(Font=pikepdf.Dictionary(F1=font), XObject=pikepdf.Dictionary(Im0=image))
+        if kind == "jpeg":
+            form = pikepdf.Stream(pdf, b"q 360 0 0 288 0 0 cm /Im0 Do Q")
+            form.Type, form.Subtype = pikepdf.Name.XObject, pikepdf.Name.Form
+            form.BBox, form.Resources = [0, 0, 360, 288], pikepdf.Dictionary(XObject=pikepdf.Dictionary(Im0=image))
+            resources = pikepdf.Dictionary(Font=pikepdf.Dictionary(F1=font), XObject=pikepdf.Dictionary(Fm0=form))
+        text = f"BT /F1 14 Tf 72 740 Td (Documento de prueba {kind}, pagina {n + 1}) Tj ET".encode()
+        page = pikepdf.Page(pikepdf.Dictionary(Type=pikepdf.Name.Page, MediaBox=[0, 0, 612, 792],
+                                               Resources=resources))
+        page.obj.Contents = pikepdf.Stream(pdf, draw + b"\n" + text)
+        pdf.pages.append(page)
+    out = io.BytesIO()
+    pdf.save(out)
+    return out.getvalue()
+
+
+def _engines(dpi: int, quality: int, workers: int) -> Dict[str, Optional[Callable[[bytes], int]]]:
+    pool = new_process_pool(workers) if workers > 1 else None
+
+    def _run(engine: str, parallel: bool = False) -> Callable[[bytes], int]:
+        def _compress(data: bytes) -> int:
+            out, size = compress_pdf(data, engine=engine, image_dpi=dpi, jpeg_quality=quality,
+                                     parallel_min_pages=1 if parallel else 0,
+                                     parallel_workers=workers, process_pool=pool)
+            if out is not None:
+                with out, pikepdf.Pdf.open(out) as pdf:
+                    len(pdf.pages)  # la salida tiene que abrir
+            return size
+        return _compress
+
+    def _streams_only(data: bytes) -> int:
+        out = io.BytesIO()
+        _pikepdf_save(io.BytesIO(data), out)
+        return min(out.tell(), len(data))
+
+    engines = {
+        "pikepdf": _streams_only,
+        ENGINE_GHOSTSCRIPT: _run(ENGINE_GHOSTSCRIPT) if shutil.which("gs") else None,
+        ENGINE_IMAGES: _run(ENGINE_IMAGES),
+    }
+    if pool is not None:
+        engines[f"{ENGINE_GHOSTSCRIPT} x{workers}"] = _run(ENGINE_GHOSTSCRIPT, True) if shutil.which("gs") else None
+        engines[f"{ENGINE_IMAGES} x{workers}"] = _run(ENGINE_IMAGES, True)
+    return engines
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pdfs", nargs="*", type=Path, help="PDFs a comprimir (por defecto, sintéticos)")
+    parser.add_argument("--pages", type=int, default=3, help="Páginas de cada PDF sintético")
+    parser.add_argument("--repeat", type=int, default=3, help="Corridas por motor; se reporta la mejor")
+    parser.add_argument("--dpi", type=int, default=DEFAULT_TARGET_DPI)
+    parser.add_argument("--quality", type=int, default=DEFAULT_JPEG_QUALITY)
+    parser.add_argument("--workers", type=int, default=1, help="Procesos del modo paralelo (1 = no medirlo)")
+    args = parser.parse_args()
+
+    samples: List[Tuple[str, bytes]] = (
+        [(path.name, path.read_bytes()) for path in args.pdfs] if args.pdfs
+        else [(kind, _sample(kind, args.pages)) for kind in ("fotos", "escaneo", "jpeg")]
+    )
+    engines = _engines(args.dpi, args.quality, args.workers)
+
+    print(f"{'pdf':16} {'original':>10} {'motor':16} {'final':>10} {'ratio':>7} {'s/archivo':>10}")
+    for name, data in samples:
+        if len(data) <= THRESHOLD_PDF:
+            print(f"{name:16} {len(data) / 1e6:9.2f}M  (<= {THRESHOLD_PDF // 1024} KB: ningún motor aplica)")
+            continue
+        for engine, fn in engines.items():
+            if fn is None:
+                print(f"{name:16} {len(data) / 1e6:9.2f}M {engine:16} {'no disponible':>10}")
+                continue
+            best, size = float("inf"), len(data)
+            for _ in range(args.repeat):
+                started = time.perf_counter()
+                size = fn(data)
+                best = min(best, time.perf_counter() - started)
+            print(f"{name:16} {len(data) / 1e6:9.2f}M {engine:16} {size / 1e6:9.2f}M {size / len(data):7.1%} {best:10.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,218 @@
+"""
+Microbenchmarks del pipeline de solicitudes: aísla cada etapa de CPU de /send-email y /upload
+para varios tamaños de payload y compara la implementación actual contra la anterior.
+
+Etapas:
+  recipients  EmailRequest.model_validate_json con N destinatarios (EmailStr vs caché LRU)
+  html        fix_html_body sobre HTML de distintos tamaños (regex vs str.replace)
+  sqs_body    serialización del MessageBody de SQS (json.dumps vs orjson)
+  upload      UploadRequest.model_validate_json con blobs de distintos tamaños (el blob
+              se valida como texto UTF-8, sin decodificar base64)
+
+Cada caso reporta el mejor tiempo por llamada de --repeat corridas. Con --history los
+resultados se agregan (una línea JSON por corrida, con el commit) para seguirlos en el
+tiempo; --compare muestra la variación contra la última corrida registrada.
+
+Uso:
+    python scripts/bench_request_pipeline.py
+    python scripts/bench_request_pipeline.py --stage html --stage sqs_body --quick
+    python scripts/bench_request_pipeline.py --history bench-history.jsonl --compare bench-history.jsonl
+"""
+import argparse
+import json
+import platform
+import re
+import subprocess
+import sys
+import time
+import timeit
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from pydantic import EmailStr  # noqa: E402
+
+from app.core.config import settings  # noqa: E402
+from app.helpers.aws_helper import AwsHelper  # noqa: E402
+from app.schemas.EmailRequest import EmailRequest, UploadRequest, _normalize_email  # noqa: E402
+from utils import fast_json  # noqa: E402
+from utils.fix_html_body import fix_html_body  # noqa: E402
+
+ROOT = Path(__file__).resolve().parent.parent
+DATABASE = settings.AVAILABLE_DATABASES[0]
+
+# (etapa, caso, variante) -> función a medir
+Case = Tuple[str, str, str, Callable[[], Any]]
+
+
+class BaselineEmailRequest(EmailRequest):
+    """
+    EmailRequest con EmailStr de pydantic, sin caché: la referencia de la etapa 'recipients'.
+    """
+    from_email: EmailStr
+    to:         List[EmailStr]
+    cc:         List[EmailStr] = []
+    bcc:        List[EmailStr] = []
+
+
+_QUOTE_RE = re.compile(r'(?<!\\)"')
+
+
+def regex_fix_html_body(html_body: str) -> str:
+    return _QUOTE_RE.sub(r'\"', html_body)
+
+
+def _recipients(n: int) -> List[str]:
+    return [f"Destinatario.{i}@Cliente{i % 7}.example.com" for i in range(n)]
+
+
+def _html(size: int) -> str:
+    block = '<p class="item" style="color: #333">Estimado "cliente", su documento \\"adjunto\\" está listo.</p>\n'
+    return (block * (size // len(block) + 1))[:size]
+
+
+def _email_body(n: int) -> bytes:
+    recipients = _recipients(n)
+    return json.dumps({
+        "database": DATABASE,
+        "from_email": "notificaciones@example.com",
+        "to": recipients[: max(1, n // 2)],
+        "cc": recipients[n // 2: n * 3 // 4],
+        "bcc": recipients[n * 3 // 4:],
+        "subject": "Estado de cuenta",
+        "html_body": _html(4 * 1024),
+    }).encode()
+
+
+def _sqs_msg(n: int, html_size: int) -> Dict[str, Any]:
+    return {
+        "from": "notificaciones@example.com",
+        "to": _recipients(n),
+        "cc": [],
+        "bcc": [],
+        "subject": "Estado de cuenta — ñandú",
+        "body": "",
+        "html_body": fix_html_body(_html(html_size)),
+        "attachments": [f"s3://bucket/docs/{i}.pdf" for i in range(3)],
+    }
+
+
+def _upload_body(size: int) -> bytes:
+    blob = ("QUJD" * (size // 4 + 1))[:size]
+    return json.dumps({"database": DATABASE, "filename": "doc.pdf", "id_proceso": 1, "blob": blob}).encode()
+
+
+def cases(quick: bool) -> Iterator[Case]:
+    recipient_counts = (1, 50) if quick else (1, 50, 500)
+    for n in recipient_counts:
+        body = _email_body(n)
+        yield "recipients", f"{n} destinatarios", "EmailStr", lambda b=body: BaselineEmailRequest.model_validate_json(b)
+        yield "recipients", f"{n} destinatarios", "caché", lambda b=body: EmailRequest.model_validate_json(b)
+
+        def _cold(b: bytes = body) -> Any:
+            _normalize_email.cache_clear()
+            return EmailRequest.model_validate_json(b)
+
+        yield "recipients", f"{n} destinatarios", "caché (frío)", _cold
+
+    html_sizes = (1024, 64 * 1024) if quick else (1024, 64 * 1024, 1024 * 1024)
+    for size in html_sizes:
+        html = _html(size)
+        assert regex_fix_html_body(html) == fix_html_body(html)
+        yield "html", f"{size // 1024} KB", "regex", lambda h=html: regex_fix_html_body(h)
+        yield "html", f"{size // 1024} KB", "str.replace", lambda h=html: fix_html_body(h)
+
+    for n, html_size in ((1, 4 * 1024), (50, 64 * 1024)) if quick else ((1, 4 * 1024), (50, 64 * 1024), (500, 512 * 1024)):
+        msg = _sqs_msg(n, html_size)
+        assert json.loads(fast_json.dumps(msg)) == msg
+        label = f"{n} dest., {html_size // 1024} KB HTML"
+        yield "sqs_body", label, "json", lambda m=msg: json.dumps(m, ensure_ascii=False)
+        yield "sqs_body", label, "orjson", lambda m=msg: fast_json.dumps(m)
+        yield "sqs_body", label, "build_email_message", lambda m=msg: AwsHelper.build_email_message(
+            from_addr=m["from"], to_addrs=m["to"], subject=m["subject"], html_body=m["html_body"],
+            attachments=m["attachments"],
+        )
+
+    upload_sizes = (64 * 1024, 1024 * 1024) if quick else (64 * 1024, 1024 * 1024, 8 * 1024 * 1024)
+    for size in upload_sizes:
+        body = _upload_body(size)
+        yield "upload", f"{size // 1024} KB", "model_validate_json", lambda b=body: UploadRequest.model_validate_json(b)
+
+
+def measure(fn: Callable[[], Any], repeat: int, min_time: float) -> float:
+    """
+    Mejor tiempo por llamada (µs) de `repeat` corridas de al menos `min_time` segundos.
+    """
+    timer = timeit.Timer(fn)
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_time:
+            break
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9)))
+    return min(timer.repeat(repeat=repeat, number=number)) / number * 1e6
+
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _last_record(path: Path) -> Optional[Dict[str, Any]]:
+    if not path.exists():
+        return None
+    lines = [line for line in path.read_text(encoding="utf-8").splitlines() if line.strip()]
+    return json.loads(lines[-1]) if lines else None
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stage", action="append", choices=("recipients", "html", "sqs_body", "upload"),
+                        help="Etapas a medir (por defecto todas); se puede repetir")
+    parser.add_argument("--quick", action="store_true", help="Menos tamaños y corridas más cortas")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--history", type=Path, help="Archivo JSONL al que se agrega esta corrida")
+    parser.add_argument("--compare", type=Path, help="Archivo JSONL contra cuya última corrida comparar")
+    args = parser.parse_args()
+
+    previous = _last_record(args.compare) if args.compare else None
+    before = {(r["stage"], r["case"], r["variant"]): r["us"] for r in (previous or {}).get("results", [])}
+    min_time = 0.05 if args.quick else 0.2
+
+    results: List[Dict[str, Any]] = []
+    baselines: Dict[Tuple[str, str], float] = {}
+    print(f"{'etapa':11} {'caso':26} {'variante':20} {'µs/llamada':>12} {'vs. ref.':>9} {'vs. anterior':>13}")
+    for stage, case, variant, fn in cases(args.quick):
+        if args.stage and stage not in args.stage:
+            continue
+        us = measure(fn, args.repeat, min_time)
+        # La primera variante de cada caso es la referencia contra la que se comparan las demás.
+        reference = baselines.setdefault((stage, case), us)
+        speedup = f"x{reference / us:.2f}" if reference != us else ""
+        old = before.get((stage, case, variant))
+        delta = f"{(us - old) / old * 100:+.1f}%" if old else ""
+        print(f"{stage:11} {case:26} {variant:20} {us:12.1f} {speedup:>9} {delta:>13}")
+        results.append({"stage": stage, "case": case, "variant": variant, "us": round(us, 3)})
+
+    if previous:
+        print(f"Comparado contra la corrida {previous.get('commit') or '?'} del {previous.get('timestamp')}")
+    if args.history:
+        record = {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "commit": _commit(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "results": results,
+        }
+        with args.history.open("a", encoding="utf-8") as f:
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        print(f"Resultados agregados a {args.history}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
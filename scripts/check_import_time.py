@@ -0,0 +1,73 @@
+"""
+Control de presupuesto de arranque: importa `main` con `python -X importtime` en un
+proceso limpio y falla (exit 1) si el tiempo acumulado supera el presupuesto o si alguna
+dependencia pesada vuelve a cargarse al importar.
+
+Uso en CI:
+    python scripts/check_import_time.py --budget-ms 900
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# Deben cargarse en el primer uso o en el warm-up (app/core/warmup.py), nunca al importar.
+LAZY_MODULES = ("boto3", "botocore.config", "pikepdf", "oracledb", "jose", "sqlalchemy", "uvicorn")
+
+LINE_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)$")
+
+
+def measure(module: str) -> Dict[str, int]:
+    """
+    Devuelve {módulo: tiempo acumulado en µs} para un import en frío de `module`.
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        sys.stderr.write(proc.stderr)
+        raise SystemExit(f"No se pudo importar '{module}'.")
+    cumulative: Dict[str, int] = {}
+    for line in proc.stderr.splitlines():
+        match = LINE_RE.match(line)
+        if match:
+            cumulative[match.group(4)] = int(match.group(2))
+    return cumulative
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_TIME_BUDGET_MS", 900)))
+    parser.add_argument("--runs", type=int, default=3, help="Se toma la mejor de N corridas para reducir ruido")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    runs = [measure(args.module) for _ in range(args.runs)]
+    best = min(runs, key=lambda r: r.get(args.module, 0))
+    total_ms = best.get(args.module, 0) / 1000
+
+    print(f"import {args.module}: {total_ms:.0f} ms (presupuesto {args.budget_ms:.0f} ms)")
+    top_level = {name: us for name, us in best.items() if "." not in name and name != args.module}
+    for name, us in sorted(top_level.items(), key=lambda kv: kv[1], reverse=True)[:args.top]:
+        print(f"  {us / 1000:8.1f} ms  {name}")
+
+    failed = False
+    eager = [name for name in LAZY_MODULES if name in best]
+    if eager:
+        print(f"ERROR: dependencias pesadas importadas al arrancar: {', '.join(eager)}")
+        failed = True
+    if total_ms > args.budget_ms:
+        print(f"ERROR: el import de '{args.module}' supera el presupuesto por {total_ms - args.budget_ms:.0f} ms")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+"""
+Control de memoria del camino de carga: mide con tracemalloc el pico de memoria Python
+que agrega una carga (parseo del JSON + compresión + subida) y falla (exit 1) si supera
+`--max-factor` veces el tamaño del cuerpo de la solicitud.
+
+La subida va a un cliente S3 de descarte que consume el stream en bloques, como s3transfer,
+así que no requiere red ni credenciales. La memoria nativa de pikepdf/qpdf no la ve
+tracemalloc; lo que se controla son las copias del blob en Python.
+
+Uso en CI:
+    python scripts/check_upload_memory.py --size-mb 6 --max-factor 2.5
+"""
+import argparse
+import asyncio
+import base64
+import io
+import os
+import shutil
+import sys
+import tracemalloc
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Tuple
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.core.config import settings  # noqa: E402
+from app.helpers.aws_helper import AwsHelper  # noqa: E402
+from app.schemas.EmailRequest import UploadRequest  # noqa: E402
+from utils.compress_pdf_bytes import THRESHOLD_PDF  # noqa: E402
+
+DATABASE = settings.AVAILABLE_DATABASES[0]
+READ_CHUNK = 64 * 1024
+
+
+class DiscardS3:
+    """
+    Cliente S3 de descarte: lee el stream en bloques y lo descarta.
+    """
+
+    def upload_fileobj(self, fileobj, bucket: str, key: str, **_: Any) -> None:
+        while fileobj.read(READ_CHUNK):
+            pass
+
+
+async def _discard_client(service: str, database: str) -> DiscardS3:
+    return DiscardS3()
+
+
+async def _global_deadline(database: str) -> float:
+    return settings.PDF_COMPRESSION_DEADLINE_SECONDS  # sin LVAL (Oracle): el plazo global
+
+
+def build_pdf(size: int, compressible: bool) -> bytes:
+    """
+    PDF sintético de ~`size` bytes con un stream sin comprimir en cada página.
+    """
+    import pikepdf
+
+    pdf = pikepdf.new()
+    per_page = 256 * 1024
+    for _ in range(max(1, size // per_page)):
+        pdf.add_blank_page()
+        payload = b"0 0 m 0 0 l S\n" * (per_page // 14) if compressible else os.urandom(per_page)
+        pdf.pages[-1].Contents = pdf.make_stream(payload)
+    out = io.BytesIO()
+    pdf.save(out, compress_streams=False)
+    return out.getvalue()
+
+
+def measure(fn: Callable[[], Any]) -> int:
+    """
+    Pico de memoria (bytes) asignado durante fn(), por encima de lo ya asignado.
+    """
+    tracemalloc.reset_peak()
+    baseline, _ = tracemalloc.get_traced_memory()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    return peak - baseline
+
+
+def scenarios(size: int) -> List[Tuple[str, str, bytearray]]:
+    """
+    (etiqueta, filename, cuerpo). Los .csv van como JSON de /upload (blob de texto);
+    los PDFs como cuerpo binario de /upload-raw-blob, que es lo que recibe read_body().
+    """
+    csv = base64.b64encode(os.urandom(size * 3 // 4))
+    cases = [
+        ("json csv", "datos.csv",
+         bytearray(b'{"database": "%s", "filename": "datos.csv", "id_proceso": 1, "blob": "%s"}'
+                   % (DATABASE.encode(), csv))),
+        ("raw csv", "datos.csv", bytearray(csv)),
+        # Por debajo de THRESHOLD_PDF solo interviene pikepdf.
+        ("raw pdf (pikepdf)", "medio.pdf", bytearray(build_pdf(THRESHOLD_PDF - 64 * 1024, compressible=True))),
+    ]
+    if shutil.which("gs"):
+        cases += [
+            ("raw pdf comprimible", "doc.pdf", bytearray(build_pdf(size, compressible=True))),
+            ("raw pdf incomprimible", "scan.pdf", bytearray(build_pdf(size, compressible=False))),
+        ]
+    else:
+        print("Ghostscript no disponible: se omiten los PDFs grandes.")
+    return cases
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size-mb", type=float, default=6.0)
+    parser.add_argument("--max-factor", type=float, default=float(os.getenv("UPLOAD_MEMORY_MAX_FACTOR", 2.5)))
+    args = parser.parse_args()
+
+    AwsHelper.get_client = staticmethod(_discard_client)
+    AwsHelper.pdf_compression_deadline = staticmethod(_global_deadline)
+    size = int(args.size_mb * 1024 * 1024)
+    failed = False
+    tracemalloc.start()
+
+    for label, filename, body in scenarios(size):
+        payload_size = len(body)
+        result: Dict[str, Any] = {}
+
+        def _run() -> None:
+            if label.startswith("json"):
+                payload = UploadRequest.model_validate_json(body)
+                blob, filename_ = payload.blob, payload.filename
+            else:
+                blob, filename_ = body, filename
+            files = [{"filename": filename_, "blob": blob, "id_proceso": 1}]
+            result["metadata"] = asyncio.run(
+                AwsHelper.upload_blobs_to_s3(files, bucket="bucket", prefix="docs/", database=DATABASE)
+            )
+
+        peak = measure(_run)
+        factor = peak / payload_size
+        status = "OK" if factor <= args.max_factor else "ERROR"
+        failed |= status == "ERROR"
+        print(f"{status:5} {label:22} cuerpo {payload_size / 2**20:5.1f} MB  pico {peak / 2**20:6.1f} MB  "
+              f"x{factor:.2f} (máx x{args.max_factor})  subido {result['metadata'][0]['size']} bytes")
+
+    tracemalloc.stop()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
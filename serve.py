@@ -0,0 +1,166 @@
+# serve.py
+"""
+Modo multi-proceso de MailBridge.
+
+El proceso padre importa la aplicación y precarga las dependencias pesadas, abre el
+socket de escucha y hace fork de WEB_CONCURRENCY workers uvicorn que comparten ese
+socket: cada worker arranca ya "caliente" (copy-on-write) y el kernel reparte las
+conexiones. El padre solo supervisa: reinicia workers caídos y reenvía SIGTERM/SIGINT
+para un apagado ordenado.
+
+Apagado: con SIGTERM cada worker pasa /ready a 503 de inmediato, sigue atendiendo durante
+SHUTDOWN_READINESS_DELAY_SECONDS para que el balanceador lo retire, deja de aceptar
+conexiones y drena (solicitudes, jobs, mensajes pendientes) hasta SHUTDOWN_TIMEOUT_SECONDS
+antes de cerrar los pools de Oracle y los clientes AWS (ver app/core/lifecycle.py).
+
+Los pools de Oracle y los límites de admisión se reparten entre los workers
+(settings.per_worker) y LVAL / tokens verificados se comparten vía app/core/shared_cache.py.
+
+Uso:
+    WEB_CONCURRENCY=4 python serve.py
+"""
+import logging
+import os
+import signal
+import socket
+import sys
+import threading
+import time
+from typing import Set
+
+from app.core.config import settings
+
+logging.basicConfig(
+    level=logging.INFO,
+    format="%(asctime)s - %(levelname)s - %(message)s"
+)
+logger = logging.getLogger("mailbridge.serve")
+
+RESPAWN_DELAY_SECONDS = 1.0
+
+
+def _bind(host: str, port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET6 if ":" in host else socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _preload():
+    """
+    Importa la app y las dependencias pesadas en el padre, antes del fork.
+    El Instant Client de Oracle y los procesos de compresión no se inician aquí: cada worker
+    lo hace tras el fork (AFTER_FORK_STEPS).
+    """
+    import main
+    from app.core.warmup import AFTER_FORK_STEPS, WARMUP_STEPS
+
+    for name, step in WARMUP_STEPS:
+        if name in AFTER_FORK_STEPS:
+            continue
+        try:
+            step()
+        except Exception:
+            logger.exception("Precarga de '%s' falló; el worker la cargará en el primer uso.", name)
+    return main.app
+
+
+def _run_worker(app, sock: socket.socket) -> None:
+    import uvicorn
+    from app.core.lifecycle import lifecycle
+
+    class DrainingServer(uvicorn.Server):
+        """
+        Ante la primera señal se reporta no-listo y demora la salida real de uvicorn
+        SHUTDOWN_READINESS_DELAY_SECONDS; una segunda señal fuerza la salida como siempre.
+        """
+        exit_timer = None
+
+        def handle_exit(self, sig, frame) -> None:
+            lifecycle.begin_drain()
+            delay = settings.SHUTDOWN_READINESS_DELAY_SECONDS
+            if delay <= 0 or self.exit_timer is not None:
+                if self.exit_timer is not None:
+                    self.exit_timer.cancel()
+                self._exit(sig, frame)
+                return
+            self.exit_timer = threading.Timer(delay, self._exit, (sig, frame))
+            self.exit_timer.daemon = True
+            self.exit_timer.start()
+
+        def _exit(self, sig, frame) -> None:
+            lifecycle.start_deadline(settings.SHUTDOWN_TIMEOUT_SECONDS)
+            super().handle_exit(sig, frame)
+
+    config = uvicorn.Config(app, lifespan="on", log_config=None, proxy_headers=True,
+                            timeout_graceful_shutdown=int(settings.SHUTDOWN_TIMEOUT_SECONDS))
+    DrainingServer(config).run(sockets=[sock])
+
+
+def _spawn(app, sock: socket.socket) -> int:
+    pid = os.fork()
+    if pid == 0:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        code = 0
+        try:
+            _run_worker(app, sock)
+        except BaseException:
+            logger.exception("Worker %s terminó con error", os.getpid())
+            code = 1
+        finally:
+            os._exit(code)
+    logger.info("Worker %s iniciado", pid)
+    return pid
+
+
+def main() -> int:
+    workers = max(1, settings.WEB_CONCURRENCY)
+    sock = _bind(settings.SERVER_HOST, settings.SERVER_PORT)
+    started = time.perf_counter()
+    app = _preload()
+    logger.info(
+        "Aplicación precargada en %.0f ms; %s workers en %s:%s (pool Oracle por worker: %s-%s)",
+        (time.perf_counter() - started) * 1000, workers, settings.SERVER_HOST, settings.SERVER_PORT,
+        settings.per_worker(settings.ORACLE_POOL_MIN), settings.per_worker(settings.ORACLE_POOL_MAX),
+    )
+
+    children: Set[int] = set()
+    stopping = False
+
+    def _forward(signum, _frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signum)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, _forward)
+    signal.signal(signal.SIGINT, _forward)
+
+    for _ in range(workers):
+        children.add(_spawn(app, sock))
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        children.discard(pid)
+        if stopping:
+            continue
+        logger.warning("Worker %s terminó inesperadamente (status %s); se reinicia", pid, status)
+        time.sleep(RESPAWN_DELAY_SECONDS)
+        children.add(_spawn(app, sock))
+
+    sock.close()
+    logger.info("Todos los workers terminaron")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,490 @@
+import asyncio
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import time
+import uuid
+from datetime import timezone
+from email.utils import format_datetime
+from typing import Any, AsyncIterator, BinaryIO, Dict, List, Optional, Tuple
+
+from botocore.exceptions import ClientError
+from fastapi import Response, status
+from fastapi.responses import StreamingResponse
+
+from app.core.config import settings
+from app.core.executors import AWS, run_in
+from app.core.http_erros import HttpErrors
+from app.core.metrics import metrics
+from app.core.resilience import call_with_resilience, is_retryable_aws_error
+from app.helpers.aws_helper import AwsHelper
+from services.upload_service import UploadService
+
+logger = logging.getLogger(__name__)
+
+NOT_FOUND_CODES = ("404", "NoSuchKey", "NotFound")
+TEMP_MAX_AGE_SECONDS = 3600
+
+
+def _range_spec(header: Optional[str]) -> Optional[Tuple[Optional[int], Optional[int]]]:
+    """
+    (inicio, fin) de un header Range de un solo rango en bytes, sin conocer el tamaño:
+    fin None = hasta el final; inicio None = los últimos `fin` bytes. None si no se soporta.
+    """
+    if not header:
+        return None
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if first:
+            start, end = int(first), int(last) if last else None
+            if start < 0 or (end is not None and end < start):
+                return None
+            return start, end
+        return None, int(last)
+    except ValueError:
+        return None
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Interpreta un header Range de un solo rango en bytes y devuelve (inicio, fin) inclusivos.
+    Devuelve None si no hay rango o no se soporta (varios rangos, otra unidad, sintaxis
+    inválida): en ese caso se responde el objeto completo, como permite RFC 9110.
+    Lanza 416 si el rango queda fuera del objeto.
+    """
+    spec = _range_spec(header)
+    if spec is None:
+        return None
+    start, end = spec
+    if start is None:
+        if end <= 0:
+            raise HttpErrors.range_not_satisfiable(size)
+        start, end = max(0, size - end), size - 1
+    elif end is None:
+        end = max(start, size - 1)
+    if start >= size:
+        raise HttpErrors.range_not_satisfiable(size)
+    return start, min(end, size - 1)
+
+
+def s3_range(header: Optional[str]) -> Optional[str]:
+    """
+    El header Range normalizado para GetObject, o None si no se soporta o es un sufijo vacío
+    (ese caso responde 416 y se resuelve con el tamaño del objeto).
+    """
+    spec = _range_spec(header)
+    if spec is None:
+        return None
+    start, end = spec
+    if start is None:
+        return f"bytes=-{end}" if end > 0 else None
+    return f"bytes={start}-{'' if end is None else end}"
+
+
+def etag_matches(header: Optional[str], etag: str) -> bool:
+    """
+    Comparación débil de If-None-Match: acepta '*' y listas de ETags, con o sin prefijo W/.
+    """
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    tags = [tag.strip() for tag in header.split(",")]
+    return etag in (tag[2:] if tag.startswith("W/") else tag for tag in tags)
+
+
+class CachedDocument:
+    """
+    Entrada del caché abierta para lectura: el archivo queda abierto aunque otro worker
+    lo reemplace o lo desaloje mientras se envía.
+    """
+    __slots__ = ("meta", "file")
+
+    def __init__(self, meta: Dict[str, Any], file: BinaryIO):
+        self.meta = meta
+        self.file = file
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class DocumentCache:
+    """
+    Caché LRU en disco de objetos S3, compartido por todos los workers del host.
+    Cada objeto son dos archivos: {hash}.json con la metadata (ETag, tamaño, Content-Type,
+    última validación contra S3) y los bytes en {hash}.{etag}.bin. Se escriben en un temporal
+    y se publican con os.replace, de modo que un lector nunca ve un archivo a medias.
+    El mtime del .bin marca el último uso y el desalojo recorre el directorio completo,
+    por lo que el límite de tamaño es por host y no por worker.
+    """
+
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.revalidated = 0
+        self.bypassed = 0
+        self.evictions = 0
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+
+    def _meta_path(self, bucket: str, key: str) -> str:
+        digest = hashlib.sha256(f"{bucket}/{key}".encode("utf-8")).hexdigest()
+        return os.path.join(self.directory, f"{digest}.json")
+
+    def temp_path(self) -> str:
+        return os.path.join(self.directory, f".tmp-{uuid.uuid4().hex}")
+
+    def lookup(self, bucket: str, key: str) -> Optional[CachedDocument]:
+        meta_path = self._meta_path(bucket, key)
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            file = open(os.path.join(self.directory, meta["file"]), "rb")
+        except (OSError, ValueError, KeyError):
+            return None
+        try:
+            if os.fstat(file.fileno()).st_size != meta["size"]:
+                file.close()
+                return None
+            os.utime(file.fileno())
+        except OSError:
+            file.close()
+            return None
+        return CachedDocument(meta, file)
+
+    def publish(self, bucket: str, key: str, temp_path: str, meta: Dict[str, Any]) -> CachedDocument:
+        """
+        Publica un objeto descargado en temp_path y desaloja lo necesario para respetar el límite.
+        Devuelve la entrada ya abierta: sigue siendo legible aunque otro worker la desaloje enseguida.
+        """
+        meta_path = self._meta_path(bucket, key)
+        base = os.path.basename(meta_path)[:-len(".json")]
+        etag_digest = hashlib.sha256(meta["etag"].encode("utf-8")).hexdigest()[:16]
+        meta = {**meta, "file": f"{base}.{etag_digest}.bin"}
+
+        file = open(temp_path, "rb")
+        previous = self._read_meta(meta_path)
+        os.replace(temp_path, os.path.join(self.directory, meta["file"]))
+        self._write_meta(meta_path, meta)
+        if previous and previous.get("file") != meta["file"]:
+            self._remove(os.path.join(self.directory, previous["file"]))
+        self.evict()
+        return CachedDocument(meta, file)
+
+    def mark_validated(self, bucket: str, key: str, meta: Dict[str, Any]) -> None:
+        self._write_meta(self._meta_path(bucket, key), {**meta, "validated_at": time.time()})
+
+    def evict(self) -> None:
+        entries: List[Tuple[float, int, str]] = []
+        now = time.time()
+        total = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                if entry.name.startswith(".tmp-"):
+                    # Restos de descargas interrumpidas.
+                    if now - st.st_mtime > TEMP_MAX_AGE_SECONDS:
+                        self._remove(entry.path)
+                    continue
+                if entry.name.endswith(".bin"):
+                    entries.append((st.st_mtime, st.st_size, entry.name))
+                    total += st.st_size
+
+        entries.sort()
+        for _, size, name in entries:
+            if total <= self.max_bytes:
+                break
+            meta_path = os.path.join(self.directory, name.split(".", 1)[0] + ".json")
+            meta = self._read_meta(meta_path)
+            if meta and meta.get("file") == name:
+                self._remove(meta_path)
+            self._remove(os.path.join(self.directory, name))
+            total -= size
+            self.evictions += 1
+        self.size_bytes = total
+
+    def _write_meta(self, meta_path: str, meta: Dict[str, Any]) -> None:
+        temp_path = self.temp_path()
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(temp_path, meta_path)
+
+    @staticmethod
+    def _read_meta(meta_path: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "revalidated": self.revalidated,
+            "bypassed": self.bypassed,
+            "evictions": self.evictions,
+            "size_bytes": self.size_bytes,
+            "max_bytes": self.max_bytes,
+        }
+
+
+def _meta_from_response(resp: Dict[str, Any]) -> Dict[str, Any]:
+    last_modified = resp.get("LastModified")
+    content_range = resp.get("ContentRange")  # respuesta de un GetObject con Range: "bytes a-b/total"
+    return {
+        "etag": resp["ETag"],
+        "size": int(content_range.rpartition("/")[2]) if content_range else resp["ContentLength"],
+        "content_type": resp.get("ContentType") or "application/octet-stream",
+        "last_modified": format_datetime(last_modified.astimezone(timezone.utc), usegmt=True) if last_modified else None,
+        "validated_at": time.time(),
+    }
+
+
+def _base_headers(meta: Dict[str, Any]) -> Dict[str, str]:
+    headers = {
+        "ETag": meta["etag"],
+        "Accept-Ranges": "bytes",
+        "Cache-Control": "private, no-cache",
+    }
+    if meta.get("last_modified"):
+        headers["Last-Modified"] = meta["last_modified"]
+    return headers
+
+
+async def _iter_file(file: BinaryIO, start: int, length: int) -> AsyncIterator[bytes]:
+    try:
+        await asyncio.to_thread(file.seek, start)
+        remaining = length
+        while remaining > 0:
+            chunk = await asyncio.to_thread(file.read, min(settings.DOCUMENT_STREAM_CHUNK_BYTES, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        file.close()
+
+
+async def _iter_body(body: Any) -> AsyncIterator[bytes]:
+    try:
+        while True:
+            chunk = await run_in(AWS, body.read, settings.DOCUMENT_STREAM_CHUNK_BYTES)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        body.close()
+
+
+class DocumentDownloadService:
+    """
+    Descarga autenticada de los documentos subidos (id_documento = clave S3 bajo el bucket
+    y prefijo LVAL del tenant), con soporte de Range y revalidación por ETag/If-None-Match.
+    Los objetos de hasta DOCUMENT_CACHE_MAX_OBJECT_BYTES quedan en un caché LRU en disco:
+    dentro de DOCUMENT_CACHE_REVALIDATE_SECONDS un hit no consulta S3, y después se revalida
+    con un GetObject condicional (304 si no cambió). Los mayores se transmiten desde S3.
+    """
+    _cache: Optional[DocumentCache] = None
+    _locks: Dict[Tuple[str, str], List[Any]] = {}
+
+    @classmethod
+    def _get_cache(cls) -> DocumentCache:
+        if cls._cache is None:
+            cls._cache = DocumentCache(settings.DOCUMENT_CACHE_DIR, settings.DOCUMENT_CACHE_MAX_BYTES)
+        return cls._cache
+
+    @classmethod
+    @contextlib.asynccontextmanager
+    async def _key_lock(cls, ident: Tuple[str, str]) -> AsyncIterator[None]:
+        # Solicitudes concurrentes por el mismo objeto esperan a una sola descarga.
+        entry = cls._locks.setdefault(ident, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                cls._locks.pop(ident, None)
+
+    @staticmethod
+    async def resolve(database: str, id_documento: str) -> Tuple[str, str]:
+        """
+        Devuelve (bucket, clave) para id_documento, que debe estar bajo el prefijo LVAL del
+        tenant (y fuera del staging de cargas prefirmadas sin completar).
+        """
+        bucket, prefix = await UploadService.resolve_destination(database)
+        if not UploadService.is_document_key(prefix, id_documento):
+            raise HttpErrors.not_found(detail=f"Documento '{id_documento}' no encontrado.")
+        return bucket, id_documento
+
+    @staticmethod
+    async def _get_object(database: str, s3: Any, **kwargs: Any) -> Optional[Dict[str, Any]]:
+        """
+        GetObject con resiliencia. Devuelve None si S3 responde 304 (If-None-Match).
+        """
+        try:
+            return await call_with_resilience(
+                "s3", database, lambda: run_in(AWS, s3.get_object, **kwargs), is_retryable_aws_error
+            )
+        except ClientError as e:
+            error = e.response.get("Error", {})
+            if error.get("Code") == "304" or e.response.get("ResponseMetadata", {}).get("HTTPStatusCode") == 304:
+                return None
+            if error.get("Code") in NOT_FOUND_CODES:
+                raise HttpErrors.not_found(detail=f"Documento '{kwargs.get('Key')}' no encontrado.")
+            raise
+
+    @classmethod
+    async def _fetch(cls, database: str, s3: Any, bucket: str, key: str,
+                     byte_range: Optional[str] = None) -> Tuple[Optional[CachedDocument], Optional[Dict[str, Any]]]:
+        """
+        Devuelve la entrada del caché, o la respuesta de GetObject si el objeto no entra en él.
+        Con `byte_range` (formato de s3_range) y sin entrada vigente, el GetObject pide solo ese
+        rango: la respuesta (con ContentRange) se devuelve tal cual y no llena el caché. Si S3
+        rechaza el rango (InvalidRange), se pide el objeto completo.
+        """
+        cache = cls._get_cache()
+        cached = await asyncio.to_thread(cache.lookup, bucket, key)
+        if cached and time.time() - cached.meta["validated_at"] < settings.DOCUMENT_CACHE_REVALIDATE_SECONDS:
+            cache.hits += 1
+            return cached, None
+        if cached:
+            cached.close()
+
+        async with cls._key_lock((bucket, key)):
+            cached = await asyncio.to_thread(cache.lookup, bucket, key)
+            if cached and time.time() - cached.meta["validated_at"] < settings.DOCUMENT_CACHE_REVALIDATE_SECONDS:
+                cache.hits += 1
+                return cached, None
+
+            kwargs: Dict[str, Any] = {"Bucket": bucket, "Key": key}
+            if cached:
+                kwargs["IfNoneMatch"] = cached.meta["etag"]
+            try:
+                try:
+                    resp = await cls._get_object(database, s3, **dict(kwargs, Range=byte_range) if byte_range else kwargs)
+                except ClientError as e:
+                    if not byte_range or e.response.get("Error", {}).get("Code") != "InvalidRange":
+                        raise
+                    resp = await cls._get_object(database, s3, **kwargs)
+            except BaseException:
+                if cached:
+                    cached.close()
+                raise
+            if resp is None:
+                await asyncio.to_thread(cache.mark_validated, bucket, key, cached.meta)
+                cache.revalidated += 1
+                return cached, None
+            if cached:
+                cached.close()
+
+            cache.misses += 1
+            if resp.get("ContentRange"):
+                return None, resp
+            meta = _meta_from_response(resp)
+            if meta["size"] > min(settings.DOCUMENT_CACHE_MAX_OBJECT_BYTES, cache.max_bytes):
+                cache.bypassed += 1
+                return None, resp
+
+            temp_path = cache.temp_path()
+            body = resp["Body"]
+
+            def _download() -> None:
+                try:
+                    with open(temp_path, "wb") as f:
+                        while True:
+                            chunk = body.read(settings.DOCUMENT_STREAM_CHUNK_BYTES)
+                            if not chunk:
+                                break
+                            f.write(chunk)
+                finally:
+                    body.close()
+
+            try:
+                await run_in(AWS, _download)
+                return await asyncio.to_thread(cache.publish, bucket, key, temp_path, meta), None
+            except BaseException:
+                await asyncio.to_thread(DocumentCache._remove, temp_path)
+                raise
+
+    @classmethod
+    async def download(cls, database: str, id_documento: str, range_header: Optional[str] = None,
+                       if_none_match: Optional[str] = None, if_range: Optional[str] = None) -> Response:
+        """
+        Responde el documento completo (200), un rango (206), 304 si el ETag del cliente sigue
+        vigente o 416 si el rango queda fuera del objeto. If-Range con otro ETag anula el rango.
+        Fuera del caché, el rango se pide directamente a S3 en el único GetObject.
+        """
+        bucket, key = await cls.resolve(database, id_documento)
+        s3 = await AwsHelper.get_client("s3", database)
+        cached, resp = await cls._fetch(database, s3, bucket, key, s3_range(range_header))
+        meta = cached.meta if cached else _meta_from_response(resp)
+
+        def _release() -> None:
+            if cached:
+                cached.close()
+            else:
+                resp["Body"].close()
+
+        headers = _base_headers(meta)
+        if etag_matches(if_none_match, meta["etag"]):
+            _release()
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        size = meta["size"]
+        byte_range = None
+        if range_header and (not if_range or if_range.strip() == meta["etag"]):
+            try:
+                byte_range = parse_range(range_header, size)
+            except Exception:
+                _release()
+                raise
+        start, end = byte_range or (0, size - 1)
+        length = end - start + 1 if size else 0
+
+        if cached:
+            content = _iter_file(cached.file, start, length)
+        elif resp.get("ContentRange") and not byte_range:
+            # If-Range con otro ETag: el cliente necesita el objeto completo.
+            resp["Body"].close()
+            full = await cls._get_object(database, s3, Bucket=bucket, Key=key, IfMatch=meta["etag"])
+            content = _iter_body(full["Body"])
+        else:
+            content = _iter_body(resp["Body"])
+
+        headers["Content-Length"] = str(length)
+        if byte_range:
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+        return StreamingResponse(
+            content,
+            status_code=status.HTTP_206_PARTIAL_CONTENT if byte_range else status.HTTP_200_OK,
+            media_type=meta["content_type"],
+            headers=headers,
+        )
+
+
+metrics.register(
+    "document_cache",
+    lambda: DocumentDownloadService._cache.stats() if DocumentDownloadService._cache else {},
+)
@@ -0,0 +1,400 @@
+import asyncio
+import json
+import logging
+import mimetypes
+import os
+import re
+import time
+from collections import deque
+from email.message import EmailMessage
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.core.executors import AWS, run_in
+from app.core.metrics import metrics
+from app.helpers.aws_helper import AwsHelper
+from services.template_service import TemplateService
+
+logger = logging.getLogger(__name__)
+
+SQS_BATCH = 10
+DELETE_FLUSH_SECONDS = 0.2
+THROUGHPUT_WINDOW_SECONDS = 60.0
+# Errores de SES que no se resuelven reintentando: el mensaje espera el máximo backoff
+# (y, con una redrive policy en la cola, termina en su DLQ).
+SES_PERMANENT_ERRORS = {
+    "MessageRejected", "MailFromDomainNotVerified", "ConfigurationSetDoesNotExist",
+    "InvalidParameterValue", "AccountSendingPausedException",
+}
+_TAG_RE = re.compile(r"[^A-Za-z0-9_\-.@]")
+
+
+class TokenBucket:
+    """
+    Token bucket asíncrono: `rate` tokens por segundo con ráfagas de hasta `capacity`.
+    Los que esperan se atienden en orden de llegada.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = max(rate, 0.001)
+        self.capacity = max(capacity or rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, tokens: float = 1.0) -> None:
+        tokens = min(tokens, self.capacity)
+        async with self._lock:
+            self._refill()
+            while self._tokens < tokens:
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= tokens
+
+
+class DispatcherStats:
+    """
+    Contadores de un dispatcher: mensajes recibidos/enviados/fallidos/borrados,
+    throughput de la última ventana y lag (tiempo desde que el mensaje entró a SQS hasta su envío).
+    """
+
+    def __init__(self):
+        self.received = 0
+        self.sent = 0
+        self.failed = 0
+        self.deleted = 0
+        self.visibility_extended = 0
+        self.lag_avg = 0.0
+        self.lag_max = 0.0
+        self._sent_at: Deque[float] = deque()
+
+    def record_sent(self, lag: float) -> None:
+        now = time.monotonic()
+        self.sent += 1
+        self._sent_at.append(now)
+        self.lag_avg = lag if self.sent == 1 else 0.9 * self.lag_avg + 0.1 * lag
+        self.lag_max = max(self.lag_max, lag)
+
+    def throughput(self) -> float:
+        now = time.monotonic()
+        while self._sent_at and self._sent_at[0] < now - THROUGHPUT_WINDOW_SECONDS:
+            self._sent_at.popleft()
+        if not self._sent_at:
+            return 0.0
+        return len(self._sent_at) / max(now - self._sent_at[0], 1.0)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "received": self.received,
+            "sent": self.sent,
+            "failed": self.failed,
+            "deleted": self.deleted,
+            "visibility_extended": self.visibility_extended,
+            "throughput_per_second": round(self.throughput(), 2),
+            "lag_avg_seconds": round(self.lag_avg, 3),
+            "lag_max_seconds": round(self.lag_max, 3),
+        }
+
+
+class _InFlight:
+    __slots__ = ("message_id", "receipt", "received_at", "sent_timestamp", "receive_count")
+
+    def __init__(self, message: Dict[str, Any]):
+        attributes = message.get("Attributes", {})
+        self.message_id = message["MessageId"]
+        self.receipt = message["ReceiptHandle"]
+        self.received_at = time.monotonic()
+        self.sent_timestamp = int(attributes.get("SentTimestamp", 0)) / 1000 or time.time()
+        self.receive_count = int(attributes.get("ApproximateReceiveCount", 1))
+
+
+def _s3_location(url: str) -> Tuple[str, str]:
+    if not url.startswith("s3://") or "/" not in url[5:]:
+        raise ValueError(f"Adjunto con URL no soportada: {url}")
+    bucket, key = url[5:].split("/", 1)
+    return bucket, key
+
+
+def _ses_tags(attributes: Dict[str, Any]) -> List[Dict[str, str]]:
+    """
+    Los MessageAttributes del mensaje (los `tags` de /send-email) como tags de SES,
+    que solo admiten letras, números, '_', '-', '.' y '@'.
+    """
+    tags = []
+    for name, attr in attributes.items():
+        value = attr.get("StringValue")
+        if value is None:
+            continue
+        tags.append({"Name": _TAG_RE.sub("_", name)[:255], "Value": _TAG_RE.sub("_", value)[:255]})
+    return tags
+
+
+class EmailDispatcher:
+    """
+    Consumidor de la cola de emails de una base de datos: lee con long polling en lotes
+    de 10, envía por SES con concurrencia acotada y un token bucket ajustado a la tasa
+    de envío de la cuenta, borra en lotes y extiende la visibilidad de los mensajes cuyo
+    envío sigue en curso. Consume exactamente el JSON de AwsHelper.build_email_message.
+
+    Los clientes se inyectan (SQS, SES, S3), así que puede probarse contra stand-ins
+    locales (moto, LocalStack); `create` arma los reales con las credenciales LVAL.
+    """
+
+    def __init__(self, database: str, sqs, queue_url: str, ses, s3, send_rate: float,
+                 concurrency: Optional[int] = None,
+                 wait_time_seconds: Optional[int] = None,
+                 visibility_timeout: Optional[int] = None):
+        self.database = database
+        self.sqs = sqs
+        self.queue_url = queue_url
+        self.ses = ses
+        self.s3 = s3
+        self.concurrency = max(1, concurrency or settings.DISPATCHER_CONCURRENCY)
+        self.wait_time_seconds = settings.DISPATCHER_WAIT_TIME_SECONDS if wait_time_seconds is None else wait_time_seconds
+        self.visibility_timeout = max(5, visibility_timeout or settings.DISPATCHER_VISIBILITY_TIMEOUT_SECONDS)
+        # Se recibe un lote por adelantado para que los envíos no esperen al long polling.
+        self.max_in_flight = self.concurrency + SQS_BATCH
+        self.bucket = TokenBucket(send_rate)
+        self.stats = DispatcherStats()
+        self._send_slots = asyncio.Semaphore(self.concurrency)
+        self._in_flight: Dict[str, _InFlight] = {}
+        self._capacity = asyncio.Event()
+        self._capacity.set()
+        self._deletes: "asyncio.Queue[_InFlight]" = asyncio.Queue()
+        self._handlers: set = set()
+
+    @classmethod
+    async def create(cls, database: str, **kwargs: Any) -> "EmailDispatcher":
+        """
+        Dispatcher con los clientes boto3 de la base de datos. La tasa de envío es
+        DISPATCHER_SEND_RATE o, si no está configurada, el MaxSendRate de la cuenta SES.
+        """
+        sqs, queue_url = await AwsHelper.get_email_queue(database)
+        ses = await AwsHelper.get_client("ses", database)
+        s3 = await AwsHelper.get_client("s3", database)
+        send_rate = settings.DISPATCHER_SEND_RATE
+        if not send_rate:
+            quota = await run_in(AWS, ses.get_send_quota)
+            send_rate = float(quota["MaxSendRate"])
+        logger.info("Dispatcher de %s: cola %s, tasa SES %.1f/s, concurrencia %d",
+                    database, queue_url, send_rate, kwargs.get("concurrency") or settings.DISPATCHER_CONCURRENCY)
+        return cls(database, sqs, queue_url, ses, s3, send_rate, **kwargs)
+
+    async def run(self, stop: asyncio.Event, drain_timeout: float = 30.0) -> None:
+        """
+        Procesa la cola hasta que se active `stop`; luego espera hasta `drain_timeout`
+        segundos a los envíos en curso y borra los ya enviados.
+        """
+        deleter = asyncio.create_task(self._delete_loop(), name=f"dispatcher-delete-{self.database}")
+        heartbeat = asyncio.create_task(self._visibility_loop(), name=f"dispatcher-visibility-{self.database}")
+        receiver = asyncio.create_task(self._receive_loop(stop), name=f"dispatcher-receive-{self.database}")
+        try:
+            await stop.wait()
+            # No se cancela a mitad del long polling: el hilo seguiría y tomaría mensajes sin dueño.
+            await asyncio.wait([receiver], timeout=self.wait_time_seconds + 5)
+        finally:
+            receiver.cancel()
+            await asyncio.gather(receiver, return_exceptions=True)
+            if self._handlers:
+                logger.info("Dispatcher de %s: esperando %d envíos en curso", self.database, len(self._handlers))
+                await asyncio.wait(set(self._handlers), timeout=drain_timeout)
+            heartbeat.cancel()
+            await self._deletes.join()
+            deleter.cancel()
+            await asyncio.gather(heartbeat, deleter, return_exceptions=True)
+            logger.info("Dispatcher de %s detenido: %s", self.database, self.stats.snapshot())
+
+    async def _receive_loop(self, stop: asyncio.Event) -> None:
+        while not stop.is_set():
+            await self._capacity.wait()
+            try:
+                resp = await run_in(
+                    AWS, self.sqs.receive_message,
+                    QueueUrl=self.queue_url,
+                    MaxNumberOfMessages=SQS_BATCH,
+                    WaitTimeSeconds=self.wait_time_seconds,
+                    VisibilityTimeout=self.visibility_timeout,
+                    AttributeNames=["SentTimestamp", "ApproximateReceiveCount"],
+                    MessageAttributeNames=["All"],
+                )
+            except Exception:
+                logger.exception("Dispatcher de %s: error al leer la cola", self.database)
+                metrics.increment("dispatcher_receive_errors_total", database=self.database)
+                await asyncio.sleep(1.0)
+                continue
+
+            messages = resp.get("Messages", [])
+            if stop.is_set():
+                await self._release(messages)
+                return
+            for message in messages:
+                entry = _InFlight(message)
+                self._in_flight[entry.message_id] = entry
+                self.stats.received += 1
+                task = asyncio.create_task(self._handle(message, entry))
+                self._handlers.add(task)
+                task.add_done_callback(self._handlers.discard)
+            if len(self._in_flight) >= self.max_in_flight:
+                self._capacity.clear()
+
+    async def _release(self, messages: List[Dict[str, Any]]) -> None:
+        """
+        Devuelve de inmediato a la cola los mensajes recibidos durante el apagado.
+        """
+        if not messages:
+            return
+        try:
+            await run_in(
+                AWS, self.sqs.change_message_visibility_batch, QueueUrl=self.queue_url,
+                Entries=[{"Id": str(n), "ReceiptHandle": m["ReceiptHandle"], "VisibilityTimeout": 0}
+                         for n, m in enumerate(messages)],
+            )
+        except Exception:
+            logger.warning("Dispatcher de %s: no se pudieron liberar %d mensajes", self.database, len(messages),
+                           exc_info=True)
+
+    def _done(self, entry: _InFlight) -> None:
+        self._in_flight.pop(entry.message_id, None)
+        if len(self._in_flight) < self.max_in_flight:
+            self._capacity.set()
+
+    async def _handle(self, message: Dict[str, Any], entry: _InFlight) -> None:
+        try:
+            payload = json.loads(message["Body"])
+            recipients = list(payload.get("to") or []) + list(payload.get("cc") or []) + list(payload.get("bcc") or [])
+            if not recipients:
+                raise ValueError("El mensaje no tiene destinatarios")
+            async with self._send_slots:
+                # SES cuenta cada destinatario contra la tasa de envío.
+                await self.bucket.acquire(len(recipients))
+                await self._send(payload, recipients, message.get("MessageAttributes") or {})
+        except Exception as e:
+            await self._fail(entry, e)
+            return
+        finally:
+            self._done(entry)
+        self.stats.record_sent(time.time() - entry.sent_timestamp)
+        metrics.increment("dispatcher_sent_total", database=self.database)
+        self._deletes.put_nowait(entry)
+
+    async def _send(self, payload: Dict[str, Any], recipients: List[str], attributes: Dict[str, Any]) -> None:
+        html_body = payload.get("html_body") or ""
+        if payload.get("template_id") and not html_body:
+            compiled = await TemplateService.get(self.database, payload["template_id"])
+            if payload.get("template_version") and compiled.version != payload["template_version"]:
+                logger.warning("Plantilla '%s' de %s cambió de versión (%s → %s); se usa la vigente",
+                               compiled.template_id, self.database, payload["template_version"], compiled.version)
+            html_body = compiled.render_html(payload.get("template_vars") or {})
+
+        raw = await run_in(AWS, self._build_mime, payload, html_body)
+        kwargs: Dict[str, Any] = {
+            "Source": payload["from"],
+            "Destinations": recipients,
+            "RawMessage": {"Data": raw},
+        }
+        tags = _ses_tags(attributes)
+        if tags:
+            kwargs["Tags"] = tags
+        await run_in(AWS, self.ses.send_raw_email, **kwargs)
+
+    def _build_mime(self, payload: Dict[str, Any], html_body: str) -> bytes:
+        msg = EmailMessage()
+        msg["From"] = payload["from"]
+        if payload.get("to"):
+            msg["To"] = ", ".join(payload["to"])
+        if payload.get("cc"):
+            msg["Cc"] = ", ".join(payload["cc"])
+        msg["Subject"] = payload.get("subject") or ""
+        msg.set_content(payload.get("body") or "")
+        if html_body:
+            msg.add_alternative(html_body, subtype="html")
+
+        for url in payload.get("attachments") or []:
+            bucket, key = _s3_location(url)
+            data = self.s3.get_object(Bucket=bucket, Key=key)["Body"].read()
+            filename = os.path.basename(key)
+            maintype, _, subtype = (mimetypes.guess_type(filename)[0] or "application/octet-stream").partition("/")
+            msg.add_attachment(data, maintype=maintype, subtype=subtype, filename=filename)
+        return msg.as_bytes()
+
+    async def _fail(self, entry: _InFlight, exc: Exception) -> None:
+        """
+        Devuelve el mensaje a la cola con un backoff exponencial según cuántas veces se recibió.
+        """
+        response = getattr(exc, "response", None)
+        code = response.get("Error", {}).get("Code") if isinstance(response, dict) else None
+        permanent = (code in SES_PERMANENT_ERRORS
+                     or isinstance(exc, (ValueError, KeyError))
+                     or (isinstance(exc, HTTPException) and exc.status_code < 500))
+        delay = settings.DISPATCHER_MAX_BACKOFF_SECONDS if permanent \
+            else min(settings.DISPATCHER_MAX_BACKOFF_SECONDS, 5 * 2 ** (entry.receive_count - 1))
+        self.stats.failed += 1
+        metrics.increment("dispatcher_failed_total", database=self.database, reason=code or type(exc).__name__)
+        log = logger.error if permanent else logger.warning
+        log("Dispatcher de %s: envío de %s falló (recepción %d), reintento en %ds: %s",
+            self.database, entry.message_id, entry.receive_count, delay, exc)
+        try:
+            await run_in(AWS, self.sqs.change_message_visibility, QueueUrl=self.queue_url,
+                                    ReceiptHandle=entry.receipt, VisibilityTimeout=int(delay))
+        except Exception:
+            logger.warning("Dispatcher de %s: no se pudo reprogramar %s", self.database, entry.message_id, exc_info=True)
+
+    async def _delete_loop(self) -> None:
+        """
+        Borra los mensajes enviados en lotes de hasta 10 (o lo acumulado tras DELETE_FLUSH_SECONDS).
+        """
+        while True:
+            batch = [await self._deletes.get()]
+            deadline = time.monotonic() + DELETE_FLUSH_SECONDS
+            while len(batch) < SQS_BATCH:
+                try:
+                    batch.append(await asyncio.wait_for(self._deletes.get(), deadline - time.monotonic()))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                resp = await run_in(
+                    AWS, self.sqs.delete_message_batch, QueueUrl=self.queue_url,
+                    Entries=[{"Id": str(i), "ReceiptHandle": e.receipt} for i, e in enumerate(batch)],
+                )
+                self.stats.deleted += len(resp.get("Successful", []))
+                for failed in resp.get("Failed", []):
+                    logger.warning("Dispatcher de %s: no se pudo borrar %s: %s", self.database,
+                                   batch[int(failed["Id"])].message_id, failed.get("Message"))
+            except Exception:
+                # El mensaje ya se envió: si reaparece en la cola se reenviará (entrega al menos una vez).
+                logger.exception("Dispatcher de %s: error al borrar un lote de %d mensajes", self.database, len(batch))
+            finally:
+                for _ in batch:
+                    self._deletes.task_done()
+
+    async def _visibility_loop(self) -> None:
+        """
+        Extiende la visibilidad de los mensajes que siguen en proceso pasado un tercio del timeout,
+        para que SQS no los entregue a otro consumidor mientras se envían.
+        """
+        interval = self.visibility_timeout / 3
+        while True:
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            stale = [e for e in list(self._in_flight.values()) if now - e.received_at >= interval]
+            for i in range(0, len(stale), SQS_BATCH):
+                chunk = stale[i:i + SQS_BATCH]
+                try:
+                    await run_in(
+                        AWS, self.sqs.change_message_visibility_batch, QueueUrl=self.queue_url,
+                        Entries=[{"Id": str(n), "ReceiptHandle": e.receipt, "VisibilityTimeout": self.visibility_timeout}
+                                 for n, e in enumerate(chunk)],
+                    )
+                except Exception:
+                    logger.warning("Dispatcher de %s: no se pudo extender la visibilidad", self.database, exc_info=True)
+                    continue
+                for e in chunk:
+                    e.received_at = now
+                self.stats.visibility_extended += len(chunk)
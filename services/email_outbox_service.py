@@ -0,0 +1,357 @@
+import asyncio
+import logging
+import os
+import random
+import sqlite3
+import time
+from typing import Any, Dict, List, Optional
+
+from fastapi import HTTPException
+
+from app.core.config import settings
+from app.core.http_erros import HttpErrors
+from app.core.metrics import metrics
+from app.helpers.aws_helper import AwsHelper, SQS_BATCH_MAX_BYTES, SQS_BATCH_MAX_ENTRIES
+from services.lval_service import LvalConfig
+from utils import fast_json
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_PENDING = "pending"
+OUTBOX_DEAD = "dead"
+
+COMPACT_INTERVAL_SECONDS = 300
+
+
+class EmailOutboxStore:
+    """
+    Log durable (SQLite en modo WAL, synchronous=FULL) de los mensajes aceptados y aún no
+    confirmados por SQS. Cada append queda en disco (fsync del WAL) antes de responder.
+    Varios procesos del host pueden compartirlo: la toma de mensajes usa un lease.
+    Los mensajes confirmados se borran y el archivo se compacta periódicamente.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS email_outbox (
+                    id              INTEGER PRIMARY KEY AUTOINCREMENT,
+                    database        TEXT NOT NULL,
+                    message         TEXT NOT NULL,
+                    status          TEXT NOT NULL,
+                    attempts        INTEGER NOT NULL DEFAULT 0,
+                    next_attempt_at REAL NOT NULL,
+                    lease_until     REAL,
+                    last_error      TEXT,
+                    created_at      REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_email_outbox_due ON email_outbox (status, next_attempt_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA synchronous=FULL")
+        return conn
+
+    def append(self, database: str, messages: List[Dict[str, Any]]) -> List[int]:
+        """
+        Agrega los mensajes en una sola transacción (un solo fsync) y devuelve sus ids.
+        Si alguno falla no queda ninguno: quien llama puede reintentar sin duplicar envíos.
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            ids = [
+                conn.execute(
+                    """
+                    INSERT INTO email_outbox (database, message, status, next_attempt_at, created_at)
+                    VALUES (?, ?, ?, ?, ?)
+                    """,
+                    (database, fast_json.dumps(message), OUTBOX_PENDING, now, now),
+                ).lastrowid
+                for message in messages
+            ]
+            conn.execute("COMMIT")
+            return ids
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def claim(self, limit: int, lease_seconds: int) -> List[Dict[str, Any]]:
+        """
+        Toma hasta `limit` mensajes vencidos (en orden de llegada) y los reserva por `lease_seconds`.
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                """
+                SELECT id, database, message, attempts FROM email_outbox
+                 WHERE status = ? AND next_attempt_at <= ?
+                   AND (lease_until IS NULL OR lease_until < ?)
+                 ORDER BY id
+                 LIMIT ?
+                """,
+                (OUTBOX_PENDING, now, now, limit),
+            ).fetchall()
+            if rows:
+                conn.executemany(
+                    "UPDATE email_outbox SET lease_until = ? WHERE id = ?",
+                    [(now + lease_seconds, r["id"]) for r in rows],
+                )
+            conn.execute("COMMIT")
+            return [dict(r) for r in rows]
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def ack(self, ids: List[int]) -> None:
+        if not ids:
+            return
+        with self._connect() as conn:
+            conn.executemany("DELETE FROM email_outbox WHERE id = ?", [(i,) for i in ids])
+
+    def retry(self, failures: List[Dict[str, Any]], max_attempts: int) -> int:
+        """
+        Reprograma los mensajes fallidos ({id, attempts, error, delay, fatal}). Los fatales o
+        los que agotaron intentos pasan a 'dead'. Devuelve cuántos quedaron como 'dead'.
+        """
+        now = time.time()
+        dead = 0
+        params = []
+        for f in failures:
+            attempts = f["attempts"] + 1
+            is_dead = f["fatal"] or attempts >= max_attempts
+            dead += is_dead
+            params.append((OUTBOX_DEAD if is_dead else OUTBOX_PENDING, attempts,
+                           now + f["delay"], f["error"][:1000], f["id"]))
+        with self._connect() as conn:
+            conn.executemany(
+                """
+                UPDATE email_outbox
+                   SET status = ?, attempts = ?, next_attempt_at = ?, last_error = ?, lease_until = NULL
+                 WHERE id = ?
+                """,
+                params,
+            )
+        return dead
+
+    def counts(self) -> Dict[str, int]:
+        with self._connect() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) AS n FROM email_outbox GROUP BY status").fetchall()
+        counts = {OUTBOX_PENDING: 0, OUTBOX_DEAD: 0}
+        counts.update({r["status"]: r["n"] for r in rows})
+        return counts
+
+    def compact(self) -> None:
+        """
+        Devuelve al sistema el espacio de los mensajes ya confirmados y trunca el WAL.
+        """
+        with self._connect() as conn:
+            conn.execute("PRAGMA incremental_vacuum")
+            conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+def _chunks(rows: List[Dict[str, Any]], max_entries: int) -> List[List[Dict[str, Any]]]:
+    """
+    Agrupa por base de datos (una cola por base) en lotes que respetan los límites
+    de SendMessageBatch: entradas por lote y tamaño total del payload.
+    """
+    by_database: Dict[str, List[Dict[str, Any]]] = {}
+    for row in rows:
+        by_database.setdefault(row["database"], []).append(row)
+
+    chunks: List[List[Dict[str, Any]]] = []
+    for group in by_database.values():
+        current: List[Dict[str, Any]] = []
+        size = 0
+        for row in group:
+            row_size = len(row["message"].encode("utf-8"))
+            if current and (len(current) >= max_entries or size + row_size > SQS_BATCH_MAX_BYTES):
+                chunks.append(current)
+                current, size = [], 0
+            current.append(row)
+            size += row_size
+        if current:
+            chunks.append(current)
+    return chunks
+
+
+def _backoff(attempts: int) -> float:
+    return min(settings.EMAIL_OUTBOX_MAX_BACKOFF_SECONDS, 2 ** attempts) * random.uniform(0.5, 1.0)
+
+
+class EmailOutboxService:
+    """
+    Outbox local de emails: `enqueue` persiste el mensaje y responde sin esperar a SQS;
+    un relay en segundo plano lo reenvía con SendMessageBatch. Entrega al menos una vez:
+    si el proceso cae entre la confirmación de SQS y el borrado local, el mensaje se reenvía.
+    """
+    _store: Optional[EmailOutboxStore] = None
+    _relay: Optional[asyncio.Task] = None
+    _wakeup: Optional[asyncio.Event] = None
+    _stopping: bool = False
+
+    @classmethod
+    def _get_store(cls) -> EmailOutboxStore:
+        if cls._store is None:
+            cls._store = EmailOutboxStore(settings.EMAIL_OUTBOX_PATH)
+        return cls._store
+
+    @classmethod
+    async def start(cls) -> None:
+        """
+        Arranca el relay. Los mensajes pendientes de una ejecución anterior se reenvían
+        porque viven en el log durable.
+        """
+        await asyncio.to_thread(cls._get_store)
+        cls._stopping = False
+        cls._wakeup = asyncio.Event()
+        cls._relay = asyncio.create_task(cls._relay_loop(), name="email-outbox-relay")
+        logger.info("Relay del outbox de emails iniciado (%s)", settings.EMAIL_OUTBOX_PATH)
+
+    @classmethod
+    async def stop(cls, timeout: float = 0.0) -> None:
+        """
+        Intenta reenviar los mensajes vencidos durante hasta `timeout` segundos y detiene
+        el relay. Lo que no alcance a salir queda en disco para el próximo arranque.
+        """
+        relay, cls._relay = cls._relay, None
+        if relay is None:
+            return
+        cls._stopping = True
+        if cls._wakeup is not None:
+            cls._wakeup.set()
+        done = set()
+        if timeout > 0:
+            done, _ = await asyncio.wait([relay], timeout=timeout)
+        if not done:
+            relay.cancel()
+            await asyncio.gather(relay, return_exceptions=True)
+        counts = await asyncio.to_thread(cls._get_store().counts)
+        logger.info("Relay del outbox detenido; mensajes pendientes en disco: %d", counts[OUTBOX_PENDING])
+
+    @classmethod
+    async def enqueue(cls, database: str, message: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Agrega el mensaje (armado con AwsHelper.build_email_message) al outbox y despierta al relay.
+        """
+        outbox_ids = await cls.enqueue_many(database, [message])
+        return {"OutboxId": outbox_ids[0], "Status": OUTBOX_PENDING}
+
+    @classmethod
+    async def enqueue_many(cls, database: str, messages: List[Dict[str, Any]]) -> List[str]:
+        """
+        Agrega varios mensajes al outbox en una sola escritura durable y devuelve sus OutboxIds.
+        La configuración de la cola se valida aquí para que un error de configuración no quede
+        en el outbox.
+        """
+        lval = await LvalConfig.load(settings.DB_AWS_TIPOLVAL, db_name=database)
+        if not lval.get(settings.DB_AWS_QUEUE):
+            raise HttpErrors.internal_server_error(
+                detail=f"Error de configuración AWS/SQS: nombre de cola incompleto para la base de datos '{database}'."
+            )
+
+        store = await asyncio.to_thread(cls._get_store)
+        try:
+            outbox_ids = await asyncio.to_thread(store.append, database, messages)
+        except sqlite3.Error as e:
+            raise HttpErrors.service_unavailable(detail=f"No se pudo registrar el email en el outbox local: {e}",
+                                                 retry_after=1)
+        metrics.increment("email_outbox_appended_total", amount=len(outbox_ids), database=database)
+        if cls._wakeup is not None:
+            cls._wakeup.set()
+        return [str(outbox_id) for outbox_id in outbox_ids]
+
+    @classmethod
+    async def _relay_loop(cls) -> None:
+        store = cls._get_store()
+        last_compact = time.monotonic()
+        while True:
+            try:
+                if await cls._relay_once(store):
+                    continue
+                if cls._stopping:
+                    return
+                if time.monotonic() - last_compact > COMPACT_INTERVAL_SECONDS:
+                    last_compact = time.monotonic()
+                    await asyncio.to_thread(store.compact)
+                cls._wakeup.clear()
+                try:
+                    await asyncio.wait_for(cls._wakeup.wait(), timeout=settings.EMAIL_OUTBOX_POLL_SECONDS)
+                except asyncio.TimeoutError:
+                    continue
+                # Breve espera para que los mensajes que llegan juntos salgan en el mismo lote.
+                if not cls._stopping and settings.EMAIL_OUTBOX_LINGER_MS > 0:
+                    await asyncio.sleep(settings.EMAIL_OUTBOX_LINGER_MS / 1000)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Error inesperado en el relay del outbox de emails")
+                if cls._stopping:
+                    return
+                await asyncio.sleep(settings.EMAIL_OUTBOX_POLL_SECONDS)
+
+    @classmethod
+    async def _relay_once(cls, store: EmailOutboxStore) -> int:
+        """
+        Reenvía un grupo de mensajes vencidos. Devuelve cuántos se tomaron (0 = nada pendiente).
+        """
+        batch_size = max(1, min(settings.EMAIL_OUTBOX_BATCH_SIZE, SQS_BATCH_MAX_ENTRIES))
+        rows = await asyncio.to_thread(store.claim, batch_size * 10, settings.EMAIL_OUTBOX_LEASE_SECONDS)
+        if rows:
+            await asyncio.gather(*(cls._send_chunk(store, chunk) for chunk in _chunks(rows, batch_size)))
+        return len(rows)
+
+    @classmethod
+    async def _send_chunk(cls, store: EmailOutboxStore, rows: List[Dict[str, Any]]) -> None:
+        database = rows[0]["database"]
+        by_id = {str(r["id"]): r for r in rows}
+        entries = [{"Id": entry_id, **fast_json.loads(r["message"])} for entry_id, r in by_id.items()]
+
+        try:
+            resp = await AwsHelper.send_message_batch(database, entries)
+        except Exception as e:
+            error = e.detail if isinstance(e, HTTPException) else str(e)
+            logger.warning("Lote de %d emails de %s no enviado: %s", len(rows), database, error)
+            failures = [{"id": r["id"], "attempts": r["attempts"], "error": str(error),
+                         "delay": _backoff(r["attempts"] + 1), "fatal": False} for r in rows]
+        else:
+            sent = [int(s["Id"]) for s in resp.get("Successful", [])]
+            await asyncio.to_thread(store.ack, sent)
+            metrics.increment("email_outbox_sent_total", amount=len(sent), database=database)
+            failures = []
+            for f in resp.get("Failed", []):
+                row = by_id[f["Id"]]
+                failures.append({"id": row["id"], "attempts": row["attempts"],
+                                 "error": f"{f.get('Code')}: {f.get('Message', '')}",
+                                 "delay": _backoff(row["attempts"] + 1), "fatal": bool(f.get("SenderFault"))})
+
+        if failures:
+            dead = await asyncio.to_thread(store.retry, failures, settings.EMAIL_OUTBOX_MAX_ATTEMPTS)
+            metrics.increment("email_outbox_failed_total", amount=len(failures), database=database)
+            if dead:
+                logger.error("%d emails de %s pasaron a 'dead' en el outbox", dead, database)
+
+    @classmethod
+    def stats(cls) -> Dict[str, Any]:
+        if cls._store is None:
+            return {}
+        return {**cls._store.counts(), "relay_running": cls._relay is not None and not cls._relay.done()}
+
+
+metrics.register("email_outbox", EmailOutboxService.stats)
@@ -0,0 +1,301 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from fastapi import Response
+
+from app.core.config import settings
+from app.core.http_erros import HttpErrors
+
+logger = logging.getLogger(__name__)
+
+STATE_PENDING = "pending"
+STATE_DONE = "done"
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+REPLAYED_HEADER = "Idempotent-Replayed"
+MAX_KEY_LENGTH = 255
+
+
+class MemoryIdempotencyStore:
+    """
+    Almacén en memoria del proceso, acotado por número de entradas (LRU) y con expiración por TTL.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._data: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _evict(self, now: float) -> None:
+        expired = [k for k, v in self._data.items() if v["expires_at"] <= now]
+        for k in expired:
+            del self._data[k]
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def try_begin(self, key: str, fingerprint: str, pending_ttl: float) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """
+        Reserva la clave si no existe (o expiró). Devuelve (adquirida, registro_existente).
+        """
+        now = time.time()
+        with self._lock:
+            record = self._data.get(key)
+            if record is not None and record["expires_at"] > now:
+                self._data.move_to_end(key)
+                return False, dict(record)
+            self._data[key] = {
+                "state": STATE_PENDING,
+                "fingerprint": fingerprint,
+                "response": None,
+                "expires_at": now + pending_ttl,
+            }
+            self._evict(now)
+            return True, None
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            record = self._data.get(key)
+            if record is None or record["expires_at"] <= time.time():
+                return None
+            return dict(record)
+
+    def complete(self, key: str, response: Any, ttl: float) -> None:
+        with self._lock:
+            record = self._data.get(key)
+            if record is None:
+                return
+            record.update(state=STATE_DONE, response=response, expires_at=time.time() + ttl)
+            self._data.move_to_end(key)
+
+    def release(self, key: str) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class SqliteIdempotencyStore:
+    """
+    Almacén en SQLite local, compartido por todos los procesos del host.
+    Acotado por número de entradas y con expiración por TTL.
+    """
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS idempotency_keys (
+                    key          TEXT PRIMARY KEY,
+                    fingerprint  TEXT NOT NULL,
+                    state        TEXT NOT NULL,
+                    response     TEXT,
+                    expires_at   REAL NOT NULL,
+                    created_at   REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_idempotency_created ON idempotency_keys (created_at)")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @staticmethod
+    def _to_record(row: sqlite3.Row) -> Dict[str, Any]:
+        record = dict(row)
+        record["response"] = json.loads(record["response"]) if record["response"] else None
+        return record
+
+    def try_begin(self, key: str, fingerprint: str, pending_ttl: float) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT * FROM idempotency_keys WHERE key = ?", (key,)).fetchone()
+            if row is not None and row["expires_at"] > now:
+                conn.execute("COMMIT")
+                return False, self._to_record(row)
+            conn.execute(
+                """
+                INSERT OR REPLACE INTO idempotency_keys (key, fingerprint, state, response, expires_at, created_at)
+                VALUES (?, ?, ?, NULL, ?, ?)
+                """,
+                (key, fingerprint, STATE_PENDING, now + pending_ttl, now),
+            )
+            conn.execute("DELETE FROM idempotency_keys WHERE expires_at <= ?", (now,))
+            conn.execute(
+                """
+                DELETE FROM idempotency_keys WHERE key IN (
+                    SELECT key FROM idempotency_keys ORDER BY created_at DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,),
+            )
+            conn.execute("COMMIT")
+            return True, None
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM idempotency_keys WHERE key = ? AND expires_at > ?", (key, time.time())
+            ).fetchone()
+        return self._to_record(row) if row is not None else None
+
+    def complete(self, key: str, response: Any, ttl: float) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE idempotency_keys SET state = ?, response = ?, expires_at = ? WHERE key = ?",
+                (STATE_DONE, json.dumps(response, ensure_ascii=False, default=str), time.time() + ttl, key),
+            )
+
+    def release(self, key: str) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM idempotency_keys WHERE key = ? AND state = ?", (key, STATE_PENDING))
+
+
+class IdempotencyService:
+    """
+    Soporte del header Idempotency-Key: la primera ejecución guarda su respuesta y
+    las repeticiones con la misma clave la reciben sin volver a ejecutar el trabajo.
+    Los duplicados concurrentes esperan a la ejecución en curso en lugar de competir con ella.
+    """
+    _store = None
+    _inflight: Dict[str, Tuple[str, asyncio.Future]] = {}
+    _releases: Set[asyncio.Task] = set()
+
+    @staticmethod
+    async def _release(store, full_key: str) -> None:
+        try:
+            await asyncio.to_thread(store.release, full_key)
+        except Exception:
+            logger.exception("No se pudo liberar la clave de idempotencia %s; expirará sola", full_key)
+
+    @classmethod
+    def _get_store(cls):
+        if cls._store is None:
+            if settings.idempotency_backend == "sqlite":
+                cls._store = SqliteIdempotencyStore(settings.IDEMPOTENCY_DB_PATH, settings.IDEMPOTENCY_MAX_ENTRIES)
+            else:
+                cls._store = MemoryIdempotencyStore(settings.IDEMPOTENCY_MAX_ENTRIES)
+        return cls._store
+
+    @staticmethod
+    def _fingerprint_mismatch(key: str):
+        return HttpErrors.unprocessable_entity(
+            detail=f"La clave {IDEMPOTENCY_HEADER} '{key}' ya se usó con un contenido distinto."
+        )
+
+    @staticmethod
+    def fingerprint(*parts: Any) -> str:
+        """
+        Huella del contenido de la solicitud, para detectar una clave reutilizada con otro payload.
+        """
+        digest = hashlib.sha256()
+        for part in parts:
+            if isinstance(part, (bytes, bytearray, memoryview)):
+                digest.update(part)
+            else:
+                digest.update(json.dumps(part, sort_keys=True, default=str).encode("utf-8"))
+            digest.update(b"\x00")
+        return digest.hexdigest()
+
+    @classmethod
+    async def run(
+        cls,
+        key: Optional[str],
+        scope: str,
+        fingerprint: str,
+        response: Response,
+        fn: Callable[[], Awaitable[Any]],
+    ) -> Any:
+        """
+        Ejecuta `fn` una sola vez por (scope, key). Sin clave, simplemente la ejecuta.
+        """
+        if not key:
+            return await fn()
+        if len(key) > MAX_KEY_LENGTH:
+            raise HttpErrors.bad_request(
+                detail=f"El header {IDEMPOTENCY_HEADER} no puede superar {MAX_KEY_LENGTH} caracteres."
+            )
+
+        full_key = f"{scope}:{key}"
+        store = cls._get_store()
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+
+        while True:
+            inflight = cls._inflight.get(full_key)
+            if inflight is not None:
+                inflight_fingerprint, future = inflight
+                if inflight_fingerprint != fingerprint:
+                    raise cls._fingerprint_mismatch(key)
+                # Duplicado concurrente en este proceso: espera el resultado de la primera ejecución.
+                try:
+                    result = await asyncio.shield(future)
+                except asyncio.CancelledError:
+                    if future.cancelled() and not asyncio.current_task().cancelling():
+                        continue
+                    raise
+                response.headers[REPLAYED_HEADER] = "true"
+                return result
+
+            acquired, record = await asyncio.to_thread(
+                store.try_begin, full_key, fingerprint, settings.IDEMPOTENCY_PENDING_TTL_SECONDS
+            )
+            if acquired:
+                break
+
+            if record["fingerprint"] != fingerprint:
+                raise cls._fingerprint_mismatch(key)
+            if record["state"] == STATE_DONE:
+                response.headers[REPLAYED_HEADER] = "true"
+                return record["response"]
+
+            # En curso en otro proceso del host: espera a que termine o a que su reserva expire.
+            if time.monotonic() >= deadline:
+                raise HttpErrors.conflict(
+                    detail=f"Hay una solicitud en curso con la clave {IDEMPOTENCY_HEADER} '{key}'. "
+                           f"Reintente más tarde."
+                )
+            await asyncio.sleep(0.25)
+
+        future = asyncio.get_running_loop().create_future()
+        cls._inflight[full_key] = (fingerprint, future)
+        try:
+            result = await fn()
+        except Exception as e:
+            # Primero se despierta a los duplicados en espera: liberar la clave puede fallar.
+            future.set_exception(e)
+            # Evita el aviso de "exception was never retrieved" si nadie esperaba.
+            future.exception()
+            await cls._release(store, full_key)
+            raise
+        except BaseException:
+            # Cancelada: libera la clave en segundo plano (la tarea ya no puede esperar y el
+            # store puede bloquear) y deja que los duplicados en espera reintenten.
+            release = asyncio.create_task(cls._release(store, full_key), name=f"idempotency-release-{key}")
+            cls._releases.add(release)
+            release.add_done_callback(cls._releases.discard)
+            future.cancel()
+            raise
+        else:
+            future.set_result(result)
+            await asyncio.to_thread(store.complete, full_key, result, settings.IDEMPOTENCY_TTL_SECONDS)
+            return result
+        finally:
+            cls._inflight.pop(full_key, None)
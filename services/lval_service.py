@@ -49,10 +49,13 @@ class LvalConfig:
         # La clave 'key' es el CODLVAL, y el valor recuperado es la DESCRIP desencriptada.
         return cls._cache.get(key, default)'''
 
+import asyncio
 import logging
-from typing import Any, Dict, Optional
+import time
+from typing import Any, Dict, Optional, Tuple
 
 from app.core.config import settings
+from app.core.shared_cache import get_shared_cache
 from app.db.oracle import execute_query
 
 logger = logging.getLogger(__name__)
@@ -61,19 +64,47 @@ class LvalConfig:
     """
     Permite cargar la tabla ACSELD.LVAL como un diccionario {CODLVAL: descrip_desencriptado},
     para usar de forma similar a una configuración.
-    Cachea los resultados en memoria para llamadas subsecuentes.
+    Cachea los resultados en memoria para llamadas subsecuentes y, con varios workers,
+    en el caché compartido del host para que Oracle se consulte una sola vez por host.
     """
     _cache: Dict[str, Dict[str, Any]] = {}
+    # Versión del caché compartido con la que se cargó cada entrada local (multi-worker) y
+    # cuándo se comparó por última vez (time.monotonic()).
+    _versions: Dict[Tuple[str, str], int] = {}
+    _checked_at: Dict[Tuple[str, str], float] = {}
 
     @classmethod
     async def load(cls, tipolval: str, db_name: str) -> Dict[str, Any]: # Añade db_name
         """
         Carga una sola vez el mapeo CODLVAL -> DESCRIP (desencriptado) y lo cachea
-        para un `tipolval` y `db_name` específicos.
+        para un `tipolval` y `db_name` específicos. Con caché compartido, la invalidación
+        hecha por otro worker se detecta a lo sumo LVAL_VERSION_CHECK_SECONDS después.
         """
         cache_key = (db_name, tipolval) # Clave de caché compuesta
 
+        shared = get_shared_cache()
+        if (shared is not None and cache_key in cls._cache
+                and time.monotonic() - cls._checked_at.get(cache_key, 0.0) < settings.LVAL_VERSION_CHECK_SECONDS):
+            return cls._cache[cache_key]
+
+        shared_key = f"{db_name}:{tipolval}"
+        version = 0
+        if shared is not None:
+            # Otro worker pudo invalidar esta configuración: la copia local se descarta.
+            # Las consultas al SQLite compartido (con busy timeout) van fuera del event loop.
+            version = await asyncio.to_thread(shared.get, "lval_version", shared_key) or 0
+            cls._checked_at[cache_key] = time.monotonic()
+            if cls._versions.get(cache_key, 0) != version:
+                cls._cache.pop(cache_key, None)
+
         if cache_key not in cls._cache: # Comprueba si ya está en caché
+            if shared is not None:
+                cached = await asyncio.to_thread(shared.get, "lval", shared_key)
+                if cached is not None:
+                    cls._cache[cache_key] = cached
+                    cls._versions[cache_key] = version
+                    return cached
+
             sql = '''
                 SELECT CODLVAL, Encrypt_pkg.DECRYPT(DESCRIP) AS DESCRIP_DECRYPTED
                   FROM ACSELD.LVAL
@@ -84,9 +115,30 @@ class LvalConfig:
             rows = await execute_query(sql, params, db_name=db_name)
 
             cls._cache[cache_key] = {r['CODLVAL']: r['DESCRIP_DECRYPTED'] for r in rows}
+            cls._versions[cache_key] = version
+            if shared is not None:
+                await asyncio.to_thread(shared.set, "lval", shared_key, cls._cache[cache_key],
+                                        settings.LVAL_SHARED_TTL_SECONDS)
             logger.debug('Cached LvalConfig for %s: %s', cache_key, cls._cache[cache_key])
         return cls._cache[cache_key]
 
+    @classmethod
+    def invalidate(cls, tipolval: str, db_name: str) -> None:
+        """
+        Descarta la configuración cacheada de (db_name, tipolval) en este proceso y en el
+        caché compartido; los demás workers la recargan en su próximo load().
+        """
+        cache_key = (db_name, tipolval)
+        cls._cache.pop(cache_key, None)
+        cls._versions.pop(cache_key, None)
+        cls._checked_at.pop(cache_key, None)
+        shared = get_shared_cache()
+        if shared is not None:
+            shared_key = f"{db_name}:{tipolval}"
+            shared.delete("lval", shared_key)
+            shared.set("lval_version", shared_key, time.time_ns(), 30 * 24 * 3600)
+        logger.info("Caché LVAL invalidado para %s", cache_key)
+
     @classmethod
     async def get(cls, key: str, tipolval: str, db_name: str, default: Any = None) -> Any: # Añade tipolval y db_name
         """
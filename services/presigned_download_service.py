@@ -0,0 +1,124 @@
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from app.core.config import settings
+from app.core.executors import AWS, run_in
+from app.core.http_erros import HttpErrors
+from app.core.metrics import metrics
+from app.helpers.aws_helper import AwsHelper
+from services.upload_service import UploadService
+
+logger = logging.getLogger(__name__)
+
+# (base de datos, bucket, clave, vigencia pedida, ventana de expiración)
+_CacheKey = Tuple[str, str, str, int, int]
+
+
+class PresignedDownloadService:
+    """
+    URLs prefirmadas de descarga (GET) para los adjuntos s3://bucket/clave que devuelve MailBridge.
+    Una campaña referencia el mismo adjunto miles de veces, así que las URLs se cachean por
+    ventana de expiración (PRESIGNED_GET_EXPIRY_BUCKET_SECONDS): dentro de una ventana todas las
+    solicitudes reciben la misma URL, que vence al cierre de la ventana más `expires_in`.
+    Así quien la recibe siempre tiene al menos `expires_in` segundos, y la entrada deja de usarse
+    antes de acercarse a su vencimiento. Un lote resuelve LVAL y el cliente S3 una sola vez y
+    firma todos los faltantes en una única llamada al executor.
+    """
+    _cache: "OrderedDict[_CacheKey, str]" = OrderedDict()
+    hits = 0
+    signed = 0
+
+    @staticmethod
+    def _parse(uri: str) -> Optional[Tuple[str, str]]:
+        if not uri.startswith("s3://") or "/" not in uri[5:]:
+            return None
+        bucket, key = uri[5:].split("/", 1)
+        return bucket, key
+
+    @classmethod
+    async def presign(cls, database: str, uris: Sequence[str],
+                      expires_in: Optional[int] = None) -> List[Dict[str, object]]:
+        """
+        Devuelve [{uri, url, expires_at}] en el mismo orden que `uris`. Solo se firman objetos
+        del bucket y prefijo LVAL de la base de datos.
+        """
+        expires_in = expires_in or settings.PRESIGNED_GET_EXPIRES_SECONDS
+        if not 0 < expires_in <= settings.PRESIGNED_GET_MAX_EXPIRES_SECONDS:
+            raise HttpErrors.bad_request(
+                detail=f"expires_in debe estar entre 1 y {settings.PRESIGNED_GET_MAX_EXPIRES_SECONDS} segundos."
+            )
+        if len(uris) > settings.PRESIGNED_GET_MAX_BATCH:
+            raise HttpErrors.bad_request(
+                detail=f"Se admiten hasta {settings.PRESIGNED_GET_MAX_BATCH} URIs por solicitud."
+            )
+
+        bucket, prefix = await UploadService.resolve_destination(database)
+        keys: Dict[str, str] = {}
+        invalid: List[str] = []
+        for uri in uris:
+            location = cls._parse(uri)
+            if location and location[0] == bucket and UploadService.is_document_key(prefix, location[1]):
+                keys[uri] = location[1]
+            else:
+                invalid.append(uri)
+        if invalid:
+            raise HttpErrors.bad_request(
+                detail=f"URIs fuera del bucket/prefijo de '{database}' o inválidas: {', '.join(invalid[:10])}"
+            )
+
+        window_seconds = settings.PRESIGNED_GET_EXPIRY_BUCKET_SECONDS
+        window = int(time.time() // window_seconds)
+        expires_at = (window + 1) * window_seconds + expires_in
+
+        urls: Dict[str, str] = {}
+        missing: List[str] = []
+        for uri, key in keys.items():
+            cache_key = (database, bucket, key, expires_in, window)
+            url = cls._cache.get(cache_key)
+            if url is None:
+                missing.append(uri)
+            else:
+                cls._cache.move_to_end(cache_key)
+                urls[uri] = url
+        cls.hits += len(urls)
+
+        if missing:
+            s3 = await AwsHelper.get_client("s3", database)
+
+            def _sign_all() -> List[str]:
+                now = time.time()
+                return [
+                    s3.generate_presigned_url(
+                        "get_object",
+                        Params={"Bucket": bucket, "Key": keys[uri]},
+                        ExpiresIn=max(1, int(expires_at - now)),
+                    )
+                    for uri in missing
+                ]
+
+            signed = await run_in(AWS, _sign_all)
+            cls.signed += len(signed)
+            for uri, url in zip(missing, signed):
+                urls[uri] = url
+                cls._cache[(database, bucket, keys[uri], expires_in, window)] = url
+            while len(cls._cache) > settings.PRESIGNED_GET_CACHE_SIZE:
+                cls._cache.popitem(last=False)
+
+        return [{"uri": uri, "url": urls[uri], "expires_at": expires_at} for uri in uris]
+
+    @classmethod
+    def invalidate(cls, database: str) -> None:
+        """
+        Descarta las URLs firmadas con las credenciales anteriores de la base de datos.
+        """
+        for key in [k for k in cls._cache if k[0] == database]:
+            cls._cache.pop(key, None)
+
+    @classmethod
+    def stats(cls) -> Dict[str, int]:
+        return {"cached": len(cls._cache), "hits": cls.hits, "signed": cls.signed}
+
+
+metrics.register("presigned_get_urls", PresignedDownloadService.stats)
@@ -0,0 +1,183 @@
+import logging
+import os
+import tempfile
+import uuid
+from typing import Any, BinaryIO, Dict, List, Optional
+
+from botocore.exceptions import ClientError
+
+from app.core.admission import admission_control, cost_from_bytes
+from app.core.config import settings
+from app.core.executors import AWS, run_in
+from app.core.http_erros import HttpErrors
+from app.core.resilience import call_with_resilience, is_retryable_aws_error
+from app.helpers.aws_helper import AwsHelper, ALLOWED_FILE_EXTENSIONS
+from services.upload_service import UploadService
+
+logger = logging.getLogger(__name__)
+
+# El Content-Type se deriva de la extensión (no lo elige el cliente) y queda firmado en la URL.
+CONTENT_TYPES = {
+    ".pdf": "application/pdf",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".doc": "application/msword",
+    ".docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    ".xls": "application/vnd.ms-excel",
+    ".xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    ".csv": "text/csv",
+}
+
+
+class PresignedUploadService:
+    """
+    Cargas directas a S3 con URLs prefirmadas: el cliente sube el archivo a una clave
+    de staging bajo el prefijo LVAL del tenant, sin pasar por la API. Al completar,
+    el servidor lee el objeto desde S3, lo comprime si es PDF y lo deja en la clave final
+    ({prefijo}{filename}, igual que /upload).
+    """
+
+    @staticmethod
+    def _content_type(filename: str) -> str:
+        ext = os.path.splitext(filename)[1].lower()
+        if ext not in ALLOWED_FILE_EXTENSIONS:
+            raise HttpErrors.bad_request(
+                detail=f"Tipo de archivo no permitido para '{filename}'. "
+                       f"Extensiones válidas: {', '.join(ALLOWED_FILE_EXTENSIONS)}"
+            )
+        return CONTENT_TYPES[ext]
+
+    @staticmethod
+    def _staging_key(prefix: str, upload_id: str, filename: str) -> str:
+        return f"{prefix}{settings.PRESIGNED_UPLOAD_STAGING_PREFIX}{upload_id}/{filename}"
+
+    @staticmethod
+    async def presign(database: str, filename: str, size: int, method: str) -> Dict[str, Any]:
+        """
+        Emite una URL prefirmada (POST o PUT) acotada al bucket/prefijo del tenant,
+        con tamaño y Content-Type forzados por la firma.
+        """
+        if "/" in filename or "\\" in filename:
+            raise HttpErrors.bad_request(detail="El nombre de archivo no puede contener rutas.")
+        content_type = PresignedUploadService._content_type(filename)
+        if not 0 < size <= settings.PRESIGNED_UPLOAD_MAX_BYTES:
+            raise HttpErrors.bad_request(
+                detail=f"El tamaño debe estar entre 1 y {settings.PRESIGNED_UPLOAD_MAX_BYTES} bytes."
+            )
+
+        bucket, prefix = await UploadService.resolve_destination(database)
+        s3 = await AwsHelper.get_client("s3", database)
+        upload_id = uuid.uuid4().hex
+        key = PresignedUploadService._staging_key(prefix, upload_id, filename)
+        expires_in = settings.PRESIGNED_UPLOAD_EXPIRES_SECONDS
+
+        if method == "POST":
+            presigned = await run_in(
+                AWS, s3.generate_presigned_post,
+                Bucket=bucket,
+                Key=key,
+                Fields={"Content-Type": content_type},
+                Conditions=[
+                    {"Content-Type": content_type},
+                    ["content-length-range", 1, size],
+                ],
+                ExpiresIn=expires_in,
+            )
+            url, fields, headers = presigned["url"], presigned["fields"], {}
+        else:
+            url = await run_in(
+                AWS, s3.generate_presigned_url,
+                "put_object",
+                Params={"Bucket": bucket, "Key": key, "ContentType": content_type, "ContentLength": size},
+                ExpiresIn=expires_in,
+            )
+            fields, headers = {}, {"Content-Type": content_type, "Content-Length": str(size)}
+
+        return {
+            "upload_id": upload_id,
+            "method": method,
+            "url": url,
+            "fields": fields,
+            "headers": headers,
+            "key": key,
+            "expires_in": expires_in,
+        }
+
+    @staticmethod
+    async def complete(database: str, upload_id: str, filename: str, id_proceso: int,
+                       compression_engine: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Valida el objeto subido a staging, lo comprime si es PDF y lo mueve a la clave final.
+        Devuelve la misma metadata que /upload.
+        """
+        content_type = PresignedUploadService._content_type(filename)
+        try:
+            uuid.UUID(hex=upload_id)
+        except ValueError:
+            raise HttpErrors.bad_request(detail="upload_id inválido.")
+
+        bucket, prefix = await UploadService.resolve_destination(database)
+        s3 = await AwsHelper.get_client("s3", database)
+        staging_key = PresignedUploadService._staging_key(prefix, upload_id, filename)
+        final_key = f"{prefix}{filename}"
+
+        async def _s3(fn, **kwargs):
+            return await call_with_resilience("s3", database, lambda: run_in(AWS, fn, **kwargs),
+                                              is_retryable_aws_error)
+
+        try:
+            head = await _s3(s3.head_object, Bucket=bucket, Key=staging_key)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                raise HttpErrors.not_found(detail=f"No se encontró la carga '{upload_id}' para '{filename}'.")
+            raise
+
+        size = head["ContentLength"]
+        if size > settings.PRESIGNED_UPLOAD_MAX_BYTES:
+            await _s3(s3.delete_object, Bucket=bucket, Key=staging_key)
+            raise HttpErrors.bad_request(detail="El archivo subido supera el tamaño máximo permitido.")
+
+        compressed: Optional[BinaryIO] = None
+        timed_out = False
+        if content_type == "application/pdf":
+            # Se descarga a un archivo temporal que queda en memoria solo si es chico.
+            with tempfile.SpooledTemporaryFile(max_size=settings.UPLOAD_SPOOL_THRESHOLD_BYTES) as original:
+                def _download() -> None:
+                    original.seek(0)
+                    original.truncate()
+                    s3.download_fileobj(bucket, staging_key, original)
+
+                await call_with_resilience("s3", database, lambda: run_in(AWS, _download),
+                                           is_retryable_aws_error)
+                async with admission_control.gate("compression").slot(database, cost_from_bytes(size)):
+                    compressed, size, timed_out = await AwsHelper.compress_pdf_with_deadline(
+                        database, original, size, compression_engine
+                    )
+
+        if compressed is not None:
+            def _put() -> None:
+                compressed.seek(0)
+                s3.upload_fileobj(compressed, bucket, final_key, ExtraArgs={"ContentType": content_type})
+
+            try:
+                async with admission_control.gate("s3_upload").slot(database, cost_from_bytes(size)):
+                    await call_with_resilience("s3", database, lambda: run_in(AWS, _put),
+                                               is_retryable_aws_error)
+            finally:
+                compressed.close()
+        else:
+            # Sin compresión (o sin ganancia): copia del lado del servidor, los bytes no pasan por la API.
+            await _s3(s3.copy_object, Bucket=bucket, Key=final_key,
+                      CopySource={"Bucket": bucket, "Key": staging_key})
+        await _s3(s3.delete_object, Bucket=bucket, Key=staging_key)
+        logger.info("Carga prefirmada %s completada en %s", upload_id, final_key)
+
+        metadata = [{
+            "filename": filename,
+            "key": final_key,
+            "url": f"s3://{bucket}/{final_key}",
+            "size": size,
+            "compression_timed_out": timed_out,
+        }]
+        return UploadService.format_metadata(metadata, [{"id_proceso": id_proceso}])
@@ -0,0 +1,182 @@
+import html
+import json
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+from botocore.exceptions import ClientError
+
+from app.core.config import settings
+from app.core.executors import AWS, run_in
+from app.core.http_erros import HttpErrors
+from app.core.resilience import call_with_resilience, is_retryable_aws_error
+from app.helpers.aws_helper import AwsHelper
+from services.lval_service import LvalConfig
+from utils.fix_html_body import fix_html_body
+
+logger = logging.getLogger(__name__)
+
+PLACEHOLDER_RE = re.compile(r"\{\{\s*([A-Za-z_][A-Za-z0-9_]*)\s*\}\}")
+TEMPLATE_ID_RE = re.compile(r"^[A-Za-z0-9_.-]{1,100}$")
+
+
+def _split(source: str) -> Tuple[List[str], List[str]]:
+    """
+    Separa la plantilla en literales y nombres de variable: len(literals) == len(names) + 1.
+    """
+    literals: List[str] = []
+    names: List[str] = []
+    pos = 0
+    for match in PLACEHOLDER_RE.finditer(source):
+        literals.append(source[pos:match.start()])
+        names.append(match.group(1))
+        pos = match.end()
+    literals.append(source[pos:])
+    return literals, names
+
+
+def _join(literals: List[str], names: List[str], values: Mapping[str, Any], escape: bool) -> str:
+    out = [literals[0]]
+    for name, literal in zip(names, literals[1:]):
+        value = str(values[name])
+        out.append(html.escape(value) if escape else value)
+        out.append(literal)
+    return "".join(out)
+
+
+class CompiledTemplate:
+    """
+    Plantilla precompilada: el escape de comillas (fix_html_body) se aplica una sola vez
+    a los literales al compilar, y el render es una única concatenación de literales y
+    valores (escapados como HTML).
+    """
+    __slots__ = ("template_id", "version", "subject", "html_body",
+                 "_html_literals", "_html_names", "_subject_literals", "_subject_names")
+
+    def __init__(self, template_id: str, html_body: str, subject: Optional[str] = None, version: str = ""):
+        self.template_id = template_id
+        self.version = version
+        self.subject = subject
+        self.html_body = html_body
+        self._html_literals, self._html_names = _split(fix_html_body(html_body))
+        self._subject_literals, self._subject_names = _split(subject or "")
+
+    @property
+    def variables(self) -> List[str]:
+        return sorted(set(self._html_names) | set(self._subject_names))
+
+    def missing(self, values: Mapping[str, Any]) -> List[str]:
+        return [name for name in self.variables if name not in values]
+
+    def render_html(self, values: Mapping[str, Any]) -> str:
+        return _join(self._html_literals, self._html_names, values, escape=True)
+
+    def render_subject(self, values: Mapping[str, Any]) -> Optional[str]:
+        if self.subject is None:
+            return None
+        return _join(self._subject_literals, self._subject_names, values, escape=False)
+
+
+class TemplateService:
+    """
+    Registro de plantillas de email por base de datos.
+    Las plantillas se guardan en el bucket S3 del tenant (así las comparten todas las
+    réplicas) y las compiladas se mantienen en un caché LRU en memoria; pasado el TTL
+    se revalidan contra S3 por ETag.
+    """
+    _cache: "OrderedDict[Tuple[str, str], Tuple[CompiledTemplate, float]]" = OrderedDict()
+
+    @staticmethod
+    def _key(template_id: str) -> str:
+        return f"{settings.TEMPLATES_S3_PREFIX}{template_id}.json"
+
+    @staticmethod
+    async def _bucket(database: str) -> str:
+        lval = await LvalConfig.load(settings.DB_AWS_TIPOLVAL, db_name=database)
+        bucket = lval.get(settings.DB_AWS_BUCKET)
+        if not bucket:
+            raise ValueError("Configuración de Bucket S3 no encontrada en LVAL.")
+        return bucket
+
+    @classmethod
+    def _remember(cls, database: str, compiled: CompiledTemplate) -> None:
+        key = (database, compiled.template_id)
+        cls._cache[key] = (compiled, time.monotonic())
+        cls._cache.move_to_end(key)
+        while len(cls._cache) > settings.TEMPLATE_CACHE_SIZE:
+            cls._cache.popitem(last=False)
+
+    @classmethod
+    async def register(cls, database: str, template_id: str, html_body: str,
+                       subject: Optional[str] = None) -> CompiledTemplate:
+        """
+        Registra (o reemplaza) una plantilla para la base de datos.
+        """
+        if not TEMPLATE_ID_RE.match(template_id):
+            raise HttpErrors.unprocessable_entity(
+                detail="El template_id solo admite letras, números, '.', '_' y '-' (máx. 100 caracteres)."
+            )
+        compiled = CompiledTemplate(template_id, html_body, subject)
+
+        bucket = await cls._bucket(database)
+        s3 = await AwsHelper.get_client("s3", database)
+        body = json.dumps(
+            {"template_id": template_id, "subject": subject, "html_body": html_body},
+            ensure_ascii=False,
+        ).encode("utf-8")
+        resp = await call_with_resilience(
+            "s3", database,
+            lambda: run_in(AWS, s3.put_object, Bucket=bucket, Key=cls._key(template_id),
+                                      Body=body, ContentType="application/json"),
+            is_retryable_aws_error,
+        )
+        compiled.version = resp.get("ETag", "").strip('"')
+        cls._remember(database, compiled)
+        logger.info("Plantilla '%s' registrada para %s (versión %s)", template_id, database, compiled.version)
+        return compiled
+
+    @classmethod
+    async def get(cls, database: str, template_id: str) -> CompiledTemplate:
+        """
+        Devuelve la plantilla compilada, desde el caché LRU si está vigente.
+        """
+        cache_key = (database, template_id)
+        cached = cls._cache.get(cache_key)
+        if cached is not None and time.monotonic() - cached[1] < settings.TEMPLATE_CACHE_TTL_SECONDS:
+            cls._cache.move_to_end(cache_key)
+            return cached[0]
+
+        bucket = await cls._bucket(database)
+        s3 = await AwsHelper.get_client("s3", database)
+        params: Dict[str, Any] = {"Bucket": bucket, "Key": cls._key(template_id)}
+        if cached is not None:
+            params["IfNoneMatch"] = f'"{cached[0].version}"'
+
+        def _fetch() -> Optional[Dict[str, Any]]:
+            try:
+                obj = s3.get_object(**params)
+            except ClientError as e:
+                code = e.response.get("Error", {}).get("Code")
+                if code in ("304", "NotModified"):
+                    return None
+                raise
+            return {"etag": obj["ETag"].strip('"'), "data": json.loads(obj["Body"].read())}
+
+        try:
+            fetched = await call_with_resilience("s3", database, lambda: run_in(AWS, _fetch),
+                                                 is_retryable_aws_error)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+                cls._cache.pop(cache_key, None)
+                raise HttpErrors.not_found(detail=f"Plantilla '{template_id}' no registrada para '{database}'.")
+            raise
+
+        if fetched is None:
+            compiled = cached[0]
+        else:
+            data = fetched["data"]
+            compiled = CompiledTemplate(template_id, data["html_body"], data.get("subject"), fetched["etag"])
+        cls._remember(database, compiled)
+        return compiled
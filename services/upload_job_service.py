@@ -0,0 +1,331 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from typing import Any, Dict, List, Optional
+
+from fastapi import HTTPException
+
+from app.core.admission import admission_control
+from app.core.config import settings
+from services.upload_service import UploadService
+
+logger = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_PROCESSING = "processing"
+JOB_COMPLETED = "completed"
+JOB_FAILED = "failed"
+
+
+class UploadJobStore:
+    """
+    Almacén durable (SQLite) del estado de los jobs de carga asíncrona.
+    El archivo es local al host, por lo que varios procesos pueden compartirlo;
+    la toma de jobs usa un lease para que un job huérfano (worker caído) se reintente.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS upload_jobs (
+                    job_id       TEXT PRIMARY KEY,
+                    database     TEXT NOT NULL,
+                    filename     TEXT NOT NULL,
+                    id_proceso   INTEGER NOT NULL,
+                    spool_path   TEXT NOT NULL,
+                    compression_engine TEXT,
+                    status       TEXT NOT NULL,
+                    progress     INTEGER NOT NULL DEFAULT 0,
+                    attempts     INTEGER NOT NULL DEFAULT 0,
+                    lease_until  REAL,
+                    result       TEXT,
+                    error        TEXT,
+                    created_at   REAL NOT NULL,
+                    updated_at   REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_upload_jobs_status ON upload_jobs (status, created_at)")
+            # Archivos creados antes de que cada job pudiera elegir el motor de compresión.
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(upload_jobs)")}
+            if "compression_engine" not in columns:
+                conn.execute("ALTER TABLE upload_jobs ADD COLUMN compression_engine TEXT")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def create(self, job_id: str, database: str, filename: str, id_proceso: int, spool_path: str,
+               compression_engine: Optional[str] = None) -> None:
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                """
+                INSERT INTO upload_jobs (job_id, database, filename, id_proceso, spool_path,
+                                         compression_engine, status, created_at, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                """,
+                (job_id, database, filename, id_proceso, spool_path, compression_engine, JOB_QUEUED, now, now),
+            )
+
+    def claim_next(self, lease_seconds: int) -> Optional[Dict[str, Any]]:
+        """
+        Toma el job pendiente más antiguo (o uno en proceso cuyo lease expiró)
+        y lo marca como 'processing'. Devuelve None si no hay trabajo.
+        """
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                """
+                SELECT * FROM upload_jobs
+                 WHERE status = ?
+                    OR (status = ? AND lease_until < ?)
+                 ORDER BY created_at
+                 LIMIT 1
+                """,
+                (JOB_QUEUED, JOB_PROCESSING, now),
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                """
+                UPDATE upload_jobs
+                   SET status = ?, progress = 10, attempts = attempts + 1,
+                       lease_until = ?, updated_at = ?
+                 WHERE job_id = ?
+                """,
+                (JOB_PROCESSING, now + lease_seconds, now, row["job_id"]),
+            )
+            conn.execute("COMMIT")
+            job = dict(row)
+            job["attempts"] += 1
+            return job
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def update_progress(self, job_id: str, progress: int, lease_seconds: int) -> None:
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE upload_jobs SET progress = ?, lease_until = ?, updated_at = ? WHERE job_id = ?",
+                (progress, now + lease_seconds, now, job_id),
+            )
+
+    def complete(self, job_id: str, result: List[Dict[str, Any]]) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                """
+                UPDATE upload_jobs
+                   SET status = ?, progress = 100, result = ?, error = NULL,
+                       lease_until = NULL, updated_at = ?
+                 WHERE job_id = ?
+                """,
+                (JOB_COMPLETED, json.dumps(result, ensure_ascii=False), time.time(), job_id),
+            )
+
+    def fail(self, job_id: str, error: str, retry: bool) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                """
+                UPDATE upload_jobs
+                   SET status = ?, error = ?, lease_until = NULL, updated_at = ?
+                 WHERE job_id = ?
+                """,
+                (JOB_QUEUED if retry else JOB_FAILED, error, time.time(), job_id),
+            )
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM upload_jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def purge_finished(self, older_than: float) -> List[str]:
+        """
+        Elimina jobs terminados antes de `older_than` y devuelve sus rutas de spool.
+        """
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT spool_path FROM upload_jobs WHERE status IN (?, ?) AND updated_at < ?",
+                (JOB_COMPLETED, JOB_FAILED, older_than),
+            ).fetchall()
+            conn.execute(
+                "DELETE FROM upload_jobs WHERE status IN (?, ?) AND updated_at < ?",
+                (JOB_COMPLETED, JOB_FAILED, older_than),
+            )
+        return [r["spool_path"] for r in rows]
+
+
+class UploadJobService:
+    """
+    Jobs de carga asíncrona: el endpoint guarda el blob en un spool local y
+    registra el job; un pool de workers en segundo plano lo comprime y lo sube a S3.
+    """
+    _store: Optional[UploadJobStore] = None
+    _spool_dir: Optional[str] = None
+    _workers: List[asyncio.Task] = []
+    _wakeup: Optional[asyncio.Event] = None
+    _stopping: bool = False
+
+    @classmethod
+    def _get_store(cls) -> UploadJobStore:
+        if cls._store is None:
+            os.makedirs(settings.UPLOAD_JOBS_DIR, exist_ok=True)
+            cls._spool_dir = os.path.join(settings.UPLOAD_JOBS_DIR, "spool")
+            os.makedirs(cls._spool_dir, exist_ok=True)
+            cls._store = UploadJobStore(os.path.join(settings.UPLOAD_JOBS_DIR, "jobs.sqlite3"))
+        return cls._store
+
+    @classmethod
+    async def start(cls) -> None:
+        """
+        Arranca los workers. Los jobs pendientes de una ejecución anterior
+        se retoman automáticamente porque viven en el almacén durable.
+        """
+        await asyncio.to_thread(cls._get_store)
+        cls._stopping = False
+        cls._wakeup = asyncio.Event()
+        cls._workers = [
+            asyncio.create_task(cls._worker_loop(i), name=f"upload-job-worker-{i}")
+            for i in range(settings.UPLOAD_JOB_WORKERS)
+        ]
+        logger.info("Workers de jobs de carga iniciados: %d", len(cls._workers))
+
+    @classmethod
+    async def stop(cls, timeout: float = 0.0) -> None:
+        """
+        Detiene los workers: dejan de tomar jobs nuevos y se espera hasta `timeout` segundos
+        a que terminen el que están procesando. Los que no alcanzan se cancelan; su lease
+        expira y el job se retoma en el próximo arranque.
+        """
+        cls._stopping = True
+        if cls._wakeup is not None:
+            cls._wakeup.set()
+        workers, cls._workers = cls._workers, []
+        if not workers:
+            return
+        pending = set(workers)
+        if timeout > 0:
+            _, pending = await asyncio.wait(workers, timeout=timeout)
+        if pending:
+            logger.warning("Cancelando %d workers de jobs de carga aún ocupados", len(pending))
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+        logger.info("Workers de jobs de carga detenidos")
+
+    @classmethod
+    async def submit(cls, database: str, filename: str, blob: bytes, id_proceso: int,
+                     compression_engine: Optional[str] = None) -> str:
+        """
+        Persiste el blob en el spool (fsync) y registra el job. Devuelve el job_id.
+        """
+        store = await asyncio.to_thread(cls._get_store)
+        job_id = uuid.uuid4().hex
+        spool_path = os.path.join(cls._spool_dir, f"{job_id}.bin")
+
+        def _spool() -> None:
+            with open(spool_path, "wb") as fh:
+                fh.write(blob)
+                fh.flush()
+                os.fsync(fh.fileno())
+            store.create(job_id, database, filename, id_proceso, spool_path, compression_engine)
+
+        await asyncio.to_thread(_spool)
+        if cls._wakeup is not None:
+            cls._wakeup.set()
+        return job_id
+
+    @classmethod
+    async def get(cls, job_id: str) -> Optional[Dict[str, Any]]:
+        store = await asyncio.to_thread(cls._get_store)
+        return await asyncio.to_thread(store.get, job_id)
+
+    @classmethod
+    async def _worker_loop(cls, worker_id: int) -> None:
+        store = cls._get_store()
+        last_purge = 0.0
+        while not cls._stopping:
+            try:
+                job = await asyncio.to_thread(store.claim_next, settings.UPLOAD_JOB_LEASE_SECONDS)
+                if job is None:
+                    if cls._stopping:
+                        return
+                    if time.time() - last_purge > 3600:
+                        last_purge = time.time()
+                        await cls._purge(store)
+                    cls._wakeup.clear()
+                    if cls._stopping:
+                        return
+                    try:
+                        await asyncio.wait_for(cls._wakeup.wait(), timeout=settings.UPLOAD_JOB_POLL_SECONDS)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                await cls._run_job(store, job)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Error inesperado en el worker de jobs de carga %d", worker_id)
+                await asyncio.sleep(settings.UPLOAD_JOB_POLL_SECONDS)
+
+    @classmethod
+    async def _run_job(cls, store: UploadJobStore, job: Dict[str, Any]) -> None:
+        job_id = job["job_id"]
+        logger.info("Procesando job de carga %s (intento %d)", job_id, job["attempts"])
+        try:
+            blob = await asyncio.to_thread(_read_file, job["spool_path"])
+            await asyncio.to_thread(store.update_progress, job_id, 30, settings.UPLOAD_JOB_LEASE_SECONDS)
+            files = [{"filename": job["filename"], "blob": blob, "id_proceso": job["id_proceso"],
+                      "compression_engine": job["compression_engine"]}]
+            with admission_control.background():
+                metadata = await UploadService.process(files, job["database"])
+        except HTTPException as e:
+            # Errores del cliente no se reintentan; los 5xx sí, hasta agotar intentos.
+            retry = e.status_code >= 500 and job["attempts"] < settings.UPLOAD_JOB_MAX_ATTEMPTS
+            await asyncio.to_thread(store.fail, job_id, str(e.detail), retry)
+            return
+        except Exception as e:
+            retry = job["attempts"] < settings.UPLOAD_JOB_MAX_ATTEMPTS
+            await asyncio.to_thread(store.fail, job_id, f"Error inesperado al procesar la carga: {e}", retry)
+            return
+
+        await asyncio.to_thread(store.complete, job_id, metadata)
+        await asyncio.to_thread(_remove_file, job["spool_path"])
+        logger.info("Job de carga %s completado", job_id)
+
+    @classmethod
+    async def _purge(cls, store: UploadJobStore) -> None:
+        older_than = time.time() - settings.UPLOAD_JOB_RETENTION_HOURS * 3600
+        paths = await asyncio.to_thread(store.purge_finished, older_than)
+        for path in paths:
+            await asyncio.to_thread(_remove_file, path)
+
+
+def _read_file(path: str) -> bytes:
+    with open(path, "rb") as fh:
+        return fh.read()
+
+
+def _remove_file(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,64 @@
+import logging
+from typing import Any, Dict, List, Tuple
+
+from app.core.config import settings
+from app.helpers.aws_helper import AwsHelper
+from services.lval_service import LvalConfig
+
+logger = logging.getLogger(__name__)
+
+
+class UploadService:
+    """
+    Flujo común de carga de archivos: resuelve bucket/prefijo desde LVAL,
+    comprime y sube los blobs a S3 y da formato a la metadata de respuesta.
+    Lo usan tanto los endpoints síncronos como el worker de jobs asíncronos.
+    """
+
+    @staticmethod
+    async def resolve_destination(database: str) -> Tuple[str, str]:
+        """
+        Obtiene (bucket, prefijo) de S3 configurados en LVAL para la base de datos.
+        """
+        lval = await LvalConfig.load(settings.DB_AWS_TIPOLVAL, db_name=database)
+        bucket = lval.get(settings.DB_AWS_BUCKET)
+        prefix = lval.get(settings.DB_AWS_S3_PREFIX)
+
+        if not all([bucket, prefix]):
+            raise ValueError("Configuración de Bucket S3 o prefijo de S3 no encontrada en LVAL.")
+        return bucket, prefix
+
+    @staticmethod
+    def is_document_key(prefix: str, key: str) -> bool:
+        """
+        Indica si la clave es un documento del tenant: bajo su prefijo LVAL, sin segmentos
+        vacíos ni '..', y fuera del staging de cargas prefirmadas sin completar.
+        """
+        relative = key[len(prefix):] if key.startswith(prefix) else ""
+        return (bool(relative)
+                and not relative.startswith(settings.PRESIGNED_UPLOAD_STAGING_PREFIX)
+                and all(part not in ("", ".", "..") for part in relative.split("/")))
+
+    @staticmethod
+    def format_metadata(metadata: List[Dict[str, Any]], files: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Agrega id_documento e id_proceso y expresa el tamaño en KB.
+        """
+        for item, finfo in zip(metadata, files):
+            item["id_documento"] = item.get("key")
+            item["id_proceso"] = finfo["id_proceso"]
+            size_bytes = item.get("size", 0)
+            item["size"] = f"{int(size_bytes / 1024)}kb"
+        return metadata
+
+    @staticmethod
+    async def process(files: List[Dict[str, Any]], database: str) -> List[Dict[str, Any]]:
+        """
+        Sube la lista de archivos al bucket del tenant y devuelve la metadata formateada.
+        """
+        bucket, prefix = await UploadService.resolve_destination(database)
+        metadata = await AwsHelper.upload_blobs_to_s3(files,
+                                                      bucket=bucket,
+                                                      prefix=prefix,
+                                                      database=database)
+        return UploadService.format_metadata(metadata, files)
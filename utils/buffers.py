@@ -0,0 +1,71 @@
+import io
+from typing import BinaryIO, Union
+
+BytesLike = Union[bytes, bytearray, memoryview]
+
+
+class MemoryReader(io.RawIOBase):
+    """
+    Read-only, seekable stream over an existing buffer (bytes, bytearray, memoryview)
+    that never copies the buffer as a whole: each read copies only what the caller asks for.
+    """
+
+    def __init__(self, data: BytesLike):
+        super().__init__()
+        self._view = memoryview(data).cast("B")
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        n = min(len(b), len(self._view) - self._pos)
+        if n <= 0:
+            return 0
+        b[:n] = self._view[self._pos:self._pos + n]
+        self._pos += n
+        return n
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = len(self._view) + offset
+        else:
+            raise ValueError(f"invalid whence ({whence})")
+        if pos < 0:
+            raise ValueError(f"negative seek position {pos}")
+        self._pos = pos
+        return pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def close(self) -> None:
+        if not self.closed:
+            self._view.release()
+        super().close()
+
+
+def open_buffer(data: BytesLike) -> BinaryIO:
+    """
+    Readable stream over `data` without copying it: io.BytesIO shares the storage of an
+    exact `bytes` object (CPython), anything else goes through MemoryReader.
+    """
+    if type(data) is bytes:
+        return io.BytesIO(data)
+    return io.BufferedReader(MemoryReader(data))
+
+
+def stream_size(stream: BinaryIO) -> int:
+    """
+    Total size of a seekable stream; leaves the position at the start.
+    """
+    size = stream.seek(0, io.SEEK_END)
+    stream.seek(0)
+    return size
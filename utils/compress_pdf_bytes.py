@@ -1,50 +1,84 @@
-import io
 import os
+import shutil
 import subprocess
 import tempfile
-from typing import List, Dict, Tuple
-import pikepdf
+from concurrent.futures import Executor
+from functools import partial
+from typing import TYPE_CHECKING, Any, BinaryIO, List, Dict, Optional, Tuple, Union
+
+from utils.buffers import BytesLike, open_buffer, stream_size
+from utils.pdf_images import DEFAULT_JPEG_QUALITY, DEFAULT_TARGET_DPI, downsample_images
+from utils.pdf_parallel import compress_in_parallel
+
+if TYPE_CHECKING:
+    from utils.killable_pool import KillableProcessPool
 
 # thresholds in bytes
 THRESHOLD_SKIP = 100 * 1024  # 100 KB: skip compression
 THRESHOLD_PDF = 1_000 * 1024  # 1 MB: pikepdf only
+SPOOL_THRESHOLD = 4 * 1024 * 1024  # compressed output above this spills to a temp file
 
+# engines for files above THRESHOLD_PDF
+ENGINE_AUTO = "auto"  # ghostscript when `gs` is installed, images otherwise
+ENGINE_GHOSTSCRIPT = "ghostscript"
+ENGINE_IMAGES = "images"  # in-process image downsampling, see utils.pdf_images
+ENGINES = (ENGINE_AUTO, ENGINE_GHOSTSCRIPT, ENGINE_IMAGES)
 
-def compress_pdf_bytes(data: bytes, gs_quality: str = "ebook") -> Tuple[bytes, int]:
-    """
-    Compress PDF binary in-memory.
-    - If <= THRESHOLD_SKIP: return original and its size.
-    - If <= THRESHOLD_PDF: compress streams via pikepdf.
-    - Else: run Ghostscript then pikepdf.
+# A PDF to compress: an in-memory buffer, a readable seekable stream or a path on disk.
+PdfSource = Union[BytesLike, BinaryIO, str]
 
-    Returns tuple of (final_bytes, final_size).
-    """
-    orig_size = len(data)
 
-    # Skip small files
-    if orig_size <= THRESHOLD_SKIP:
-        return data, orig_size
-
-    # Medium files: pikepdf only
-    if orig_size <= THRESHOLD_PDF:
-        buf = io.BytesIO()
-        with pikepdf.Pdf.open(io.BytesIO(data)) as pdf:
-            pdf.save(
-                buf,
-                compress_streams=True,
-                recompress_flate=True,
-                linearize=True,
-                object_stream_mode=pikepdf.ObjectStreamMode.generate
-            )
-        compressed = buf.getvalue()
-    else:
-        # Large files: Ghostscript -> pikepdf
-        with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
-            tmp.write(data)
-            tmp.flush()
-            in_path = tmp.name
-
-        out_path = in_path + ".gs.pdf"
+def _source_size(source: PdfSource) -> int:
+    if isinstance(source, str):
+        return os.path.getsize(source)
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return memoryview(source).nbytes
+    return stream_size(source)
+
+
+def resolve_engine(engine: str) -> str:
+    if engine not in ENGINES:
+        raise ValueError(f"unknown PDF compression engine {engine!r}")
+    if engine == ENGINE_AUTO:
+        return ENGINE_GHOSTSCRIPT if shutil.which("gs") else ENGINE_IMAGES
+    return engine
+
+
+def _pikepdf_save(src, out: BinaryIO, image_options: Optional[Dict[str, int]] = None) -> None:
+    import pikepdf  # lazy: only needed when something is actually compressed
+
+    if not isinstance(src, str):
+        src.seek(0)
+    with pikepdf.Pdf.open(src) as pdf:
+        if image_options is not None:
+            downsample_images(pdf, **image_options)
+        pdf.save(
+            out,
+            compress_streams=True,
+            recompress_flate=True,
+            linearize=True,
+            object_stream_mode=pikepdf.ObjectStreamMode.generate
+        )
+
+
+def _compress_large(src, out: BinaryIO, engine: str, gs_quality: str, image_options: Dict[str, int],
+                    tmp_dir: Optional[str] = None) -> None:
+    """Large files: Ghostscript -> pikepdf, or in-process image downsampling."""
+    if resolve_engine(engine) == ENGINE_IMAGES:
+        _pikepdf_save(src, out, image_options)
+        return
+
+    workdir = tempfile.mkdtemp(prefix="mailbridge-gs-", dir=tmp_dir)
+    try:
+        if isinstance(src, str):
+            in_path = src
+        else:
+            in_path = os.path.join(workdir, "in.pdf")
+            src.seek(0)
+            with open(in_path, "wb") as tmp:
+                shutil.copyfileobj(src, tmp)
+
+        out_path = os.path.join(workdir, "gs.pdf")
         gs_cmd = [
             "gs",
             "-sDEVICE=pdfwrite",
@@ -61,21 +95,137 @@ def compress_pdf_bytes(data: bytes, gs_quality: str = "ebook") -> Tuple[bytes, i
         subprocess.check_call(gs_cmd)
 
         # further optimize with pikepdf
-        buf = io.BytesIO()
-        with pikepdf.Pdf.open(out_path) as pdf:
-            pdf.save(
-                buf,
-                compress_streams=True,
-                recompress_flate=True,
-                linearize=True,
-                object_stream_mode=pikepdf.ObjectStreamMode.generate
-            )
-        compressed = buf.getvalue()
-
+        _pikepdf_save(out_path, out)
+    finally:
         # cleanup temp files
-        os.remove(in_path)
-        os.remove(out_path)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def compress_part(in_path: str, out_path: str, engine: str, gs_quality: str,
+                  image_options: Dict[str, int]) -> None:
+    """Compress one page range (file to file); runs in a worker process of the parallel mode."""
+    with open(out_path, "wb") as out:
+        _compress_large(in_path, out, engine, gs_quality, image_options)
+
+
+def compress_pdf(source: PdfSource, gs_quality: str = "ebook",
+                 spool_threshold: int = SPOOL_THRESHOLD, engine: str = ENGINE_GHOSTSCRIPT,
+                 image_dpi: int = DEFAULT_TARGET_DPI, jpeg_quality: int = DEFAULT_JPEG_QUALITY,
+                 parallel_min_pages: int = 0, parallel_workers: int = 1,
+                 process_pool: Optional[Executor] = None,
+                 tmp_dir: Optional[str] = None) -> Tuple[Optional[BinaryIO], int]:
+    """
+    Compress a PDF without materialising extra copies of it.
+    - If <= THRESHOLD_SKIP: nothing to do.
+    - If <= THRESHOLD_PDF: compress streams via pikepdf.
+    - Else, depending on `engine`: run Ghostscript then pikepdf, or ("images") downsample
+      images above `image_dpi` to JPEG at `jpeg_quality` inside pikepdf, leaving fonts
+      and vector content untouched. With `parallel_workers` > 1, documents of at least
+      `parallel_min_pages` pages are split into page ranges compressed concurrently in
+      `process_pool` and merged back (see utils.pdf_parallel). Temporary files go under
+      `tmp_dir` (the system default when None).
+
+    Buffers are read through a zero-copy stream and the output is written to a
+    SpooledTemporaryFile that moves to disk above `spool_threshold`.
+
+    Returns (stream, size) with the compressed PDF positioned at 0 (the caller closes it),
+    or (None, original_size) when compression would not make the file smaller.
+    """
+    orig_size = _source_size(source)
+
+    # Skip small files
+    if orig_size <= THRESHOLD_SKIP:
+        return None, orig_size
+
+    src = source if isinstance(source, str) else (
+        open_buffer(source) if isinstance(source, (bytes, bytearray, memoryview)) else source
+    )
+    out = tempfile.SpooledTemporaryFile(max_size=spool_threshold, dir=tmp_dir)
+    try:
+        # Medium files: pikepdf only
+        if orig_size <= THRESHOLD_PDF:
+            _pikepdf_save(src, out)
+        else:
+            image_options = {"target_dpi": image_dpi, "jpeg_quality": jpeg_quality}
+            part = partial(compress_part, engine=resolve_engine(engine), gs_quality=gs_quality,
+                           image_options=image_options)
+            if not compress_in_parallel(src, out, part, parallel_min_pages, parallel_workers, process_pool,
+                                        tmp_dir=tmp_dir):
+                _compress_large(src, out, engine, gs_quality, image_options, tmp_dir)
+
+        compressed_size = stream_size(out)
+    except BaseException:
+        out.close()
+        raise
 
     # Decide best
-    final = compressed if len(compressed) < orig_size else data
-    return final, len(final)
\ No newline at end of file
+    if compressed_size < orig_size:
+        return out, compressed_size
+    out.close()
+    return None, orig_size
+
+
+def preload() -> None:
+    """Initializer for worker processes: import pikepdf before the first PDF arrives."""
+    import pikepdf  # noqa: F401
+
+
+def _compress_file(in_path: str, out_path: str, **options: Any) -> Optional[int]:
+    out, size = compress_pdf(in_path, **options)
+    if out is None:
+        return None
+    with out, open(out_path, "wb") as f:
+        shutil.copyfileobj(out, f)
+    return size
+
+
+def compress_pdf_isolated(source: PdfSource, pool: "KillableProcessPool", timeout: float,
+                          **options: Any) -> Tuple[Optional[BinaryIO], int]:
+    """
+    compress_pdf run in a worker process of `pool`, which is killed (with gs or any part
+    processes it started) if it takes longer than `timeout` seconds: TimeoutError is raised
+    and the caller keeps the original bytes. Input and output travel through temporary files;
+    the returned stream is an already-unlinked file. Same result contract as compress_pdf.
+
+    Every temporary file of the worker lives in a directory created and removed here, so a
+    killed worker leaves nothing behind. The worker compresses serially (parallel_workers=1):
+    the pool already runs one PDF per worker, and page-range processes started per call would
+    multiply the process count and pay a spawn on every file.
+    """
+    orig_size = _source_size(source)
+    if orig_size <= THRESHOLD_SKIP:
+        return None, orig_size
+
+    workdir = tempfile.mkdtemp(prefix="mailbridge-isolated-")
+    try:
+        if isinstance(source, str):
+            in_path = source
+        else:
+            in_path = os.path.join(workdir, "in.pdf")
+            src = open_buffer(source) if isinstance(source, (bytes, bytearray, memoryview)) else source
+            src.seek(0)
+            with open(in_path, "wb") as tmp:
+                shutil.copyfileobj(src, tmp)
+        out_path = os.path.join(workdir, "out.pdf")
+        options.update(parallel_workers=1, process_pool=None, tmp_dir=workdir)
+        size = pool.run(_compress_file, in_path, out_path, timeout=timeout, **options)
+        if size is None:
+            return None, orig_size
+        return open(out_path, "rb"), size
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def compress_pdf_bytes(data: BytesLike, gs_quality: str = "ebook",
+                       engine: str = ENGINE_GHOSTSCRIPT) -> Tuple[BytesLike, int]:
+    """
+    Compress PDF binary in-memory (bytes in, bytes out).
+    Kept for callers that need the whole result in memory; the upload path uses compress_pdf.
+
+    Returns tuple of (final_bytes, final_size).
+    """
+    out, size = compress_pdf(data, gs_quality, engine=engine)
+    if out is None:
+        return data, size
+    with out:
+        return out.read(), size
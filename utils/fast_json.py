@@ -0,0 +1,25 @@
+import json
+from typing import Any
+
+import orjson
+
+
+def dumps(obj: Any) -> str:
+    """
+    Serializes to compact JSON with orjson (non-ASCII kept as UTF-8, like
+    json.dumps(..., ensure_ascii=False)).
+
+    Falls back to the standard json module for values orjson rejects,
+    e.g. integers wider than 64 bits coming from free-form template variables.
+    """
+    try:
+        return orjson.dumps(obj).decode("utf-8")
+    except orjson.JSONEncodeError:
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+
+def loads(data: Any) -> Any:
+    """
+    Parses JSON from str or bytes with orjson.
+    """
+    return orjson.loads(data)
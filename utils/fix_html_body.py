@@ -1,18 +1,21 @@
-import re
-
-
 def fix_html_body(html_body: str) -> str:
     """
     Escapa comillas dobles dentro de contenido HTML, preservando las que ya están escapadas.
 
+    Equivale a reemplazar con la expresión regular (?<!\\)" pero usa str.replace, que recorre
+    la cadena en C: todas las comillas se escapan en una pasada y, solo si el texto ya traía
+    comillas escapadas, una segunda pasada deshace el doble escape.
+
     Args:
         html_body (str): Cadena HTML con posibles comillas sin escapar
 
     Returns:
         str: HTML con comillas internas correctamente escapadas
     """
-    # Expresión regular para encontrar comillas dobles que NO estén escapadas
-    pattern = r'(?<!\\)"'
-
-    # Reemplazar cada comilla no escapada con versión escapada
-    return re.sub(pattern, r'\"', html_body)
\ No newline at end of file
+    if '"' not in html_body:
+        return html_body
+    escaped = html_body.replace('"', '\\"')
+    if '\\"' in html_body:
+        # Una comilla ya escapada (\") quedó como \\" : se restaura.
+        escaped = escaped.replace('\\\\"', '\\"')
+    return escaped
@@ -0,0 +1,175 @@
+import atexit
+import multiprocessing
+import multiprocessing.util  # registers its atexit hook (joins live children) before ours: ours runs first
+import os
+import signal
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+
+def _worker_main(conn, initializer: Optional[Callable[[], None]]) -> None:
+    # Own process group: killing the worker also kills whatever it started (gs, pool processes).
+    if hasattr(os, "setsid"):
+        os.setsid()
+    if initializer is not None:
+        initializer()
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):  # parent went away
+            return
+        if message is None:
+            return
+        fn, args, kwargs = message
+        try:
+            result = (True, fn(*args, **kwargs))
+        except BaseException as e:
+            result = (False, e)
+        try:
+            conn.send(result)
+        except Exception:  # unpicklable result or exception
+            conn.send((False, RuntimeError(repr(result[1]))))
+
+
+class _Worker:
+    def __init__(self, ctx, initializer: Optional[Callable[[], None]]):
+        self.conn, child = ctx.Pipe()
+        self.process = ctx.Process(target=_worker_main, args=(child, initializer), name="mb-killable-worker")
+        self.process.start()
+        child.close()
+
+    def kill(self) -> None:
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except (AttributeError, ProcessLookupError, PermissionError):
+            self.process.kill()  # not in its own group yet (or no process groups on this platform)
+        self.process.join(5)
+        self.conn.close()
+
+    def stop(self) -> None:
+        try:
+            self.conn.send(None)
+        except OSError:
+            pass
+        self.process.join(1)
+        if self.process.is_alive():
+            self.kill()
+        else:
+            self.conn.close()
+
+
+class KillableProcessPool:
+    """
+    Fixed-size pool of warm worker processes (spawn) running one call per worker at a time.
+    Unlike ProcessPoolExecutor it enforces a per-call timeout: a worker that exceeds it is
+    killed together with its process group and replaced, and the call raises TimeoutError.
+    run() blocks, so it is meant to be called from a thread. Arguments and results are pickled.
+    The pool belongs to the process that created it: after a fork the child cannot use or close
+    it (the pipes are shared with the parent) and must create its own.
+    """
+
+    def __init__(self, workers: int, initializer: Optional[Callable[[], None]] = None):
+        self.workers = max(1, workers)
+        self._initializer = initializer
+        self._ctx = multiprocessing.get_context("spawn")
+        self._idle: List[_Worker] = []
+        self._live = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._pid = os.getpid()
+        self.calls = 0
+        self.timeouts = 0
+        self.crashes = 0
+        atexit.register(self.close)
+
+    def start(self) -> None:
+        """Start every worker now instead of on first use."""
+        if os.getpid() != self._pid:
+            raise RuntimeError("killable process pool belongs to another process (inherited through fork)")
+        with self._cond:
+            missing = self.workers - self._live
+            self._live += missing
+        started = []
+        try:
+            for _ in range(missing):
+                started.append(_Worker(self._ctx, self._initializer))
+        finally:
+            with self._cond:
+                self._live -= missing - len(started)
+                self._idle.extend(started)
+                self._cond.notify_all()
+
+    def _acquire(self) -> _Worker:
+        if os.getpid() != self._pid:
+            raise RuntimeError("killable process pool belongs to another process (inherited through fork)")
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("killable process pool is closed")
+                if self._idle:
+                    return self._idle.pop()
+                if self._live < self.workers:
+                    self._live += 1
+                    break
+                self._cond.wait()
+        try:
+            return _Worker(self._ctx, self._initializer)
+        except BaseException:
+            with self._cond:
+                self._live -= 1
+                self._cond.notify()
+            raise
+
+    def _release(self, worker: _Worker, healthy: bool) -> None:
+        if not healthy:
+            worker.kill()
+        with self._cond:
+            if healthy and not self._closed:
+                self._idle.append(worker)
+            else:
+                self._live -= 1
+            self._cond.notify()
+        if healthy and self._closed:
+            worker.stop()
+
+    def run(self, fn: Callable[..., Any], *args: Any, timeout: Optional[float] = None, **kwargs: Any) -> Any:
+        worker = self._acquire()
+        healthy = False
+        self.calls += 1
+        try:
+            worker.conn.send((fn, args, kwargs))
+            if not worker.conn.poll(timeout):
+                self.timeouts += 1
+                raise TimeoutError(f"call exceeded {timeout} s; worker killed")
+            ok, value = worker.conn.recv()
+            healthy = True
+        except TimeoutError:
+            raise
+        except (EOFError, OSError) as e:  # TimeoutError is an OSError too, hence the clause above
+            self.crashes += 1
+            raise RuntimeError(f"worker process died (exit code {worker.process.exitcode})") from e
+        finally:
+            self._release(worker, healthy)
+        if ok:
+            return value
+        raise value
+
+    def close(self) -> None:
+        if os.getpid() != self._pid:  # inherited through fork: the workers are the parent's
+            return
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for worker in idle:
+            worker.stop()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "workers": self.workers,
+            "live": self._live,
+            "idle": len(self._idle),
+            "calls": self.calls,
+            "timeouts": self.timeouts,
+            "crashes": self.crashes,
+        }
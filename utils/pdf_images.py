@@ -0,0 +1,152 @@
+import io
+import logging
+import math
+from typing import Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TARGET_DPI = 150  # same as Ghostscript's -dColorImageResolution=150 on the gs path
+DEFAULT_JPEG_QUALITY = 75
+DOWNSAMPLE_THRESHOLD = 1.5  # only downsample above target * threshold, like gs' DownsampleThreshold
+MIN_IMAGE_BYTES = 16 * 1024  # icons and logos are left alone
+MAX_FORM_DEPTH = 8
+
+# PDF transformation matrix [a b c d e f]
+Matrix = Tuple[float, float, float, float, float, float]
+IDENTITY: Matrix = (1.0, 0.0, 0.0, 1.0, 0.0, 0.0)
+
+
+def _multiply(m: Matrix, n: Matrix) -> Matrix:
+    """m × n, the order PDF uses to concatenate `cm` (and form /Matrix) onto the CTM."""
+    return (
+        m[0] * n[0] + m[1] * n[2],
+        m[0] * n[1] + m[1] * n[3],
+        m[2] * n[0] + m[3] * n[2],
+        m[2] * n[1] + m[3] * n[3],
+        m[4] * n[0] + m[5] * n[2] + n[4],
+        m[4] * n[1] + m[5] * n[3] + n[5],
+    )
+
+
+def _walk(pikepdf, content, resources, ctm: Matrix, sizes: Dict[Tuple[int, int], Tuple[float, float]],
+          depth: int) -> None:
+    xobjects = resources.get("/XObject") if resources is not None else None
+    if xobjects is None:
+        return
+    stack = []
+    for operands, operator in pikepdf.parse_content_stream(content, "q Q cm Do"):
+        op = str(operator)
+        if op == "q":
+            stack.append(ctm)
+        elif op == "Q":
+            ctm = stack.pop() if stack else ctm
+        elif op == "cm" and len(operands) == 6:
+            ctm = _multiply(tuple(float(x) for x in operands), ctm)
+        elif op == "Do" and operands:
+            xobject = xobjects.get(operands[0])
+            if not isinstance(xobject, pikepdf.Stream):
+                continue
+            subtype = xobject.get("/Subtype")
+            if subtype == pikepdf.Name.Image:
+                # The image fills the unit square, so the CTM axes are its size on the page.
+                width, height = math.hypot(ctm[0], ctm[1]), math.hypot(ctm[2], ctm[3])
+                seen = sizes.get(xobject.objgen, (0.0, 0.0))
+                sizes[xobject.objgen] = (max(seen[0], width), max(seen[1], height))
+            elif subtype == pikepdf.Name.Form and depth < MAX_FORM_DEPTH:
+                matrix = tuple(float(x) for x in xobject.get("/Matrix", IDENTITY))
+                _walk(pikepdf, xobject, xobject.get("/Resources", resources), _multiply(matrix, ctm),
+                      sizes, depth + 1)
+
+
+def image_placements(pdf) -> Dict[Tuple[int, int], Tuple[float, float]]:
+    """
+    Largest size (width, height in points) at which each image XObject is drawn,
+    keyed by objgen. Images reached only through patterns, annotations or inline
+    images are not reported and therefore never touched.
+    """
+    import pikepdf
+
+    sizes: Dict[Tuple[int, int], Tuple[float, float]] = {}
+    for page in pdf.pages:
+        _walk(pikepdf, page, page.obj.get("/Resources"), IDENTITY, sizes, 0)
+    return sizes
+
+
+def _jpeg_mode(pikepdf, image) -> str:
+    """PIL mode the image can be re-encoded as JPEG with, keeping its /ColorSpace; '' if none."""
+    colorspace = image.get("/ColorSpace")
+    if colorspace == pikepdf.Name.DeviceRGB:
+        return "RGB"
+    if colorspace == pikepdf.Name.DeviceGray:
+        return "L"
+    if isinstance(colorspace, pikepdf.Array) and len(colorspace) == 2 and colorspace[0] == pikepdf.Name.ICCBased:
+        return {1: "L", 3: "RGB"}.get(int(colorspace[1].get("/N", 0)), "")
+    return ""
+
+
+def _filters(pikepdf, image):
+    filters = image.get("/Filter")
+    if filters is None:
+        return []
+    return list(filters) if isinstance(filters, pikepdf.Array) else [filters]
+
+
+def downsample_images(pdf, target_dpi: int = DEFAULT_TARGET_DPI, jpeg_quality: int = DEFAULT_JPEG_QUALITY,
+                      threshold: float = DOWNSAMPLE_THRESHOLD, min_bytes: int = MIN_IMAGE_BYTES) -> int:
+    """
+    Rewrite, in place, the image XObjects of an open pikepdf.Pdf whose effective resolution
+    (pixels over the size they are drawn at) exceeds target_dpi * threshold: they are
+    decoded with Pillow, resized to target_dpi and stored as JPEG (DCTDecode) at jpeg_quality.
+    Flate/LZW images at or below the target are only re-encoded as JPEG when that is smaller.
+    Fonts, vector content and everything else are left untouched, as are images that cannot
+    be recompressed safely (masks, color keys, /Decode arrays, non 8-bit, CMYK, Indexed,
+    JBIG2/CCITT/JPX).
+
+    Returns the number of images rewritten.
+    """
+    import pikepdf
+    from PIL import Image
+
+    recompressible = {pikepdf.Name.FlateDecode, pikepdf.Name.LZWDecode, pikepdf.Name.DCTDecode}
+    rewritten = 0
+    for objgen, (width_pt, height_pt) in image_placements(pdf).items():
+        image = pdf.get_object(objgen)
+        if width_pt <= 0 or height_pt <= 0 or int(image.get("/Length", 0)) < min_bytes:
+            continue
+        if image.get("/ImageMask", False) or isinstance(image.get("/Mask"), pikepdf.Array) or "/Decode" in image:
+            continue
+        filters = _filters(pikepdf, image)
+        mode = _jpeg_mode(pikepdf, image)
+        if not mode or int(image.get("/BitsPerComponent", 0)) != 8 or any(f not in recompressible for f in filters):
+            continue
+
+        width, height = int(image.Width), int(image.Height)
+        dpi = min(width / (width_pt / 72), height / (height_pt / 72))
+        downsample = dpi > target_dpi * threshold
+        if not downsample and filters == [pikepdf.Name.DCTDecode]:
+            continue  # already JPEG at a reasonable resolution: re-encoding would only lose quality
+
+        try:
+            pil = pikepdf.PdfImage(image).as_pil_image()
+            if pil.mode != mode:
+                continue
+            if downsample:
+                scale = target_dpi / dpi
+                size = (max(1, round(width * scale)), max(1, round(height * scale)))
+                pil = pil.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+            out = io.BytesIO()
+            pil.save(out, "JPEG", quality=jpeg_quality, optimize=True)
+        except Exception as e:  # an image Pillow cannot decode is simply kept as is
+            logger.debug("Image %s left untouched: %s", objgen, e)
+            continue
+
+        data = out.getvalue()
+        if len(data) >= int(image.get("/Length", 0)):
+            continue
+        image.write(data, filter=pikepdf.Name.DCTDecode)
+        if "/DecodeParms" in image:
+            del image["/DecodeParms"]
+        image.Width, image.Height = pil.size
+        image.BitsPerComponent = 8
+        rewritten += 1
+    return rewritten
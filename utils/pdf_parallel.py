@@ -0,0 +1,216 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from concurrent.futures import Executor
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Tuple
+
+# Document-level structures that point at specific page objects (or at objects the pages
+# share, like optional content groups): splitting and merging would leave them dangling,
+# so such documents are compressed in one piece.
+PAGE_BOUND_STRUCTURES = ("/Outlines", "/AcroForm", "/Names", "/StructTreeRoot", "/OCProperties", "/OpenAction")
+# Catalog entries that describe the whole document; merge copies them from the source.
+DOCUMENT_KEYS = ("/Metadata", "/PageLabels", "/ViewerPreferences", "/Lang", "/MarkInfo", "/PageMode",
+                 "/PageLayout")
+MAX_DEDUPE_PASSES = 8
+
+
+def new_process_pool(workers: int) -> Executor:
+    """Process pool for compress_in_parallel; spawn, since forking a threaded server is unsafe."""
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+def page_ranges(page_count: int, parts: int) -> List[Tuple[int, int]]:
+    """Split [0, page_count) into `parts` contiguous [start, end) ranges of near-equal size."""
+    parts = max(1, min(parts, page_count))
+    base, extra = divmod(page_count, parts)
+    ranges, start = [], 0
+    for i in range(parts):
+        end = start + base + (1 if i < extra else 0)
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def _key(obj, canonical: Dict[Tuple[int, int], Tuple[int, int]], pikepdf) -> Any:
+    """Structural fingerprint of a direct value; indirect references resolve to their canonical objgen."""
+    if not isinstance(obj, pikepdf.Object):  # int, bool and Decimal come back as Python values
+        return "P", repr(obj)
+    if obj.is_indirect:
+        return "R", canonical.get(obj.objgen, obj.objgen)
+    if isinstance(obj, pikepdf.Array):
+        return "A", tuple(_key(item, canonical, pikepdf) for item in obj)
+    if isinstance(obj, pikepdf.Dictionary):
+        return "D", tuple(sorted((k, _key(v, canonical, pikepdf)) for k, v in obj.items()))
+    return "V", obj.unparse()
+
+
+def _object_key(obj, canonical, pikepdf) -> Optional[Any]:
+    if isinstance(obj, pikepdf.Stream):
+        items = tuple(sorted((k, _key(v, canonical, pikepdf)) for k, v in obj.stream_dict.items() if k != "/Length"))
+        return "S", hashlib.sha256(obj.read_raw_bytes()).digest(), items
+    if isinstance(obj, pikepdf.Dictionary):
+        if obj.get("/Type") in (pikepdf.Name.Page, pikepdf.Name.Pages, pikepdf.Name.Catalog):
+            return None  # a page listed twice in the page tree is a different document
+        return "D", tuple(sorted((k, _key(v, canonical, pikepdf)) for k, v in obj.items()))
+    if isinstance(obj, pikepdf.Array):
+        return "A", tuple(_key(item, canonical, pikepdf) for item in obj)
+    return None
+
+
+def _repoint(container, replace: Dict[Tuple[int, int], Any], pikepdf) -> None:
+    if isinstance(container, pikepdf.Array):
+        for i, value in enumerate(container):
+            if not isinstance(value, pikepdf.Object):
+                continue
+            if value.is_indirect:
+                if value.objgen in replace:
+                    container[i] = replace[value.objgen]
+            elif isinstance(value, (pikepdf.Array, pikepdf.Dictionary)):
+                _repoint(value, replace, pikepdf)
+        return
+    for key in list(container.keys()):
+        value = container[key]
+        if not isinstance(value, pikepdf.Object):
+            continue
+        if value.is_indirect:
+            if value.objgen in replace:
+                container[key] = replace[value.objgen]
+        elif isinstance(value, (pikepdf.Array, pikepdf.Dictionary)):
+            _repoint(value, replace, pikepdf)
+
+
+def dedupe_objects(pdf) -> int:
+    """
+    Merge indirect objects that are identical (same stream bytes and dictionary, with
+    references compared after deduplication) so resources shared by pages of different
+    parts, e.g. a logo or a font, are stored once. Repeats until nothing else merges,
+    since two fonts only become equal once their font files are. Returns merged count.
+    """
+    import pikepdf
+
+    canonical: Dict[Tuple[int, int], Tuple[int, int]] = {}
+    merged = 0
+    for _ in range(MAX_DEDUPE_PASSES):
+        seen: Dict[Any, Any] = {}
+        replace: Dict[Tuple[int, int], Any] = {}
+        for obj in pdf.objects:
+            if obj.objgen in canonical or not isinstance(obj, (pikepdf.Stream, pikepdf.Dictionary, pikepdf.Array)):
+                continue
+            key = _object_key(obj, canonical, pikepdf)
+            if key is None:
+                continue
+            first = seen.setdefault(key, obj)
+            if first is not obj:
+                replace[obj.objgen] = first
+                canonical[obj.objgen] = first.objgen
+        if not replace:
+            break
+        merged += len(replace)
+        for obj in pdf.objects:
+            if obj.objgen not in canonical and isinstance(obj, (pikepdf.Stream, pikepdf.Dictionary, pikepdf.Array)):
+                _repoint(obj.stream_dict if isinstance(obj, pikepdf.Stream) else obj, replace, pikepdf)
+        _repoint(pdf.trailer, replace, pikepdf)
+    return merged
+
+
+def _copy_document_info(source, merged, pikepdf) -> None:
+    """Copy the document information dictionary and DOCUMENT_KEYS of `source` into `merged`."""
+    def _copy(value):
+        if not isinstance(value, pikepdf.Object):
+            return value
+        if not value.is_indirect:  # copy_foreign only takes indirect objects
+            value = source.make_indirect(value)
+        return merged.copy_foreign(value)
+
+    if "/Info" in source.trailer:
+        merged.trailer.Info = _copy(source.trailer.Info)
+    elif "/Info" in merged.trailer:
+        del merged.trailer["/Info"]
+    for key in DOCUMENT_KEYS:
+        if key in source.Root:
+            merged.Root[key] = _copy(source.Root[key])
+        elif key in merged.Root:
+            del merged.Root[key]
+
+
+def merge(paths: List[str], out: BinaryIO, source=None) -> None:
+    """
+    Concatenate the pages of `paths`, in order, into `out`, deduplicating shared objects.
+    With `source` (the document the parts were split from: a path or a seekable stream) its
+    document information and DOCUMENT_KEYS catalog entries are carried over.
+    """
+    import pikepdf
+
+    parts = [pikepdf.Pdf.open(path) for path in paths]
+    try:
+        merged = parts[0]
+        for part in parts[1:]:
+            merged.pages.extend(part.pages)
+        if source is not None:
+            if not isinstance(source, str):
+                source.seek(0)
+            with pikepdf.Pdf.open(source) as original:
+                _copy_document_info(original, merged, pikepdf)
+        dedupe_objects(merged)
+        # Parts are already optimised: streams are kept as they are (no recompress_flate).
+        merged.save(
+            out,
+            compress_streams=True,
+            linearize=True,
+            object_stream_mode=pikepdf.ObjectStreamMode.generate
+        )
+    finally:
+        for part in parts:
+            part.close()
+
+
+def compress_in_parallel(src, out: BinaryIO, compress_part: Callable[[str, str], None],
+                         min_pages: int, workers: int, executor: Optional[Executor] = None,
+                         tmp_dir: Optional[str] = None) -> bool:
+    """
+    Compress a large PDF by page ranges: split it into up to `workers` parts with pikepdf,
+    run `compress_part(in_path, out_path)` on each one concurrently in `executor` (a process
+    pool; a temporary one is created when None) and merge the results, keeping page order.
+    For each range the smaller of the compressed and the original part is used. The parts
+    are written to a temporary directory under `tmp_dir` (the system default when None).
+
+    Returns False, without writing to `out`, when the document has fewer than `min_pages`
+    pages or page-bound document structures (outline, forms, named destinations, tags,
+    optional content, open action).
+    """
+    import pikepdf
+
+    if workers < 2 or min_pages <= 0:
+        return False
+    if not isinstance(src, str):
+        src.seek(0)
+    workdir = tempfile.mkdtemp(prefix="mailbridge-split-", dir=tmp_dir)
+    try:
+        inputs: List[str] = []
+        with pikepdf.Pdf.open(src) as pdf:
+            if len(pdf.pages) < min_pages or any(key in pdf.Root for key in PAGE_BOUND_STRUCTURES):
+                return False
+            for i, (start, end) in enumerate(page_ranges(len(pdf.pages), workers)):
+                with pikepdf.new() as part:
+                    part.pages.extend(pdf.pages[start:end])
+                    path = os.path.join(workdir, f"part-{i:03d}.pdf")
+                    part.save(path)
+                inputs.append(path)
+        outputs = [path[:-4] + ".out.pdf" for path in inputs]
+
+        pool = executor or new_process_pool(len(inputs))
+        try:
+            for future in [pool.submit(compress_part, i, o) for i, o in zip(inputs, outputs)]:
+                future.result()
+        finally:
+            if executor is None:
+                pool.shutdown()
+
+        merge([o if os.path.getsize(o) < os.path.getsize(i) else i for i, o in zip(inputs, outputs)], out, src)
+        return True
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)